@@ -1,4 +1,101 @@
 import os
 
 # It's good practice to load secrets from environment variables
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "your_gemini_api_key_here")
\ No newline at end of file
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "your_gemini_api_key_here")
+
+# --- Estimator model artifacts ---
+# Directory holding versioned estimator artifacts (see app/estimator/artifact.py)
+ESTIMATOR_ARTIFACT_DIR = os.getenv("ESTIMATOR_ARTIFACT_DIR", "artifacts/estimator")
+# Legacy single-file pickle, used only when no artifact version is available
+ESTIMATOR_PICKLE_PATH = os.getenv("ESTIMATOR_PICKLE_PATH", "sustainability_estimator.pkl")
+# How often each worker checks whether CURRENT points at a new version
+ESTIMATOR_RELOAD_POLL_SECONDS = float(os.getenv("ESTIMATOR_RELOAD_POLL_SECONDS", "10"))
+
+# Run a known and an unknown combination through the estimator during startup
+ESTIMATOR_WARM_UP = os.getenv("ESTIMATOR_WARM_UP", "true").lower() in ("1", "true", "yes")
+
+# --- Estimator input canonicalization (see app/estimator/canonical.py) ---
+# Distinct raw values whose resolution is remembered
+ESTIMATOR_CANONICAL_CACHE_SIZE = int(os.getenv("ESTIMATOR_CANONICAL_CACHE_SIZE", "10000"))
+# Lowest trigram similarity (0-1) at which a misspelled value is matched to a category
+ESTIMATOR_CANONICAL_MIN_SIMILARITY = float(os.getenv("ESTIMATOR_CANONICAL_MIN_SIMILARITY", "0.6"))
+
+# --- Sustainability impact ledger ---
+# SQLite file with recorded swaps and running totals; set to an empty string for an in-memory ledger
+ESTIMATOR_IMPACT_LEDGER_PATH = os.getenv("ESTIMATOR_IMPACT_LEDGER_PATH", "data/estimator/impact_ledger.sqlite3")
+# Swaps estimated and written per transaction during an NDJSON backfill
+ESTIMATOR_IMPACT_BACKFILL_BATCH_SIZE = int(os.getenv("ESTIMATOR_IMPACT_BACKFILL_BATCH_SIZE", "1000"))
+
+# Shared secret for /admin endpoints; admin endpoints are disabled when unset
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+# --- Moderation result cache ---
+MODERATION_CACHE_MAX_ENTRIES = int(os.getenv("MODERATION_CACHE_MAX_ENTRIES", "10000"))
+MODERATION_CACHE_TTL_SECONDS = float(os.getenv("MODERATION_CACHE_TTL_SECONDS", "86400"))
+# Optional SQLite file so cached results survive restarts; in-memory only when unset
+MODERATION_CACHE_SQLITE_PATH = os.getenv("MODERATION_CACHE_SQLITE_PATH")
+
+# --- Moderation executor (concurrency, timeouts, retries) ---
+MODERATION_MAX_IN_FLIGHT = int(os.getenv("MODERATION_MAX_IN_FLIGHT", "8"))
+MODERATION_MAX_QUEUE = int(os.getenv("MODERATION_MAX_QUEUE", "64"))
+MODERATION_CALL_TIMEOUT_SECONDS = float(os.getenv("MODERATION_CALL_TIMEOUT_SECONDS", "30"))
+MODERATION_DEADLINE_SECONDS = float(os.getenv("MODERATION_DEADLINE_SECONDS", "60"))
+MODERATION_MAX_RETRIES = int(os.getenv("MODERATION_MAX_RETRIES", "2"))
+MODERATION_BACKOFF_BASE_SECONDS = float(os.getenv("MODERATION_BACKOFF_BASE_SECONDS", "0.5"))
+MODERATION_BACKOFF_MAX_SECONDS = float(os.getenv("MODERATION_BACKOFF_MAX_SECONDS", "8"))
+
+# Local fake model instead of Gemini (development, load tests); see app/moderation/fake.py
+MODERATION_FAKE_MODEL = os.getenv("MODERATION_FAKE_MODEL", "").lower() in ("1", "true", "yes")
+MODERATION_FAKE_LATENCY_SECONDS = float(os.getenv("MODERATION_FAKE_LATENCY_SECONDS", "0.5"))
+MODERATION_FAKE_FAILURE_RATE = float(os.getenv("MODERATION_FAKE_FAILURE_RATE", "0"))
+
+# --- Moderation micro-batching (several listings per model call) ---
+# Listings sent in one prompt at most; 1 disables batching and every listing gets its own call
+MODERATION_BATCH_MAX_ITEMS = int(os.getenv("MODERATION_BATCH_MAX_ITEMS", "1"))
+# How long the first listing of a batch waits for others before the batch is sent anyway
+MODERATION_BATCH_WINDOW_SECONDS = float(os.getenv("MODERATION_BATCH_WINDOW_SECONDS", "0.05"))
+
+# --- Moderation image preprocessing ---
+MODERATION_MAX_UPLOAD_BYTES = int(os.getenv("MODERATION_MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+MODERATION_MAX_IMAGE_PIXELS = int(os.getenv("MODERATION_MAX_IMAGE_PIXELS", "40000000"))
+MODERATION_IMAGE_MAX_SIDE = int(os.getenv("MODERATION_IMAGE_MAX_SIDE", "1024"))
+# "thread" or "process"; Pillow releases the GIL while decoding and resampling, so threads usually suffice
+MODERATION_IMAGE_POOL = os.getenv("MODERATION_IMAGE_POOL", "thread")
+MODERATION_IMAGE_WORKERS = int(os.getenv("MODERATION_IMAGE_WORKERS", "0")) or None
+
+# --- Moderation pre-screen (local rules that flag obviously bad listings without a model call) ---
+MODERATION_PRESCREEN_ENABLED = os.getenv("MODERATION_PRESCREEN_ENABLED", "true").lower() in ("1", "true", "yes")
+# Comma-separated rule names to skip, e.g. "blurry,shouting"
+MODERATION_PRESCREEN_DISABLED_RULES = [r.strip() for r in os.getenv("MODERATION_PRESCREEN_DISABLED_RULES", "").split(",") if r.strip()]
+MODERATION_PRESCREEN_MIN_SIDE = int(os.getenv("MODERATION_PRESCREEN_MIN_SIDE", "200"))
+MODERATION_PRESCREEN_MIN_LAPLACIAN_VARIANCE = float(os.getenv("MODERATION_PRESCREEN_MIN_LAPLACIAN_VARIANCE", "25"))
+MODERATION_PRESCREEN_MIN_BRIGHTNESS = float(os.getenv("MODERATION_PRESCREEN_MIN_BRIGHTNESS", "25"))
+MODERATION_PRESCREEN_MAX_BRIGHTNESS = float(os.getenv("MODERATION_PRESCREEN_MAX_BRIGHTNESS", "240"))
+MODERATION_PRESCREEN_MAX_DARK_FRACTION = float(os.getenv("MODERATION_PRESCREEN_MAX_DARK_FRACTION", "0.85"))
+MODERATION_PRESCREEN_MAX_BRIGHT_FRACTION = float(os.getenv("MODERATION_PRESCREEN_MAX_BRIGHT_FRACTION", "0.85"))
+MODERATION_PRESCREEN_MIN_TITLE_CHARS = int(os.getenv("MODERATION_PRESCREEN_MIN_TITLE_CHARS", "3"))
+MODERATION_PRESCREEN_MAX_CAPS_RATIO = float(os.getenv("MODERATION_PRESCREEN_MAX_CAPS_RATIO", "0.7"))
+MODERATION_PRESCREEN_MAX_REPEATED_CHARS = int(os.getenv("MODERATION_PRESCREEN_MAX_REPEATED_CHARS", "6"))
+MODERATION_PRESCREEN_MAX_WORD_SHARE = float(os.getenv("MODERATION_PRESCREEN_MAX_WORD_SHARE", "0.5"))
+
+# --- Moderation near-duplicate image index ---
+MODERATION_DUPLICATE_INDEX_ENABLED = os.getenv("MODERATION_DUPLICATE_INDEX_ENABLED", "true").lower() in ("1", "true", "yes")
+# SQLite file holding the perceptual hashes; set to an empty string for an in-memory index
+MODERATION_DUPLICATE_SQLITE_PATH = os.getenv("MODERATION_DUPLICATE_SQLITE_PATH", "data/moderation/image_hashes.sqlite3")
+# Maximum Hamming distances (out of 64 bits) for two images to count as the same photo
+MODERATION_DUPLICATE_MAX_DISTANCE = int(os.getenv("MODERATION_DUPLICATE_MAX_DISTANCE", "6"))
+MODERATION_DUPLICATE_MAX_DHASH_DISTANCE = int(os.getenv("MODERATION_DUPLICATE_MAX_DHASH_DISTANCE", "10"))
+
+# --- Moderation job queue (submit/poll API) ---
+MODERATION_JOBS_ENABLED = os.getenv("MODERATION_JOBS_ENABLED", "true").lower() in ("1", "true", "yes")
+# Holds jobs.sqlite3 and the queued images
+MODERATION_JOBS_DIR = os.getenv("MODERATION_JOBS_DIR", "data/moderation/jobs")
+# One server process per host drains the queue (elected by a file lock in MODERATION_JOBS_DIR),
+# so the concurrency and rate below are per host, not per gunicorn worker
+MODERATION_JOB_WORKERS = int(os.getenv("MODERATION_JOB_WORKERS", "4"))
+# Upper bound on how fast queued jobs start, whatever the backlog
+MODERATION_JOB_RATE_PER_SECOND = float(os.getenv("MODERATION_JOB_RATE_PER_SECOND", "5"))
+MODERATION_JOB_MAX_ATTEMPTS = int(os.getenv("MODERATION_JOB_MAX_ATTEMPTS", "3"))
+# A running job is handed to another worker if it has not finished after this long
+MODERATION_JOB_LEASE_SECONDS = float(os.getenv("MODERATION_JOB_LEASE_SECONDS", "300"))
+MODERATION_JOB_RETENTION_SECONDS = float(os.getenv("MODERATION_JOB_RETENTION_SECONDS", str(7 * 86400)))
@@ -0,0 +1,132 @@
+# ml-service/app/core/lifecycle.py
+"""
+Startup bookkeeping for one server process.
+
+Heavy subsystems (the estimator with pandas and sklearn, the moderation service with its
+SQLite files, thread pools and Gemini client) are not touched at import time. The app runs
+them as named startup steps instead (see main.py). Each step runs once per process and its
+duration is recorded, so /health/ready can answer straight away and report when this
+process became ready.
+
+Under a pre-forking server the master runs the shareable steps before forking (see
+gunicorn.conf.py); workers inherit those as done and only run the rest.
+"""
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from .metrics import PROCESS_READY, STARTUP_STEP_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+def process_age_seconds() -> Optional[float]:
+    """Seconds since this process was created (exec or fork), or None where /proc is unavailable"""
+    try:
+        with open("/proc/self/stat") as file:
+            # Fields after the parenthesized command name; starttime is field 22 of the full line
+            start_ticks = int(file.read().rpartition(")")[2].split()[19])
+        with open("/proc/uptime") as file:
+            uptime = float(file.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    return max(uptime - start_ticks / os.sysconf("SC_CLK_TCK"), 0.0)
+
+
+def process_memory(pid="self") -> Optional[Dict[str, float]]:
+    """
+    RSS, PSS and USS of a process in MiB from /proc/<pid>/smaps_rollup, or None where unavailable.
+    PSS splits each shared page between the processes mapping it, and USS counts only the
+    pages private to this process, so they show what copy-on-write sharing actually saves.
+    """
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as file:
+            for line in file:
+                key, _, value = line.partition(":")
+                if value.strip().endswith("kB"):
+                    fields[key] = int(value.split()[0])
+    except (OSError, ValueError):
+        return None
+    return {
+        "rss_mb": round(fields.get("Rss", 0) / 1024, 1),
+        "pss_mb": round(fields.get("Pss", 0) / 1024, 1),
+        "uss_mb": round((fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)) / 1024, 1),
+        "shared_mb": round((fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0)) / 1024, 1),
+    }
+
+
+class Lifecycle:
+    """Startup steps run by this process, their durations, and whether it is ready for traffic"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.pid = os.getpid()
+        age = process_age_seconds()
+        self.started_at = time.time() - age if age is not None else time.time()
+        self.steps: Dict[str, Dict] = {}
+        self.ready_at: Optional[float] = None
+
+    def _check_fork(self):
+        # A forked worker keeps the steps its master ran, marked as inherited, and starts its own clock
+        if self.pid != os.getpid():
+            inherited = {name: {**step, "inherited": True} for name, step in self.steps.items() if step["ok"]}
+            self._reset()
+            self.steps = inherited
+
+    def run_step(self, name: str, step: Callable) -> bool:
+        """Runs `step` unless it already succeeded in this process (or its master); returns success"""
+        with self._lock:
+            self._check_fork()
+            if name in self.steps and self.steps[name]["ok"]:
+                return True
+            started = time.perf_counter()
+            try:
+                step()
+                ok, error = True, None
+            except Exception as e:
+                ok, error = False, f"{type(e).__name__}: {e}"
+                logger.error(f"Startup step '{name}' failed: {error}")
+            seconds = time.perf_counter() - started
+            self.steps[name] = {"seconds": round(seconds, 4), "ok": ok, "error": error, "pid": os.getpid()}
+        logger.info(f"Startup step '{name}' took {seconds:.3f}s in process {os.getpid()}")
+        return ok
+
+    def mark_ready(self):
+        with self._lock:
+            self._check_fork()
+            self.ready_at = time.time()
+        # Published here rather than per step, so inherited steps show up under the worker too
+        for name, step in self.steps.items():
+            STARTUP_STEP_SECONDS.labels(step=name).set(step["seconds"])
+        PROCESS_READY.set(1)
+        logger.info(f"Process {self.pid} ready {self.ready_at - self.started_at:.2f}s after it started")
+
+    def mark_stopping(self):
+        """Fails readiness while the process drains during shutdown"""
+        self.ready_at = None
+        PROCESS_READY.set(0)
+
+    @property
+    def ready(self) -> bool:
+        return self.ready_at is not None and self.pid == os.getpid()
+
+    def status(self, include_memory: bool = False) -> Dict:
+        status = {
+            "ready": self.ready,
+            "pid": os.getpid(),
+            "started_at": self.started_at if self.pid == os.getpid() else None,
+            "ready_after_seconds": round(self.ready_at - self.started_at, 3) if self.ready else None,
+            "steps": self.steps,
+        }
+        if include_memory:
+            status["memory"] = process_memory()
+        return status
+
+
+lifecycle = Lifecycle()
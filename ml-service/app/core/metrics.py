@@ -0,0 +1,128 @@
+# ml-service/app/core/metrics.py
+import os
+import time
+from typing import Dict, Optional
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+)
+
+# Request and stage latencies span sub-millisecond lookups up to multi-second model calls
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "HTTP requests currently being handled", multiprocess_mode="livesum"
+)
+
+MODERATION_STAGE_SECONDS = Histogram(
+    "moderation_stage_duration_seconds", "Time spent in each moderation stage",
+    ["stage"], buckets=LATENCY_BUCKETS
+)
+MODERATION_DECISIONS = Counter(
+    "moderation_decisions_total", "Moderation decisions by outcome and by what produced them",
+    ["decision", "source"]
+)
+MODERATION_BATCH_SIZE = Histogram(
+    "moderation_batch_size", "Listings sent per micro-batched model call", buckets=(1, 2, 3, 4, 6, 8, 12, 16, 24, 32)
+)
+MODERATION_BATCH_FALLBACKS = Counter(
+    "moderation_batch_fallbacks_total", "Listings re-sent individually because the batch answer could not be used",
+    ["reason"]
+)
+MODERATION_MODEL_TOKENS = Counter(
+    "moderation_model_tokens_total", "Tokens reported by the model for moderation calls", ["kind"]
+)
+MODERATION_CACHE_HITS = Counter("moderation_cache_hits_total", "Moderation cache lookups answered from memory or disk")
+MODERATION_CACHE_MISSES = Counter("moderation_cache_misses_total", "Moderation cache lookups with no live entry")
+MODERATION_CACHE_EVICTIONS = Counter("moderation_cache_evictions_total", "Entries dropped from the in-memory LRU when full")
+MODERATION_MODEL_CALLS_IN_FLIGHT = Gauge(
+    "moderation_model_calls_in_flight", "Model calls currently running", multiprocess_mode="livesum"
+)
+MODERATION_MODEL_CALLS_QUEUED = Gauge(
+    "moderation_model_calls_queued", "Requests waiting for a free model-call slot", multiprocess_mode="livesum"
+)
+
+ESTIMATOR_STAGE_SECONDS = Histogram(
+    "estimator_stage_duration_seconds", "Time spent in each estimator stage per call",
+    ["stage"], buckets=LATENCY_BUCKETS
+)
+ESTIMATOR_ITEMS = Counter("estimator_items_total", "Items estimated, by how the prediction was made", ["path"])
+ESTIMATOR_CANONICAL_MATCHES = Counter(
+    "estimator_canonical_matches_total", "Input values by how they were matched to a category", ["feature", "match"]
+)
+ESTIMATOR_MODEL_LOADED = Gauge(
+    "estimator_model_loaded", "1 when this worker has an estimator loaded", multiprocess_mode="liveall"
+)
+ESTIMATOR_ARTIFACT_VERSION = Gauge(
+    "estimator_artifact_version_info", "Artifact version served by this worker (value is always 1)",
+    ["version"], multiprocess_mode="liveall"
+)
+ESTIMATOR_RELOADS = Counter("estimator_reloads_total", "Estimator artifact loads by outcome", ["outcome"])
+
+STARTUP_STEP_SECONDS = Gauge(
+    "startup_step_duration_seconds", "Duration of each startup step run by this process",
+    ["step"], multiprocess_mode="liveall"
+)
+PROCESS_READY = Gauge(
+    "process_ready", "1 once this process has finished its startup steps", multiprocess_mode="liveall"
+)
+
+
+def observe_stage_timings(histogram: Histogram, timings: Optional[Dict[str, float]]):
+    """Records a {"<stage>_ms": milliseconds} timings dict, as the moderation service builds it"""
+    for key, milliseconds in (timings or {}).items():
+        histogram.labels(stage=key[:-3] if key.endswith("_ms") else key).observe(milliseconds / 1000)
+
+
+def set_estimator_version(version: Optional[str], previous: Optional[str] = None):
+    if previous is not None and previous != version:
+        # Set to 0 rather than removed so the change also shows up under multiprocess collection
+        ESTIMATOR_ARTIFACT_VERSION.labels(version=previous).set(0)
+    if version is not None:
+        ESTIMATOR_ARTIFACT_VERSION.labels(version=version).set(1)
+    ESTIMATOR_MODEL_LOADED.set(1 if version is not None else 0)
+
+
+def render_metrics():
+    """Returns (body, content type); aggregates all workers when PROMETHEUS_MULTIPROC_DIR is set"""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+class PrometheusMiddleware:
+    """
+    Plain ASGI middleware timing every HTTP request by its route template (e.g.
+    /estimator/estimate/), so path parameters cannot blow up label cardinality.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            # FastAPI stores the matched route in the scope during routing
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            HTTP_REQUEST_SECONDS.labels(method=scope["method"], route=route, status=str(status["code"])).observe(
+                time.perf_counter() - started)
@@ -0,0 +1,200 @@
+# ml-service/app/estimator/artifact.py
+"""
+Versioned on-disk format for a trained estimator.
+
+    <root>/
+        CURRENT                 name of the version workers should serve
+        <version>/
+            manifest.json       categories, feature columns, targets and array index
+            *.npy               numeric state and flattened forests (engine_<model>_<field>.npy),
+                                memory-mapped read-only when loaded
+            forests.joblib      the fitted sklearn forests (optional, not needed for serving)
+
+Numeric arrays are loaded with mmap_mode='r', so every worker on a host
+shares the same page-cache copy instead of holding a private one.
+Format 1 artifacts (sklearn forests only) are still loadable.
+
+The version pointer helpers import nothing heavy; sklearn, pandas and joblib are only
+imported when an artifact is actually saved or loaded.
+"""
+import json
+import os
+import re
+import shutil
+import time
+from typing import TYPE_CHECKING, Dict, Optional
+
+import numpy as np
+
+from .inference import FlatForest, FLAT_FOREST_FIELDS
+
+if TYPE_CHECKING:
+    from .service import ResearchBasedSustainabilityEstimator
+
+ARTIFACT_FORMAT_VERSION = 2
+SUPPORTED_FORMAT_VERSIONS = (1, 2)
+MANIFEST_FILE = "manifest.json"
+CURRENT_FILE = "CURRENT"
+FORESTS_FILE = "forests.joblib"
+_VERSION_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]*$")
+
+
+def _check_version_name(version: str):
+    if not _VERSION_PATTERN.match(version):
+        raise ValueError(f"Invalid artifact version name: '{version}'")
+
+
+def save_artifact(estimator: "ResearchBasedSustainabilityEstimator", root_dir: str,
+                  version: Optional[str] = None, make_current: bool = True,
+                  include_sklearn_models: bool = False) -> str:
+    """
+    Writes a trained estimator as a new artifact version and returns its directory.
+    The version directory is written under a temporary name and renamed into place,
+    so readers never observe a partially written artifact.
+    """
+    import joblib
+    from .service import CATEGORICAL_FEATURES
+
+    if not estimator.is_trained:
+        raise ValueError("Models not trained. Call train_ml_models() first.")
+    version = version or time.strftime("%Y%m%d-%H%M%S")
+    _check_version_name(version)
+    final_dir = os.path.join(root_dir, version)
+    if os.path.exists(final_dir):
+        raise FileExistsError(f"Artifact version '{version}' already exists in {root_dir}")
+    tmp_dir = os.path.join(root_dir, f".{version}.tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    arrays = {
+        "scaler_mean": estimator.scaler.mean_,
+        "scaler_scale": estimator.scaler.scale_,
+        **{f"stats_{column}": values for column, values in estimator.category_stats.items()},
+    }
+    if estimator.lookup_table is not None:
+        arrays["lookup_table"] = estimator.lookup_table
+    if estimator.target_scaling is not None:
+        arrays["target_scaling_mean"] = estimator.target_scaling["mean"]
+        arrays["target_scaling_scale"] = estimator.target_scaling["scale"]
+    if not estimator.inference_engines:
+        estimator.compile_inference_engines()
+    for name, engine in estimator.inference_engines.items():
+        for field, values in engine.arrays().items():
+            arrays[f"engine_{name}_{field}"] = values
+    array_index = {}
+    for name, values in arrays.items():
+        values = np.ascontiguousarray(values)
+        np.save(os.path.join(tmp_dir, f"{name}.npy"), values)
+        array_index[name] = {"file": f"{name}.npy", "shape": list(values.shape), "dtype": str(values.dtype)}
+    if include_sklearn_models:
+        joblib.dump(estimator.ml_models, os.path.join(tmp_dir, FORESTS_FILE))
+
+    manifest = {
+        "format_version": ARTIFACT_FORMAT_VERSION,
+        "version": version,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "feature_cols": list(estimator.feature_cols),
+        "targets": list(estimator.targets),
+        "categories": {feature: [str(value) for value in estimator.encoders[feature].classes_]
+                       for feature in CATEGORICAL_FEATURES},
+        "arrays": array_index,
+        "engines": list(estimator.inference_engines),
+        "forests": FORESTS_FILE if include_sklearn_models else None,
+        "training": estimator.training_report,
+    }
+    with open(os.path.join(tmp_dir, MANIFEST_FILE), "w") as file:
+        json.dump(manifest, file, indent=2)
+
+    os.rename(tmp_dir, final_dir)
+    if make_current:
+        set_current_version(root_dir, version)
+    return final_dir
+
+
+def load_artifact(version_dir: str, mmap: bool = True, load_sklearn_models: bool = False) -> "ResearchBasedSustainabilityEstimator":
+    """
+    Rebuilds a serving-ready estimator from an artifact version directory.
+    The sklearn forests are only unpickled when asked for, or when the artifact has no flattened engines.
+    """
+    import joblib
+    from sklearn.preprocessing import LabelEncoder
+    from .service import ResearchBasedSustainabilityEstimator
+
+    with open(os.path.join(version_dir, MANIFEST_FILE)) as file:
+        manifest = json.load(file)
+    if manifest.get("format_version") not in SUPPORTED_FORMAT_VERSIONS:
+        raise ValueError(f"Unsupported artifact format version: {manifest.get('format_version')}")
+
+    arrays = {
+        name: np.load(os.path.join(version_dir, spec["file"]), mmap_mode="r" if mmap else None)
+        for name, spec in manifest["arrays"].items()
+    }
+    estimator = ResearchBasedSustainabilityEstimator()
+    estimator.feature_cols = manifest["feature_cols"]
+    for feature, classes in manifest["categories"].items():
+        le = LabelEncoder()
+        le.classes_ = np.array(classes, dtype=object)
+        estimator.encoders[feature] = le
+    estimator.category_codes = {
+        feature: {value: code for code, value in enumerate(classes)}
+        for feature, classes in manifest["categories"].items()
+    }
+    estimator.category_stats = {
+        name[len("stats_"):]: values for name, values in arrays.items() if name.startswith("stats_")
+    }
+    estimator.scaler.mean_ = arrays["scaler_mean"]
+    estimator.scaler.scale_ = arrays["scaler_scale"]
+    estimator.scaler.n_features_in_ = len(estimator.feature_cols)
+    estimator.lookup_table = arrays.get("lookup_table")
+    estimator.targets = manifest["targets"]
+    estimator.training_report = manifest.get("training")
+    if "target_scaling_mean" in arrays:
+        estimator.target_scaling = {"mean": arrays["target_scaling_mean"], "scale": arrays["target_scaling_scale"]}
+    engine_names = manifest.get("engines") or []
+    estimator.inference_engines = {
+        name: FlatForest.from_arrays({field: arrays[f"engine_{name}_{field}"] for field in FLAT_FOREST_FIELDS})
+        for name in engine_names
+    }
+    if manifest.get("forests") and (load_sklearn_models or not engine_names):
+        estimator.ml_models = joblib.load(os.path.join(version_dir, manifest["forests"]))
+    if not estimator.inference_engines and not estimator.ml_models:
+        raise ValueError(f"Artifact in {version_dir} contains no models")
+    estimator.is_trained = True
+    return estimator
+
+
+def get_current_version(root_dir: str) -> Optional[str]:
+    try:
+        with open(os.path.join(root_dir, CURRENT_FILE)) as file:
+            return file.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def check_version(root_dir: str, version: str):
+    """Raises ValueError for a malformed version name and FileNotFoundError for a missing version"""
+    _check_version_name(version)
+    if not os.path.isfile(os.path.join(root_dir, version, MANIFEST_FILE)):
+        raise FileNotFoundError(f"Artifact version '{version}' not found in {root_dir}")
+
+
+def set_current_version(root_dir: str, version: str):
+    """Atomically points CURRENT at an existing version"""
+    check_version(root_dir, version)
+    tmp_path = os.path.join(root_dir, f".{CURRENT_FILE}.tmp")
+    with open(tmp_path, "w") as file:
+        file.write(version)
+    os.replace(tmp_path, os.path.join(root_dir, CURRENT_FILE))
+
+
+def list_versions(root_dir: str) -> Dict[str, str]:
+    """Maps each available version to its creation time"""
+    versions = {}
+    if not os.path.isdir(root_dir):
+        return versions
+    for name in sorted(os.listdir(root_dir)):
+        manifest_path = os.path.join(root_dir, name, MANIFEST_FILE)
+        if not name.startswith(".") and os.path.isfile(manifest_path):
+            with open(manifest_path) as file:
+                versions[name] = json.load(file).get("created_at")
+    return versions
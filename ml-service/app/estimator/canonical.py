@@ -0,0 +1,239 @@
+# ml-service/app/estimator/canonical.py
+"""
+Maps free-form category values onto the estimator's categories.
+
+Listings describe garments in their own words ("Shirt", "levis", "Polyster", "like new"),
+while the model only knows the categories it was trained on ("Polo_Shirt", "Levi",
+"Polyester", "Fairly New"). Each raw value is resolved in this order:
+
+    exact       the value is a category
+    normalized  same tokens after case, accents, punctuation and plural "s" are ignored
+    alias       a known synonym from ALIASES ("Pants" -> "Dress_Pants")
+    token       the longest run of words that is a category or alias ("slim fit jeans" -> "Jeans")
+    fuzzy       the closest category or alias by character trigrams, above a similarity threshold
+    none        no match; the estimator falls back to 'Unknown' (or the first class) as before
+
+The tables are built once per estimator and resolutions are memoized in a bounded LRU,
+so repeated values cost a dictionary lookup.
+"""
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.core.config import ESTIMATOR_CANONICAL_CACHE_SIZE, ESTIMATOR_CANONICAL_MIN_SIMILARITY
+
+MATCH_TYPES = ("exact", "normalized", "alias", "token", "fuzzy", "none")
+
+# Synonyms seen in listings -> estimator category. Aliases whose target the loaded
+# estimator does not know are ignored, so the table can cover several artifact versions.
+ALIASES = {
+    'item_type': {
+        # Names used by the moderation ItemType enum
+        'Shirt': 'Polo_Shirt', 'Pants': 'Dress_Pants', 'Kurta': 'Kurta_Kurti', 'Blouse': 'T-shirt',
+        'Kurti': 'Kurta_Kurti', 'Tee': 'T-shirt', 'Top': 'T-shirt', 'Polo': 'Polo_Shirt',
+        'Trousers': 'Dress_Pants', 'Slacks': 'Dress_Pants', 'Formal Pants': 'Dress_Pants',
+        'Khakis': 'Chinos', 'Denims': 'Jeans', 'Sari': 'Saree', 'Frock': 'Dress', 'Gown': 'Dress',
+        'Sweatshirt': 'Hoodie', 'Hoody': 'Hoodie', 'Jumper': 'Sweater', 'Pullover': 'Sweater', 'Overcoat': 'Coat',
+        'Trench Coat': 'Coat', 'Parka': 'Coat', 'Windbreaker': 'Jacket', 'Suit Jacket': 'Blazer',
+        'Track Pants': 'Sportswear', 'Joggers': 'Sportswear', 'Activewear': 'Sportswear',
+        'Tracksuit': 'Sportswear', 'Bermudas': 'Shorts',
+    },
+    'material': {
+        'Organic': 'Organic_Cotton', 'Poly': 'Polyester', 'Recycled Poly': 'Recycled_Polyester',
+        'rPET': 'Recycled_Polyester', 'Rayon': 'Viscose', 'Modal': 'Viscose', 'Khaddar': 'Khadi',
+        'Flax': 'Linen', 'Merino': 'Wool', 'Cashmere': 'Wool', 'Jean': 'Denim',
+    },
+    'brand': {
+        "Levi's": 'Levi', 'Levi Strauss': 'Levi', 'HM': 'H&M', 'Hennes Mauritz': 'H&M',
+        'Life Style': 'LifeStyle', 'Van Huesen': 'Van_Heusen', 'Fab India': 'Fabindia',
+    },
+    'condition': {
+        # Names used by the moderation ItemCondition enum
+        'New': 'brand_new', 'Like New': 'Fairly New', 'Old': 'Visible Wear',
+        'Good': 'Used', 'Brand New': 'brand_new', 'New With Tags': 'brand_new', 'NWT': 'brand_new', 'Unworn': 'brand_new',
+        'Gently Used': 'Fairly New', 'Mint': 'Excellent', 'Worn': 'Visible Wear',
+        'Damaged': 'Needs Repair', 'Torn': 'Needs Repair',
+    },
+}
+
+
+def normalize_tokens(value: str) -> List[str]:
+    """Lowercase ASCII words of `value`, with apostrophes dropped and a plural "s" removed"""
+    text = unicodedata.normalize("NFKD", value).encode("ascii", "ignore").decode().casefold()
+    text = text.replace("'", "").replace("&", " and ")
+    return [_singular(token) for token in re.findall(r"[a-z0-9]+", text)]
+
+
+def _singular(token: str) -> str:
+    return token[:-1] if len(token) > 3 and token.endswith("s") and not token.endswith("ss") else token
+
+
+def _trigrams(key: str) -> frozenset:
+    padded = f"${key}$"
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+@dataclass(frozen=True)
+class Resolution:
+    """The category a raw value resolved to and how it was matched"""
+    value: str
+    code: int
+    match: str
+    score: float = 1.0
+    # JSON form, built once and shared by every result that uses this resolution
+    summary: Dict = field(default_factory=dict, compare=False, repr=False)
+
+    @property
+    def known(self) -> bool:
+        return self.match != "none"
+
+
+def _resolution(value: str, code: int, match: str, score: float = 1.0) -> Resolution:
+    summary = {"value": value, "match": match}
+    if match == "fuzzy":
+        summary["score"] = round(score, 3)
+    return Resolution(value, code, match, score, summary)
+
+
+class CategoryCanonicalizer:
+    """
+    Resolution tables for each categorical feature of one estimator, plus an LRU of
+    (feature, raw value) -> Resolution shared by all callers.
+    """
+
+    def __init__(self, category_codes: Dict[str, Dict[str, int]], aliases: Optional[Dict[str, Dict[str, str]]] = None,
+                 min_similarity: float = ESTIMATOR_CANONICAL_MIN_SIMILARITY,
+                 max_entries: int = ESTIMATOR_CANONICAL_CACHE_SIZE):
+        aliases = ALIASES if aliases is None else aliases
+        self.category_codes = category_codes
+        self.min_similarity = min_similarity
+        self.max_entries = max_entries
+        # feature -> normalized key -> (category, match); categories win over aliases on a clash
+        self._keys: Dict[str, Dict[str, Tuple[str, str]]] = {}
+        # feature -> trigram -> keys containing it, and key -> its trigrams
+        self._postings: Dict[str, Dict[str, List[str]]] = {}
+        self._key_trigrams: Dict[str, Dict[str, frozenset]] = {}
+        self._exact: Dict[str, Dict[str, Resolution]] = {}
+        self._fallback: Dict[str, Resolution] = {}
+        for feature, codes in category_codes.items():
+            self._exact[feature] = {category: _resolution(category, code, "exact") for category, code in codes.items()}
+            keys: Dict[str, Tuple[str, str]] = {}
+            for category in codes:
+                keys.setdefault("".join(normalize_tokens(category)), (category, "normalized"))
+            for alias, category in aliases.get(feature, {}).items():
+                if category in codes:
+                    keys.setdefault("".join(normalize_tokens(alias)), (category, "alias"))
+            keys.pop("", None)
+            self._keys[feature] = keys
+            self._key_trigrams[feature] = {key: _trigrams(key) for key in keys}
+            postings: Dict[str, List[str]] = {}
+            for key, grams in self._key_trigrams[feature].items():
+                for gram in grams:
+                    postings.setdefault(gram, []).append(key)
+            self._postings[feature] = postings
+            fallback = 'Unknown' if 'Unknown' in codes else next(iter(codes))
+            self._fallback[feature] = _resolution(fallback, codes[fallback], "none", 0.0)
+        self._cache: "OrderedDict[Tuple[str, str], Resolution]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def resolve(self, feature: str, value: str) -> Resolution:
+        return self.resolve_many(feature, [value])[0]
+
+    def resolve_many(self, feature: str, values: Iterable[str]) -> List[Resolution]:
+        """
+        Resolutions for `values`, in order. Each distinct value is looked up (and, on a
+        cache miss, matched) once per call, however often it repeats in the batch.
+        """
+        values = list(values)
+        exact = self._exact[feature]
+        resolved: Dict[str, Resolution] = {}
+        missing = []
+        with self._lock:
+            for value in dict.fromkeys(values):
+                resolution = exact.get(value)
+                if resolution is not None:
+                    resolved[value] = resolution
+                    continue
+                cached = self._cache.get((feature, value))
+                if cached is None:
+                    self.misses += 1
+                    missing.append(value)
+                else:
+                    self.hits += 1
+                    self._cache.move_to_end((feature, value))
+                    resolved[value] = cached
+        if missing:
+            matched = {value: self._match(feature, value) for value in missing}
+            resolved.update(matched)
+            with self._lock:
+                for value, resolution in matched.items():
+                    self._cache[(feature, value)] = resolution
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+                    self.evictions += 1
+        return [resolved[value] for value in values]
+
+    def _match(self, feature: str, value: str) -> Resolution:
+        codes, keys = self.category_codes[feature], self._keys[feature]
+        tokens = normalize_tokens(value)
+        entry = keys.get("".join(tokens))
+        if entry is not None:
+            return _resolution(entry[0], codes[entry[0]], entry[1])
+        # Longest run of words that names a category, the rightmost on a tie ("saree blouse" -> the blouse)
+        for length in range(len(tokens) - 1, 0, -1):
+            for start in range(len(tokens) - length, -1, -1):
+                entry = keys.get("".join(tokens[start:start + length]))
+                if entry is not None:
+                    return _resolution(entry[0], codes[entry[0]], "token")
+        # Misspellings: the whole value and each word are compared with every key sharing a trigram
+        best_score, best = 0.0, set()
+        for candidate in dict.fromkeys(["".join(tokens)] + tokens):
+            score, categories = self._closest(feature, candidate)
+            if score > best_score:
+                best_score, best = score, categories
+            elif score == best_score:
+                best |= categories
+        # Two different categories equally close is a guess, not a match
+        if best_score >= self.min_similarity and len(best) == 1:
+            category = best.pop()
+            return _resolution(category, codes[category], "fuzzy", best_score)
+        return self._fallback[feature]
+
+    def _closest(self, feature: str, key: str) -> Tuple[float, set]:
+        """Highest Dice similarity of `key` to the feature's keys, with the categories reaching it"""
+        if not key:
+            return 0.0, set()
+        grams = _trigrams(key)
+        shared: Dict[str, int] = {}
+        for gram in grams:
+            for candidate in self._postings[feature].get(gram, ()):
+                shared[candidate] = shared.get(candidate, 0) + 1
+        best_score, best = 0.0, set()
+        for candidate, count in shared.items():
+            score = 2 * count / (len(grams) + len(self._key_trigrams[feature][candidate]))
+            category = self._keys[feature][candidate][0]
+            if score > best_score:
+                best_score, best = score, {category}
+            elif score == best_score:
+                best.add(category)
+        return best_score, best
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._cache),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "min_similarity": self.min_similarity,
+                "keys": {feature: len(keys) for feature, keys in self._keys.items()},
+            }
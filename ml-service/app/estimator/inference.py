@@ -0,0 +1,104 @@
+# ml-service/app/estimator/inference.py
+from typing import Dict
+
+import numpy as np
+
+# Node arrays that make up a flattened forest, in the order they are stored on disk
+FLAT_FOREST_FIELDS = ('feature', 'threshold', 'left', 'right', 'missing_left', 'value', 'roots')
+
+
+class FlatForest:
+    """
+    Array-based inference engine for a fitted sklearn forest or tree ensemble.
+
+    Every tree is concatenated into one set of flat node arrays, so a prediction is a
+    few vectorized numpy gathers per tree level over all unfinished (tree, row) paths
+    at once, with no joblib dispatch and no per-call input validation. Leaves point
+    at themselves, which is how a finished path is recognized.
+    Results match sklearn's predict within float tolerance (inputs are compared in
+    float32, as sklearn does, and tree outputs are summed in the same order).
+    """
+
+    def __init__(self, feature: np.ndarray, threshold: np.ndarray, left: np.ndarray, right: np.ndarray,
+                 missing_left: np.ndarray, value: np.ndarray, roots: np.ndarray):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.missing_left = missing_left
+        self.value = value
+        self.roots = roots
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    @property
+    def n_outputs(self) -> int:
+        return self.value.shape[1]
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.feature)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, field).nbytes for field in FLAT_FOREST_FIELDS)
+
+    @classmethod
+    def from_sklearn(cls, model) -> 'FlatForest':
+        """Exports a fitted RandomForestRegressor (or any ensemble of regression trees)"""
+        trees = [estimator.tree_ for estimator in getattr(model, 'estimators_', [model])]
+        offsets = np.cumsum([0] + [tree.node_count for tree in trees])
+        feature, threshold, left, right, missing_left, value = [], [], [], [], [], []
+        for offset, tree in zip(offsets, trees):
+            node_ids = np.arange(tree.node_count)
+            is_leaf = tree.children_left == -1
+            # Leaves loop back to themselves and test feature 0 against +inf (always "left")
+            feature.append(np.where(is_leaf, 0, tree.feature))
+            threshold.append(np.where(is_leaf, np.inf, tree.threshold))
+            left.append(np.where(is_leaf, node_ids, tree.children_left) + offset)
+            right.append(np.where(is_leaf, node_ids, tree.children_right) + offset)
+            missing = getattr(tree, 'missing_go_to_left', np.zeros(tree.node_count, dtype=np.uint8))
+            missing_left.append(np.where(is_leaf, True, missing.astype(bool)))
+            value.append(tree.value[:, :, 0])
+        return cls(
+            feature=np.concatenate(feature).astype(np.int32),
+            threshold=np.concatenate(threshold).astype(np.float64),
+            left=np.concatenate(left).astype(np.int32),
+            right=np.concatenate(right).astype(np.int32),
+            missing_left=np.concatenate(missing_left).astype(np.bool_),
+            value=np.ascontiguousarray(np.concatenate(value), dtype=np.float64),
+            roots=offsets[:-1].astype(np.int32),
+        )
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        return {field: getattr(self, field) for field in FLAT_FOREST_FIELDS}
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> 'FlatForest':
+        return cls(**{field: arrays[field] for field in FLAT_FOREST_FIELDS})
+
+    def apply(self, X: np.ndarray) -> np.ndarray:
+        """Leaf node index reached by every row in every tree, shape (n_trees, n_rows)"""
+        X = np.asarray(X, dtype=np.float32)
+        n_rows = X.shape[0]
+        nodes = np.repeat(self.roots, n_rows)
+        row_of = np.tile(np.arange(n_rows), self.n_trees)
+        # Only (tree, row) paths that have not reached a leaf yet are stepped at each level
+        active = np.flatnonzero(self.left[nodes] != nodes)
+        while active.size:
+            current = nodes[active]
+            x = X[row_of[active], self.feature[current]]
+            go_left = np.where(np.isnan(x), self.missing_left[current], x <= self.threshold[current])
+            current = np.where(go_left, self.left[current], self.right[current])
+            nodes[active] = current
+            active = active[self.left[current] != current]
+        return nodes.reshape(self.n_trees, n_rows)
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """Mean of the tree outputs, shape (n_rows, n_outputs)"""
+        leaf_values = self.value[self.apply(X)]
+        # cumsum adds trees strictly one after another, like sklearn does; sum() would switch
+        # to pairwise summation for a single row and make batch and single results differ
+        return np.cumsum(leaf_values, axis=0)[-1] / self.n_trees
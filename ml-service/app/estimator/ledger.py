@@ -0,0 +1,199 @@
+# ml-service/app/estimator/ledger.py
+"""
+Running sustainability-impact totals per user and for the whole platform.
+
+Each completed swap is estimated once and recorded under its swap_id; recording the same
+swap again changes nothing. Alongside the swap rows, one totals row per
+(user, period, bucket) is updated in the same transaction:
+
+    period "all"    bucket "all"           lifetime totals
+    period "month"  bucket "2026-10"       calendar month (UTC)
+    period "day"    bucket "2026-10-17"    calendar day (UTC)
+
+The platform totals live under user_id "" (PLATFORM). A rollup is a primary-key lookup,
+and a series is a range scan over the buckets it returns, so reads never depend on how
+many swaps have been recorded.
+"""
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Estimate keys stored per swap and summed into the totals (see _format_predictions in service.py)
+IMPACT_FIELDS = ("co2_saved_kg", "water_saved_l", "waste_saved_kg")
+PERIODS = ("all", "month", "day")
+PLATFORM = ""
+
+
+@dataclass
+class SwapImpact:
+    swap_id: str
+    user_id: str
+    completed_at: float
+    co2_saved_kg: float
+    water_saved_l: float
+    waste_saved_kg: float
+    estimator_version: Optional[str] = None
+
+
+def buckets_for(timestamp: float) -> Tuple[Tuple[str, str], ...]:
+    """The (period, bucket) pairs a swap completed at `timestamp` counts towards"""
+    day = datetime.fromtimestamp(timestamp, tz=timezone.utc).date().isoformat()
+    return ("all", "all"), ("month", day[:7]), ("day", day)
+
+
+def _iso(timestamp: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).isoformat() if timestamp is not None else None
+
+
+class ImpactLedger:
+    """
+    SQLite-backed ledger of recorded swaps and their running totals.
+
+    Writes run in IMMEDIATE transactions, so several workers (and processes) can record
+    into the same file; a swap and the totals it contributes to commit together.
+    """
+
+    def __init__(self, sqlite_path: Optional[str] = None):
+        self.sqlite_path = sqlite_path
+        if sqlite_path:
+            directory = os.path.dirname(sqlite_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(sqlite_path or ":memory:", check_same_thread=False, isolation_level=None, timeout=30)
+        if sqlite_path:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS impact_swaps ("
+            "swap_id TEXT PRIMARY KEY, user_id TEXT NOT NULL, completed_at REAL NOT NULL, "
+            "co2_saved_kg REAL NOT NULL, water_saved_l REAL NOT NULL, waste_saved_kg REAL NOT NULL, "
+            "estimator_version TEXT, recorded_at REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS impact_totals ("
+            "user_id TEXT NOT NULL, period TEXT NOT NULL, bucket TEXT NOT NULL, swaps INTEGER NOT NULL, "
+            "co2_saved_kg REAL NOT NULL, water_saved_l REAL NOT NULL, waste_saved_kg REAL NOT NULL, "
+            "first_swap_at REAL NOT NULL, last_swap_at REAL NOT NULL, "
+            "PRIMARY KEY (user_id, period, bucket)) WITHOUT ROWID"
+        )
+
+    def record(self, swaps: Iterable[SwapImpact]) -> Tuple[int, int]:
+        """Records swaps not seen before and adds them to the totals; returns (recorded, duplicates)"""
+        recorded, duplicates = 0, 0
+        # (user_id, period, bucket) -> [swaps, co2, water, waste, first, last], summed before touching the totals
+        deltas: Dict[Tuple[str, str, str], List[float]] = {}
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                for swap in swaps:
+                    cursor = self._db.execute(
+                        "INSERT OR IGNORE INTO impact_swaps (swap_id, user_id, completed_at, co2_saved_kg, "
+                        "water_saved_l, waste_saved_kg, estimator_version, recorded_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (swap.swap_id, swap.user_id, swap.completed_at, swap.co2_saved_kg, swap.water_saved_l,
+                         swap.waste_saved_kg, swap.estimator_version, now)
+                    )
+                    if cursor.rowcount == 0:
+                        duplicates += 1
+                        continue
+                    recorded += 1
+                    buckets = buckets_for(swap.completed_at)
+                    for user_id in (swap.user_id, PLATFORM):
+                        for period, bucket in buckets:
+                            delta = deltas.setdefault((user_id, period, bucket),
+                                                      [0, 0.0, 0.0, 0.0, swap.completed_at, swap.completed_at])
+                            delta[0] += 1
+                            delta[1] += swap.co2_saved_kg
+                            delta[2] += swap.water_saved_l
+                            delta[3] += swap.waste_saved_kg
+                            delta[4] = min(delta[4], swap.completed_at)
+                            delta[5] = max(delta[5], swap.completed_at)
+                self._db.executemany(
+                    "INSERT INTO impact_totals (user_id, period, bucket, swaps, co2_saved_kg, water_saved_l, "
+                    "waste_saved_kg, first_swap_at, last_swap_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (user_id, period, bucket) DO UPDATE SET "
+                    "swaps = swaps + excluded.swaps, co2_saved_kg = co2_saved_kg + excluded.co2_saved_kg, "
+                    "water_saved_l = water_saved_l + excluded.water_saved_l, "
+                    "waste_saved_kg = waste_saved_kg + excluded.waste_saved_kg, "
+                    "first_swap_at = MIN(first_swap_at, excluded.first_swap_at), "
+                    "last_swap_at = MAX(last_swap_at, excluded.last_swap_at)",
+                    [(*key, *delta) for key, delta in deltas.items()]
+                )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        return recorded, duplicates
+
+    def get_swap(self, swap_id: str) -> Optional[Dict]:
+        """A recorded swap as stored, with the savings that went into the totals, or None"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT swap_id, user_id, completed_at, co2_saved_kg, water_saved_l, waste_saved_kg, "
+                "estimator_version, recorded_at FROM impact_swaps WHERE swap_id = ?", (swap_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        swap_id, user_id, completed_at, co2, water, waste, estimator_version, recorded_at = row
+        return {
+            "swap_id": swap_id,
+            "user_id": user_id,
+            "completed_at": _iso(completed_at),
+            "co2_saved_kg": co2,
+            "water_saved_l": water,
+            "waste_saved_kg": waste,
+            "estimator_version": estimator_version,
+            "recorded_at": _iso(recorded_at),
+        }
+
+    def totals(self, user_id: str = PLATFORM) -> Dict:
+        """Lifetime totals for one user, or for the platform (zeros when nothing is recorded)"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT swaps, co2_saved_kg, water_saved_l, waste_saved_kg, first_swap_at, last_swap_at "
+                "FROM impact_totals WHERE user_id = ? AND period = 'all' AND bucket = 'all'", (user_id,)
+            ).fetchone()
+        return self._format(row)
+
+    def series(self, user_id: str = PLATFORM, period: str = "month", since: Optional[str] = None,
+               until: Optional[str] = None, limit: int = 366) -> List[Dict]:
+        """
+        Per-bucket totals in chronological order. `since`/`until` are inclusive bucket names
+        ("2026-01" for months, "2026-01-31" for days); only buckets with swaps are returned.
+        """
+        if period not in PERIODS or period == "all":
+            raise ValueError(f"Unknown period '{period}'; expected 'month' or 'day'")
+        query = ("SELECT bucket, swaps, co2_saved_kg, water_saved_l, waste_saved_kg, first_swap_at, last_swap_at "
+                 "FROM impact_totals WHERE user_id = ? AND period = ?")
+        params: List = [user_id, period]
+        if since:
+            query += " AND bucket >= ?"
+            params.append(since)
+        if until:
+            query += " AND bucket <= ?"
+            params.append(until)
+        # The most recent buckets when there are more than `limit`, still returned oldest first
+        query += " ORDER BY bucket DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._db.execute(query, params).fetchall()
+        return [{"bucket": row[0], **self._format(row[1:])} for row in reversed(rows)]
+
+    @staticmethod
+    def _format(row: Optional[tuple]) -> Dict:
+        if row is None:
+            return {"swaps": 0, **{field: 0.0 for field in IMPACT_FIELDS}, "first_swap_at": None, "last_swap_at": None}
+        swaps, co2, water, waste, first_at, last_at = row
+        return {
+            "swaps": swaps,
+            "co2_saved_kg": round(co2, 3),
+            "water_saved_l": round(water, 3),
+            "waste_saved_kg": round(waste, 3),
+            "first_swap_at": _iso(first_at),
+            "last_swap_at": _iso(last_at),
+        }
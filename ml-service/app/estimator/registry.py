@@ -0,0 +1,168 @@
+# ml-service/app/estimator/registry.py
+import logging
+import os
+import pickle
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+from app.core.metrics import ESTIMATOR_RELOADS, set_estimator_version
+from .artifact import get_current_version, load_artifact, set_current_version
+
+if TYPE_CHECKING:
+    from .service import ResearchBasedSustainabilityEstimator
+
+logger = logging.getLogger(__name__)
+
+
+class ReloadInProgressError(RuntimeError):
+    pass
+
+
+class EstimatorRegistry:
+    """
+    Holds the estimator currently being served and swaps in new artifact versions.
+
+    Loading happens on a background thread; the swap itself is a single reference
+    assignment, so in-flight requests keep the estimator they started with and no
+    request ever sees a half-loaded model. Each worker process also polls the
+    artifact CURRENT pointer, so a reload triggered on one worker reaches the others.
+
+    Nothing is loaded when the registry is created: the first get() (or an explicit
+    ensure_loaded() from a startup hook) loads the CURRENT version.
+    """
+
+    def __init__(self, artifact_dir: str, pickle_path: Optional[str] = None, poll_seconds: float = 10.0):
+        self.artifact_dir = artifact_dir
+        self.pickle_path = pickle_path
+        self.poll_seconds = poll_seconds
+        # (version, estimator) replaced as one tuple so readers always see a consistent pair
+        self._active: Tuple[Optional[str], Optional["ResearchBasedSustainabilityEstimator"]] = (None, None)
+        self._lock = threading.Lock()
+        self._initial_load_lock = threading.Lock()
+        self._initial_load_done = False
+        self._loading_version: Optional[str] = None
+        self._last_error: Optional[str] = None
+        self._loaded_at: Optional[float] = None
+        self._next_poll = 0.0
+
+    @property
+    def version(self) -> Optional[str]:
+        return self._active[0]
+
+    def get(self) -> Optional["ResearchBasedSustainabilityEstimator"]:
+        """Returns the estimator to use for one request (None if nothing is loaded)"""
+        return self.active()[1]
+
+    def active(self) -> Tuple[Optional[str], Optional["ResearchBasedSustainabilityEstimator"]]:
+        """Like get(), but returns the (version, estimator) pair read together, for callers that record the version"""
+        if not self._initial_load_done:
+            self.ensure_loaded()
+        self._maybe_poll()
+        return self._active
+
+    def ensure_loaded(self):
+        """Runs the initial load() once; concurrent callers wait for it instead of loading twice"""
+        with self._initial_load_lock:
+            if not self._initial_load_done:
+                self.load()
+                self._initial_load_done = True
+
+    def warm_up(self) -> Optional[Dict]:
+        """
+        Runs a known and an unknown combination through the estimator, so the lookup table,
+        the forests and the metric series are touched before the first real request.
+        Returns the lookup-path result, or None when no estimator is loaded.
+        """
+        estimator = self.get()
+        if estimator is None:
+            return None
+        known = {feature: next(iter(codes)) for feature, codes in estimator.category_codes.items()}
+        unknown = {feature: "__warm_up__" for feature in known}
+        return estimator.get_ml_estimates_batch([known, unknown])[0]
+
+    def publish_metrics(self):
+        """Re-reports the served version; a forked worker starts with empty metric files"""
+        set_estimator_version(self._active[0])
+
+    def load(self):
+        """Synchronously loads the CURRENT artifact version, falling back to the legacy pickle"""
+        version = get_current_version(self.artifact_dir)
+        if version:
+            try:
+                self._activate(version, load_artifact(os.path.join(self.artifact_dir, version)))
+                logger.info(f"Estimator artifact '{version}' loaded from {self.artifact_dir}")
+                return
+            except Exception as e:
+                self._last_error = f"{version}: {e}"
+                ESTIMATOR_RELOADS.labels(outcome='failure').inc()
+                logger.error(f"Failed to load estimator artifact '{version}': {e}")
+        if self.pickle_path and os.path.exists(self.pickle_path):
+            with open(self.pickle_path, 'rb') as file:
+                estimator: "ResearchBasedSustainabilityEstimator" = pickle.load(file)
+            self._activate("legacy-pickle", estimator)
+            logger.info(f"Estimator loaded from legacy pickle '{self.pickle_path}'")
+            return
+        logger.error(f"No estimator artifact in '{self.artifact_dir}' and no pickle at '{self.pickle_path}'. "
+                     "Estimator endpoints will not work.")
+
+    def reload(self, version: str, publish: bool = False):
+        """
+        Starts loading `version` in the background; the swap happens once it is fully loaded.
+        With publish=True the CURRENT pointer is moved to `version` after the swap, so the
+        other workers only follow a version that has loaded successfully.
+        """
+        with self._lock:
+            if self._loading_version is not None:
+                raise ReloadInProgressError(f"Version '{self._loading_version}' is already loading")
+            self._loading_version = version
+        threading.Thread(target=self._load_in_background, args=(version, publish), daemon=True,
+                         name=f"estimator-reload-{version}").start()
+
+    def status(self) -> Dict:
+        return {
+            "version": self._active[0],
+            "loaded": self._active[1] is not None,
+            "loaded_at": self._loaded_at,
+            "loading_version": self._loading_version,
+            "last_error": self._last_error,
+        }
+
+    def _activate(self, version: str, estimator: "ResearchBasedSustainabilityEstimator"):
+        previous = self._active[0]
+        self._active = (version, estimator)
+        set_estimator_version(version, previous)
+        ESTIMATOR_RELOADS.labels(outcome='success').inc()
+        self._loaded_at = time.time()
+        self._last_error = None
+
+    def _load_in_background(self, version: str, publish: bool = False):
+        try:
+            started = time.perf_counter()
+            estimator = load_artifact(os.path.join(self.artifact_dir, version))
+            self._activate(version, estimator)
+            logger.info(f"Estimator artifact '{version}' swapped in after {time.perf_counter() - started:.2f}s")
+            # Still marked as loading here, so this worker's poll does not swap the old version back in
+            if publish:
+                set_current_version(self.artifact_dir, version)
+        except Exception as e:
+            self._last_error = f"{version}: {e}"
+            ESTIMATOR_RELOADS.labels(outcome='failure').inc()
+            logger.error(f"Failed to load estimator artifact '{version}': {e}")
+        finally:
+            with self._lock:
+                self._loading_version = None
+
+    def _maybe_poll(self):
+        now = time.monotonic()
+        if now < self._next_poll:
+            return
+        self._next_poll = now + self.poll_seconds
+        current = get_current_version(self.artifact_dir)
+        # A version that failed to load is not retried until CURRENT changes again
+        failed = self._last_error is not None and self._last_error.startswith(f"{current}:")
+        if current and current != self._active[0] and self._loading_version is None and not failed:
+            try:
+                self.reload(current)
+            except ReloadInProgressError:
+                pass
@@ -1,7 +1,18 @@
-import pickle
-from fastapi import APIRouter
-from pydantic import BaseModel, Field
-from .service import ResearchBasedSustainabilityEstimator
+import asyncio
+import threading
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from pydantic import BaseModel, Field, ValidationError
+
+from app.core.config import (
+    ESTIMATOR_ARTIFACT_DIR, ESTIMATOR_PICKLE_PATH, ESTIMATOR_RELOAD_POLL_SECONDS,
+    ESTIMATOR_IMPACT_LEDGER_PATH, ESTIMATOR_IMPACT_BACKFILL_BATCH_SIZE
+)
+from app.core.security import require_admin_token
+from .artifact import check_version, get_current_version, list_versions
+from .ledger import PLATFORM, ImpactLedger, SwapImpact
+from .registry import EstimatorRegistry, ReloadInProgressError
 
 router = APIRouter(
     prefix="/estimator",
@@ -14,22 +25,254 @@ class SwapItem(BaseModel):
     brand: str = Field(..., example="H&M")
     condition: str = Field(..., example="Good")
 
-try:
-    with open('sustainability_estimator.pkl', 'rb') as file:
-        estimator: ResearchBasedSustainabilityEstimator = pickle.load(file)
-    print("✅ Estimator model loaded successfully.")
-except FileNotFoundError:
-    print("❌ Error: 'sustainability_estimator.pkl' not found. Estimator endpoints will not work.")
-    estimator = None
+class SwapItemBatch(BaseModel):
+    items: List[SwapItem] = Field(..., max_length=10000)
+
+class CanonicalizeRequest(BaseModel):
+    values: Dict[str, List[str]] = Field(..., example={"item_type": ["Shirt", "tshirt"], "brand": ["levis"]})
+
+class SwapRecord(SwapItem):
+    swap_id: str = Field(..., min_length=1, example="swap_8f2c")
+    user_id: str = Field(..., min_length=1, example="user_42")
+    completed_at: Optional[datetime] = Field(None, description="When the swap completed (UTC if no offset); defaults to now")
+
+class ReloadRequest(BaseModel):
+    version: Optional[str] = Field(None, description="Artifact version to serve; defaults to the CURRENT pointer")
+
+# Loaded by the app's startup hook (see main.py), or by the first request that needs it
+registry = EstimatorRegistry(ESTIMATOR_ARTIFACT_DIR, ESTIMATOR_PICKLE_PATH, ESTIMATOR_RELOAD_POLL_SECONDS)
+
+# Opened on first use, in the worker that serves it (SQLite connections must not cross a fork)
+impact_ledger: Optional[ImpactLedger] = None
+_ledger_lock = threading.Lock()
+
+def get_impact_ledger() -> ImpactLedger:
+    global impact_ledger
+    if impact_ledger is None:
+        with _ledger_lock:
+            if impact_ledger is None:
+                impact_ledger = ImpactLedger(ESTIMATOR_IMPACT_LEDGER_PATH or None)
+    return impact_ledger
 
 @router.post("/estimate/")
 def get_sustainability_estimate(item: SwapItem):
     """
     Takes garment details as input and returns the estimated environmental savings.
     """
+    estimator = registry.get()
     if estimator is None:
         return {"error": "Estimator model not loaded. Please check server logs."}
     
     savings = estimator.get_ml_estimate(**item.dict())
     
-    return savings
\ No newline at end of file
+    return savings
+
+@router.post("/estimate/batch/")
+def get_sustainability_estimates_batch(batch: SwapItemBatch):
+    """
+    Estimates the environmental savings for many garments in one vectorized pass.
+    Results are returned in the same order as the submitted items.
+    """
+    estimator = registry.get()
+    if estimator is None:
+        return {"error": "Estimator model not loaded. Please check server logs."}
+
+    results = estimator.get_ml_estimates_batch([item.dict() for item in batch.items])
+
+    return {"count": len(results), "results": results}
+
+# Raw values accepted per canonicalize call, across all features
+MAX_CANONICALIZE_VALUES = 100000
+
+@router.post("/canonicalize/")
+def canonicalize_values(request: CanonicalizeRequest):
+    """
+    Resolves raw category values to the categories the estimator uses, feature by feature and in order.
+    Repeated values are matched once, so bulk callers can send a whole catalogue in one call.
+    """
+    estimator = registry.get()
+    if estimator is None:
+        raise HTTPException(status_code=503, detail="Estimator model not loaded. Please check server logs.")
+    unknown = sorted(set(request.values) - set(estimator.category_codes))
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown features: {', '.join(unknown)}")
+    if sum(len(values) for values in request.values.values()) > MAX_CANONICALIZE_VALUES:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_CANONICALIZE_VALUES} values per call")
+    return {
+        feature: [{"input": value, **resolution.summary}
+                  for value, resolution in zip(values, estimator.canonicalize(feature, values))]
+        for feature, values in request.values.items()
+    }
+
+@router.get("/canonicalize/stats")
+def get_canonicalize_stats():
+    """Size and hit rate of this worker's canonicalization cache."""
+    estimator = registry.get()
+    if estimator is None:
+        raise HTTPException(status_code=503, detail="Estimator model not loaded. Please check server logs.")
+    return estimator.canonicalizer.stats()
+
+@router.get("/admin/model", dependencies=[Depends(require_admin_token)])
+def get_model_status():
+    """Shows the artifact version this worker serves and the versions available on disk."""
+    return {
+        **registry.status(),
+        "current_pointer": get_current_version(ESTIMATOR_ARTIFACT_DIR),
+        "available_versions": list_versions(ESTIMATOR_ARTIFACT_DIR),
+    }
+
+@router.post("/admin/reload", status_code=202, dependencies=[Depends(require_admin_token)])
+def reload_model(request: ReloadRequest):
+    """
+    Loads an artifact version in the background and swaps it in once ready.
+    Once this worker has loaded it, the CURRENT pointer is updated too, so the other workers
+    pick it up on their next poll; a version that fails to load leaves CURRENT untouched.
+    """
+    version = request.version
+    if version:
+        try:
+            check_version(ESTIMATOR_ARTIFACT_DIR, version)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except FileNotFoundError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+    else:
+        version = get_current_version(ESTIMATOR_ARTIFACT_DIR)
+        if not version:
+            raise HTTPException(status_code=404, detail="No CURRENT artifact version to reload")
+    try:
+        registry.reload(version, publish=bool(request.version))
+    except ReloadInProgressError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return registry.status()
+
+def _record_swaps(ledger: ImpactLedger, records: List[SwapRecord]) -> Tuple[int, int, List[Dict]]:
+    """Estimates the swapped items in one vectorized pass and records them; returns (recorded, duplicates, estimates)"""
+    version, estimator = registry.active()
+    if estimator is None:
+        raise HTTPException(status_code=503, detail="Estimator model not loaded. Please check server logs.")
+    estimates = estimator.get_ml_estimates_batch([record.dict() for record in records])
+    now = datetime.now(timezone.utc)
+    swaps = []
+    for record, estimate in zip(records, estimates):
+        completed_at = record.completed_at or now
+        if completed_at.tzinfo is None:
+            completed_at = completed_at.replace(tzinfo=timezone.utc)
+        swaps.append(SwapImpact(
+            swap_id=record.swap_id,
+            user_id=record.user_id,
+            completed_at=completed_at.timestamp(),
+            co2_saved_kg=float(estimate['co2_saved_kg']),
+            water_saved_l=float(estimate['water_saved_l']),
+            waste_saved_kg=float(estimate['waste_saved_kg']),
+            estimator_version=version
+        ))
+    recorded, duplicates = ledger.record(swaps)
+    return recorded, duplicates, estimates
+
+@router.post("/impact/swaps")
+def record_swap_impact(record: SwapRecord, ledger: ImpactLedger = Depends(get_impact_ledger)):
+    """
+    Records a completed swap's estimated savings in the user's and the platform's running totals.
+    Idempotent per swap_id: recording the same swap again returns recorded=false, changes nothing
+    and its "estimate" is the ledger row stored the first time, so the response matches the totals.
+    """
+    stored = ledger.get_swap(record.swap_id)
+    if stored is None:
+        recorded, _, estimates = _record_swaps(ledger, [record])
+        if recorded == 1:
+            return {"swap_id": record.swap_id, "recorded": True, "estimate": estimates[0]}
+        # Another request recorded it between the lookup and the insert
+        stored = ledger.get_swap(record.swap_id)
+    return {"swap_id": record.swap_id, "recorded": False, "estimate": stored}
+
+@router.get("/impact/users/{user_id}")
+def get_user_impact(user_id: str, ledger: ImpactLedger = Depends(get_impact_ledger)):
+    """Lifetime savings of one user's recorded swaps (zeros for a user with none)."""
+    return {"user_id": user_id, **ledger.totals(user_id)}
+
+@router.get("/impact/users/{user_id}/series")
+def get_user_impact_series(user_id: str, period: str = Query("month", pattern="^(month|day)$"),
+                           since: Optional[str] = None, until: Optional[str] = None,
+                           limit: int = Query(366, ge=1, le=3660), ledger: ImpactLedger = Depends(get_impact_ledger)):
+    """Savings per calendar month or day (UTC); since/until are inclusive bucket names such as 2026-01 or 2026-01-31."""
+    return {"user_id": user_id, "period": period,
+            "buckets": ledger.series(user_id, period, since, until, limit)}
+
+@router.get("/impact/platform")
+def get_platform_impact(ledger: ImpactLedger = Depends(get_impact_ledger)):
+    """Lifetime savings of every recorded swap on the platform."""
+    return ledger.totals(PLATFORM)
+
+@router.get("/impact/platform/series")
+def get_platform_impact_series(period: str = Query("month", pattern="^(month|day)$"),
+                               since: Optional[str] = None, until: Optional[str] = None,
+                               limit: int = Query(366, ge=1, le=3660), ledger: ImpactLedger = Depends(get_impact_ledger)):
+    """Platform-wide savings per calendar month or day (UTC)."""
+    return {"period": period, "buckets": ledger.series(PLATFORM, period, since, until, limit)}
+
+# Longest NDJSON line accepted by the backfill; longer lines are skipped as invalid
+MAX_BACKFILL_LINE_BYTES = 64 * 1024
+
+async def _ndjson_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Optional[bytes]]]:
+    """Yields (line number, line) from a byte stream; an over-long line is yielded as None without being buffered"""
+    buffer = b""
+    line_number = 0
+    skipping = False
+    async for chunk in chunks:
+        buffer += chunk
+        while True:
+            end = buffer.find(b"\n")
+            if end < 0:
+                break
+            line, buffer = buffer[:end], buffer[end + 1:]
+            line_number += 1
+            if skipping:
+                skipping = False
+                yield line_number, None
+            elif line.strip():
+                yield line_number, line
+        if len(buffer) > MAX_BACKFILL_LINE_BYTES:
+            buffer = b""
+            skipping = True
+    if skipping:
+        yield line_number + 1, None
+    elif buffer.strip():
+        yield line_number + 1, buffer
+
+@router.post("/admin/impact/backfill", dependencies=[Depends(require_admin_token)])
+async def backfill_swap_impact(request: Request, ledger: ImpactLedger = Depends(get_impact_ledger)):
+    """
+    Records historic swaps from an NDJSON body, one SwapRecord object per line.
+    The body is streamed and estimated in batches, so memory use does not grow with its size.
+    Swaps already in the ledger are counted as duplicates, so a failed backfill can simply be re-run.
+    """
+    summary = {"lines": 0, "recorded": 0, "duplicates": 0, "invalid": 0, "errors": []}
+    batch: List[SwapRecord] = []
+
+    async def flush():
+        recorded, duplicates, _ = await asyncio.to_thread(_record_swaps, ledger, batch)
+        summary["recorded"] += recorded
+        summary["duplicates"] += duplicates
+        batch.clear()
+
+    async for line_number, line in _ndjson_lines(request.stream()):
+        summary["lines"] += 1
+        error = None
+        if line is None:
+            error = f"Line longer than {MAX_BACKFILL_LINE_BYTES} bytes"
+        else:
+            try:
+                batch.append(SwapRecord.model_validate_json(line))
+            except ValidationError as e:
+                error = "; ".join(f"{'.'.join(map(str, err['loc'])) or 'line'}: {err['msg']}" for err in e.errors())
+        if error is not None:
+            summary["invalid"] += 1
+            if len(summary["errors"]) < 20:
+                summary["errors"].append({"line": line_number, "error": error})
+            continue
+        if len(batch) >= ESTIMATOR_IMPACT_BACKFILL_BATCH_SIZE:
+            await flush()
+    if batch:
+        await flush()
+    return summary
@@ -5,11 +5,41 @@ from sklearn.ensemble import RandomForestRegressor
 from sklearn.preprocessing import LabelEncoder, StandardScaler
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_absolute_error, r2_score
-from typing import Dict
+from typing import Dict, List, Optional, Tuple
+import time
 import warnings
 
+from app.core.metrics import ESTIMATOR_CANONICAL_MATCHES, ESTIMATOR_ITEMS, ESTIMATOR_STAGE_SECONDS
+from .canonical import CategoryCanonicalizer, Resolution
+from .inference import FlatForest
+
 warnings.filterwarnings('ignore')
 
+CATEGORICAL_FEATURES = ['item_type', 'material', 'brand', 'condition']
+# Per-category aggregates used as model features: feature column -> (grouping column, aggregation)
+CATEGORY_AGGREGATES = {
+    'weight_kg': ('item_type', 'median'),
+    'manufacturing_multiplier': ('item_type', 'mean'),
+    'brand_multiplier': ('brand', 'mean'),
+    'condition_multiplier': ('condition', 'mean'),
+}
+
+
+# Counter children per (feature, match); labels() costs more than the lookup path it would count
+_CANONICAL_MATCH_COUNTERS = {}
+
+
+def _count_canonical_match(feature: str, match: str, count: int):
+    counter = _CANONICAL_MATCH_COUNTERS.get((feature, match))
+    if counter is None:
+        counter = _CANONICAL_MATCH_COUNTERS[(feature, match)] = ESTIMATOR_CANONICAL_MATCHES.labels(feature=feature, match=match)
+    counter.inc(count)
+
+
+def _round(values: np.ndarray, ndigits: int) -> np.ndarray:
+    """Python's correctly-rounded round() per element; np.round differs on ~1% of LCA values"""
+    return np.array([round(value, ndigits) for value in values.tolist()])
+
 # ResearchBasedSustainabilityEstimator class for estimating sustainability impact of clothing swaps
 class ResearchBasedSustainabilityEstimator:
     """
@@ -19,15 +49,41 @@ class ResearchBasedSustainabilityEstimator:
     """
 
     def __init__(self):
-        self.lca_database = self._initialize_research_based_database()
+        # Built on first access; only training and analysis need the full table
+        self._lca_database = None
         self.ml_models = {}
+        # Flattened copies of ml_models used for inference when available (see inference.py)
+        self.inference_engines = {}
+        self.targets = []
+        # Per-target mean/scale the multi-output forest was trained on, or None
+        self.target_scaling = None
+        self.training_report = None
         self.encoders = {}
         self.scaler = StandardScaler()
         self.is_trained = False
+        self.lookup_table = None
+        self.category_codes = {}
+        self.category_stats = {}
+        # Built from category_codes on first use (see canonical.py)
+        self._canonicalizer = None
         self.data_sources = self._get_data_sources()
         # Define feature columns here to be accessible by ML methods
         self.feature_cols = ['item_type_encoded', 'material_encoded', 'brand_encoded', 'condition_encoded', 'weight_kg', 'manufacturing_multiplier', 'brand_multiplier', 'condition_multiplier', 'weight_material_interaction', 'brand_condition_interaction']
 
+    @property
+    def lca_database(self) -> pd.DataFrame:
+        if self._lca_database is None:
+            self._lca_database = self._initialize_research_based_database()
+        return self._lca_database
+
+    def __getstate__(self):
+        # Keep the ~19k-row table, the derived inference engines and the canonicalizer
+        # (which holds a lock) out of the serialized model; all are regenerated on demand
+        state = self.__dict__.copy()
+        state['_lca_database'] = None
+        state['inference_engines'] = {}
+        state['_canonicalizer'] = None
+        return state
 
     def _get_data_sources(self) -> Dict:
         """Document all data sources used for transparency"""
@@ -82,33 +138,47 @@ class ResearchBasedSustainabilityEstimator:
         condition_multipliers = {
             'brand_new': 1.00, 'Fairly New': 0.08, 'Excellent': 0.12, 'Used': 0.18, 'Visible Wear': 0.28, 'Needs Repair': 0.45,
         }
-        lca_data = []
-        for item_type, item_specs in garment_specs.items():
-            for material, material_data in higg_materials.items():
-                for brand, brand_mult in brand_multipliers.items():
-                    for condition, condition_mult in condition_multipliers.items():
-                        weight = item_specs['weight_kg']
-                        manufacturing_mult = item_specs['manufacturing_multiplier']
-                        base_co2 = material_data['co2_per_kg'] * weight * manufacturing_mult
-                        base_water = material_data['water_per_kg'] * weight * manufacturing_mult
-                        base_waste = weight * 0.15
-                        final_co2 = base_co2 * brand_mult * condition_mult
-                        final_water = base_water * brand_mult * condition_mult
-                        final_waste = base_waste * brand_mult * condition_mult
-                        lca_data.append({
-                            'item_type': item_type, 'material': material, 'brand': brand, 'condition': condition,
-                            'weight_kg': weight, 'co2_kg': round(max(0.01, final_co2), 3),
-                            'water_l': round(max(1, final_water), 0), 'waste_kg': round(max(0.001, final_waste), 4),
-                            'manufacturing_multiplier': manufacturing_mult, 'brand_multiplier': brand_mult,
-                            'condition_multiplier': condition_mult
-                        })
-        return pd.DataFrame(lca_data)
-
-    def train_ml_models(self, test_size: float = 0.2, random_state: int = 42):
+        # Cartesian product in the same row order as nested item_type/material/brand/condition loops
+        shape = (len(garment_specs), len(higg_materials), len(brand_multipliers), len(condition_multipliers))
+        item_idx, material_idx, brand_idx, condition_idx = np.indices(shape).reshape(len(shape), -1)
+        weight = np.array([spec['weight_kg'] for spec in garment_specs.values()])[item_idx]
+        manufacturing_mult = np.array([spec['manufacturing_multiplier'] for spec in garment_specs.values()])[item_idx]
+        co2_per_kg = np.array([m['co2_per_kg'] for m in higg_materials.values()], dtype=float)[material_idx]
+        water_per_kg = np.array([m['water_per_kg'] for m in higg_materials.values()], dtype=float)[material_idx]
+        brand_mult = np.array(list(brand_multipliers.values()))[brand_idx]
+        condition_mult = np.array(list(condition_multipliers.values()))[condition_idx]
+        # Same operation order as the scalar formulas so every value is bit-identical
+        base_co2 = co2_per_kg * weight * manufacturing_mult
+        base_water = water_per_kg * weight * manufacturing_mult
+        base_waste = weight * 0.15
+        final_co2 = base_co2 * brand_mult * condition_mult
+        final_water = base_water * brand_mult * condition_mult
+        final_waste = base_waste * brand_mult * condition_mult
+
+        def categorical(names, idx):
+            return pd.Categorical.from_codes(idx, categories=list(names))
+
+        return pd.DataFrame({
+            'item_type': categorical(garment_specs, item_idx), 'material': categorical(higg_materials, material_idx),
+            'brand': categorical(brand_multipliers, brand_idx), 'condition': categorical(condition_multipliers, condition_idx),
+            'weight_kg': weight, 'co2_kg': _round(np.maximum(0.01, final_co2), 3),
+            'water_l': _round(np.maximum(1, final_water), 0), 'waste_kg': _round(np.maximum(0.001, final_waste), 4),
+            'manufacturing_multiplier': manufacturing_mult, 'brand_multiplier': brand_mult,
+            'condition_multiplier': condition_mult
+        })
+
+    def train_ml_models(self, test_size: float = 0.2, random_state: int = 42, n_estimators: int = 100,
+                        max_depth: Optional[int] = None, min_samples_leaf: int = 1,
+                        multi_output: bool = False, n_jobs: int = -1) -> Dict:
+        """
+        Trains the forests and returns held-out MAE / R² per target.
+        With multi_output=True a single forest predicts all targets; targets are standardized
+        first so water (litres) does not dominate the split criterion over waste (kg).
+        """
         print("Training ML models on research-based data...")
+        started = time.perf_counter()
         df = self.lca_database.copy()
-        categorical_features = ['item_type', 'material', 'brand', 'condition']
-        for feature in categorical_features:
+        for feature in CATEGORICAL_FEATURES:
             le = LabelEncoder()
             df[f'{feature}_encoded'] = le.fit_transform(df[feature])
             self.encoders[feature] = le
@@ -117,40 +187,212 @@ class ResearchBasedSustainabilityEstimator:
         X = df[self.feature_cols]
         X_scaled = self.scaler.fit_transform(X)
         targets = ['co2_kg', 'water_l', 'waste_kg']
-        for target in targets:
-            y = df[target]
+        forest_params = dict(n_estimators=n_estimators, max_depth=max_depth, min_samples_leaf=min_samples_leaf,
+                             random_state=random_state, n_jobs=n_jobs)
+        self.ml_models = {}
+        self.target_scaling = None
+        y_true, y_pred = {}, {}
+        if multi_output:
+            y = df[targets].to_numpy()
             X_train, X_test, y_train, y_test = train_test_split(X_scaled, y, test_size=test_size, random_state=random_state)
-            rf_model = RandomForestRegressor(n_estimators=100, random_state=random_state, n_jobs=-1)
-            rf_model.fit(X_train, y_train)
-            self.ml_models[target] = rf_model
+            self.target_scaling = {'mean': y_train.mean(axis=0), 'scale': y_train.std(axis=0)}
+            rf_model = RandomForestRegressor(**forest_params)
+            rf_model.fit(X_train, (y_train - self.target_scaling['mean']) / self.target_scaling['scale'])
+            self.ml_models['multi_output'] = rf_model
+            predictions = rf_model.predict(X_test) * self.target_scaling['scale'] + self.target_scaling['mean']
+            for i, target in enumerate(targets):
+                y_true[target], y_pred[target] = y_test[:, i], predictions[:, i]
+        else:
+            for target in targets:
+                y = df[target]
+                X_train, X_test, y_train, y_test = train_test_split(X_scaled, y, test_size=test_size, random_state=random_state)
+                rf_model = RandomForestRegressor(**forest_params)
+                rf_model.fit(X_train, y_train)
+                self.ml_models[target] = rf_model
+                y_true[target], y_pred[target] = y_test, rf_model.predict(X_test)
+        self.targets = targets
+        self._build_category_indexes()
+        self.compile_inference_engines()
+        self.lookup_table = None
         self.is_trained = True
+        self.training_report = {
+            'config': {**forest_params, 'multi_output': multi_output, 'test_size': test_size},
+            'metrics': {target: {'mae': float(mean_absolute_error(y_true[target], y_pred[target])),
+                                 'r2': float(r2_score(y_true[target], y_pred[target]))} for target in targets},
+            'train_seconds': round(time.perf_counter() - started, 3),
+        }
         print("ML models trained successfully!")
+        return self.training_report
+
+    def _build_category_indexes(self):
+        """
+        Precomputes everything the request path needs from the LCA database:
+        value -> encoder code maps and the per-category aggregates, as arrays indexed by code.
+        """
+        df = self.lca_database
+        self._canonicalizer = None
+        self.category_codes = {
+            feature: {value: code for code, value in enumerate(self.encoders[feature].classes_)}
+            for feature in CATEGORICAL_FEATURES
+        }
+        # Same masks get_ml_estimate used to evaluate per request, so the values are bit-identical
+        self.category_stats = {
+            column: np.array([
+                getattr(df[df[group] == value][column], agg)()
+                for value in self.encoders[group].classes_
+            ])
+            for column, (group, agg) in CATEGORY_AGGREGATES.items()
+        }
+
+    def __setstate__(self, state):
+        # Older pickles stored the table eagerly under the public name
+        state.pop('lca_database', None)
+        state.setdefault('_lca_database', None)
+        state['_canonicalizer'] = None
+        self.__dict__.update(state)
+        # Estimators pickled before the category indexes existed get them built once at load time
+        self.__dict__.setdefault('lookup_table', None)
+        self.__dict__.setdefault('targets', list(self.ml_models))
+        self.__dict__.setdefault('target_scaling', None)
+        self.__dict__.setdefault('training_report', None)
+        if self.is_trained and not self.__dict__.get('category_stats'):
+            self._build_category_indexes()
+        if self.is_trained and not self.__dict__.get('inference_engines'):
+            self.compile_inference_engines()
+
+    def compile_inference_engines(self):
+        """Exports every trained forest into a FlatForest, which predict paths then use automatically"""
+        self.inference_engines = {}
+        for name, model in self.ml_models.items():
+            engine = FlatForest.from_sklearn(model)
+            if self.target_scaling is not None:
+                # Undo the target standardization inside the leaves, so inference pays nothing for it
+                engine.value = engine.value * self.target_scaling['scale'] + self.target_scaling['mean']
+            self.inference_engines[name] = engine
+
+    def _predict_scaled(self, scaled_features: np.ndarray) -> np.ndarray:
+        """Raw predictions for already scaled features, one column per target"""
+        if self.inference_engines:
+            return np.column_stack([engine.predict(scaled_features) for engine in self.inference_engines.values()])
+        predictions = np.column_stack([model.predict(scaled_features) for model in self.ml_models.values()])
+        if self.target_scaling is not None:
+            predictions = predictions * self.target_scaling['scale'] + self.target_scaling['mean']
+        return predictions
+
+    @property
+    def canonicalizer(self) -> CategoryCanonicalizer:
+        if self._canonicalizer is None:
+            self._canonicalizer = CategoryCanonicalizer(self.category_codes)
+        return self._canonicalizer
+
+    def canonicalize(self, feature: str, values) -> List[Resolution]:
+        """Resolves raw values of one feature to categories, matching each distinct value once"""
+        resolutions = self.canonicalizer.resolve_many(feature, values)
+        matches: Dict[str, int] = {}
+        for resolution in resolutions:
+            matches[resolution.match] = matches.get(resolution.match, 0) + 1
+        for match, count in matches.items():
+            _count_canonical_match(feature, match, count)
+        return resolutions
+
+    def _encode(self, feature: str, values) -> Tuple[np.ndarray, np.ndarray, List[Resolution]]:
+        """
+        Maps raw values to encoder codes through the canonicalizer. Values that match no
+        category get the code of 'Unknown' (or the first class), matching LabelEncoder
+        usage at training time. Returns (codes, known_mask, resolutions).
+        """
+        resolutions = self.canonicalize(feature, values)
+        codes = np.array([resolution.code for resolution in resolutions], dtype=np.int64)
+        known = np.array([resolution.known for resolution in resolutions], dtype=bool)
+        return codes, known, resolutions
+
+    def _predict_encoded(self, codes: Dict[str, np.ndarray], known: Dict[str, np.ndarray]) -> np.ndarray:
+        """Raw predictions, one row per item and one column per target"""
+        n_items = len(codes['item_type'])
+        predictions = np.empty((n_items, len(self.targets)))
+        all_known = np.logical_and.reduce([known[feature] for feature in CATEGORICAL_FEATURES])
+        to_predict = np.ones(n_items, dtype=bool)
+        if self.lookup_table is not None and all_known.any():
+            started = time.perf_counter()
+            predictions[all_known] = self.lookup_table[
+                codes['item_type'][all_known], codes['material'][all_known],
+                codes['brand'][all_known], codes['condition'][all_known]
+            ]
+            to_predict = ~all_known
+            ESTIMATOR_STAGE_SECONDS.labels(stage='lookup').observe(time.perf_counter() - started)
+            ESTIMATOR_ITEMS.labels(path='lookup').inc(int(all_known.sum()))
+        if to_predict.any():
+            started = time.perf_counter()
+            subset_codes = {feature: c[to_predict] for feature, c in codes.items()}
+            subset_known = {feature: k[to_predict] for feature, k in known.items()}
+            scaled_features = self._scaled_features(subset_codes, subset_known)
+            features_done = time.perf_counter()
+            predictions[to_predict] = self._predict_scaled(scaled_features)
+            ESTIMATOR_STAGE_SECONDS.labels(stage='features').observe(features_done - started)
+            ESTIMATOR_STAGE_SECONDS.labels(stage='predict').observe(time.perf_counter() - features_done)
+            ESTIMATOR_ITEMS.labels(path='model').inc(int(to_predict.sum()))
+        return predictions
+
+    def _scaled_features(self, codes: Dict[str, np.ndarray], known: Dict[str, np.ndarray]) -> np.ndarray:
+        """Builds the scaled feature matrix in feature_cols order without touching pandas"""
+        columns = {f'{feature}_encoded': codes[feature] for feature in CATEGORICAL_FEATURES}
+        for column, (group, _) in CATEGORY_AGGREGATES.items():
+            # Aggregates of a value absent from the database are NaN, as the pandas masks produced
+            columns[column] = np.where(known[group], self.category_stats[column][codes[group]], np.nan)
+        columns['weight_material_interaction'] = columns['weight_kg'] * columns['material_encoded']
+        columns['brand_condition_interaction'] = columns['brand_encoded'] * columns['condition_encoded']
+        features = np.column_stack([columns[col] for col in self.feature_cols]).astype(np.float64, copy=False)
+        # Equivalent to self.scaler.transform, minus the DataFrame validation overhead
+        features -= self.scaler.mean_
+        features /= self.scaler.scale_
+        return features
 
     def get_ml_estimate(self, item_type: str, material: str, brand: str, condition: str, **kwargs) -> Dict:
         if not self.is_trained:
             raise ValueError("Models not trained. Call train_ml_models() first.")
-        weight_kg = self.lca_database[self.lca_database['item_type'] == item_type]['weight_kg'].median()
-        encoded_features = {}
-        for feature in ['item_type', 'material', 'brand', 'condition']:
-            le = self.encoders[feature]
-            value_to_encode = locals()[feature]
-            if value_to_encode not in le.classes_:
-                value_to_encode = 'Unknown' if 'Unknown' in le.classes_ else le.classes_[0]
-            encoded_features[f'{feature}_encoded'] = le.transform([value_to_encode])[0]
-        brand_mult = self.lca_database[self.lca_database['brand'] == brand]['brand_multiplier'].mean()
-        condition_mult = self.lca_database[self.lca_database['condition'] == condition]['condition_multiplier'].mean()
-        manufacturing_mult = self.lca_database[self.lca_database['item_type'] == item_type]['manufacturing_multiplier'].mean()
-        features_dict = {
-            **encoded_features, 'weight_kg': weight_kg,
-            'manufacturing_multiplier': manufacturing_mult, 'brand_multiplier': brand_mult,
-            'condition_multiplier': condition_mult,
-            'weight_material_interaction': weight_kg * encoded_features['material_encoded'],
-            'brand_condition_interaction': encoded_features['brand_encoded'] * encoded_features['condition_encoded']
-        }
-        features_df = pd.DataFrame([features_dict])[self.feature_cols]
-        scaled_features = self.scaler.transform(features_df)
-        predictions = {}
-        for target, model in self.ml_models.items():
-            pred = model.predict(scaled_features)[0]
-            predictions[f'{target.replace("_kg", "_saved_kg").replace("_l", "_saved_l")}'] = round(max(0, pred), 3)
-        return {"method": "ml_prediction", **predictions}
\ No newline at end of file
+        return self.get_ml_estimates_batch([{
+            'item_type': item_type, 'material': material, 'brand': brand, 'condition': condition
+        }])[0]
+
+    def get_ml_estimates_batch(self, items: List[Dict]) -> List[Dict]:
+        """
+        Vectorized version of get_ml_estimate for many items at once.
+        Returns one result per item, in order, identical to calling get_ml_estimate on each.
+        Each result lists under "canonical" the category used for every input and how it matched.
+        """
+        if not self.is_trained:
+            raise ValueError("Models not trained. Call train_ml_models() first.")
+        if not items:
+            return []
+        started = time.perf_counter()
+        codes, known, resolutions = {}, {}, {}
+        for feature in CATEGORICAL_FEATURES:
+            codes[feature], known[feature], resolutions[feature] = self._encode(feature, [item[feature] for item in items])
+        ESTIMATOR_STAGE_SECONDS.labels(stage='encode').observe(time.perf_counter() - started)
+        results = [self._format_predictions(row) for row in self._predict_encoded(codes, known)]
+        for index, result in enumerate(results):
+            result['canonical'] = {feature: resolutions[feature][index].summary for feature in CATEGORICAL_FEATURES}
+        return results
+
+    def precompute_lookup_table(self):
+        """
+        Predicts every known (item_type, material, brand, condition) combination once
+        and stores the raw predictions in a dense array indexed by encoder codes.
+        """
+        if not self.is_trained:
+            raise ValueError("Models not trained. Call train_ml_models() first.")
+        print("Precomputing dense lookup table...")
+        shape = tuple(len(self.category_codes[feature]) for feature in CATEGORICAL_FEATURES)
+        flat_codes = np.indices(shape).reshape(len(shape), -1)
+        codes = dict(zip(CATEGORICAL_FEATURES, flat_codes))
+        known = {feature: np.ones(flat_codes.shape[1], dtype=bool) for feature in CATEGORICAL_FEATURES}
+        self.lookup_table = None
+        predictions = self._predict_encoded(codes, known)
+        self.lookup_table = predictions.reshape(shape + (len(self.targets),))
+        print(f"Lookup table ready: {self.lookup_table.shape}, {self.lookup_table.nbytes / 1024:.0f} KiB")
+
+    def _format_predictions(self, predictions) -> Dict:
+        result = {"method": "ml_prediction"}
+        for target, pred in zip(self.targets, predictions):
+            result[f'{target.replace("_kg", "_saved_kg").replace("_l", "_saved_l")}'] = round(max(0, pred), 3)
+        return result
@@ -0,0 +1,114 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from app.core.metrics import MODERATION_BATCH_SIZE
+
+
+class MicroBatcher:
+    """
+    Groups concurrent submissions into batches for one handler call.
+
+    A batch is handed to `handler` once it holds `max_items` submissions, or `window_seconds`
+    after its first submission arrived, whichever comes first. When `max_concurrent` handler
+    calls are already running at the end of the window, the batch keeps collecting until one
+    of them finishes (or the batch is full), so batches grow with load instead of queueing
+    up half-empty behind busy model-call slots. The handler gets the
+    payloads in submission order and returns one result per payload; a result that is an
+    exception is raised to that caller only, and an exception raised by the handler itself
+    goes to every caller in the batch. All of this runs on the serving event loop.
+    """
+
+    def __init__(self, handler: Callable[[List[Any]], Awaitable[List[Any]]], max_items: int = 8,
+                 window_seconds: float = 0.05, max_concurrent: Optional[int] = None):
+        self.handler = handler
+        self.max_items = max_items
+        self.window_seconds = window_seconds
+        self.max_concurrent = max_concurrent
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # Set when the window ended while every handler slot was busy
+        self._waiting_for_slot = False
+        # Running handler calls, referenced so they are not garbage-collected mid-flight
+        self._running: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.items = 0
+        self.full_flushes = 0
+        self.window_flushes = 0
+        self.slot_flushes = 0
+        self.failed_batches = 0
+
+    async def submit(self, payload: Any) -> Any:
+        """Adds `payload` to the open batch and waits for its own result"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((payload, future))
+        if len(self._pending) >= self.max_items:
+            self._flush(full=True)
+        elif self._timer is None and not self._waiting_for_slot:
+            self._timer = loop.call_later(self.window_seconds, self._on_window_end)
+        return await future
+
+    def _on_window_end(self):
+        self._timer = None
+        if self.max_concurrent is not None and len(self._running) >= self.max_concurrent:
+            self._waiting_for_slot = True
+            return
+        self.window_flushes += 1
+        self._flush()
+
+    def _on_batch_done(self, task: asyncio.Task):
+        self._running.discard(task)
+        if self._waiting_for_slot and self._pending:
+            self.slot_flushes += 1
+            self._flush()
+
+    def _flush(self, full: bool = False):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._waiting_for_slot = False
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        self.batches += 1
+        self.items += len(batch)
+        if full:
+            self.full_flushes += 1
+        MODERATION_BATCH_SIZE.observe(len(batch))
+        task = asyncio.create_task(self._run(batch))
+        self._running.add(task)
+        task.add_done_callback(self._on_batch_done)
+
+    async def _run(self, batch: List[Tuple[Any, asyncio.Future]]):
+        try:
+            results = await self.handler([payload for payload, _ in batch])
+        except Exception as e:
+            self.failed_batches += 1
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            # A caller that gave up (e.g. the client disconnected) has a cancelled future
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def stats(self) -> Dict:
+        return {
+            "max_items": self.max_items,
+            "window_seconds": self.window_seconds,
+            "pending": len(self._pending),
+            "running": len(self._running),
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": round(self.items / self.batches, 2) if self.batches else None,
+            "full_flushes": self.full_flushes,
+            "window_flushes": self.window_flushes,
+            "slot_flushes": self.slot_flushes,
+            "failed_batches": self.failed_batches,
+        }
+
@@ -0,0 +1,103 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from app.core.metrics import MODERATION_CACHE_EVICTIONS, MODERATION_CACHE_HITS, MODERATION_CACHE_MISSES
+
+
+class ModerationCache:
+    """
+    Content-addressed cache of moderation results.
+
+    An in-memory LRU with per-entry TTL sits in front of an optional SQLite table,
+    so results survive restarts and are shared by workers on the same host.
+    Values are plain JSON-serializable dicts; keys are content hashes built by the caller.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 86400, sqlite_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.disk_hits = 0
+        self._db = None
+        self._writes_since_purge = 0
+        if sqlite_path:
+            self._db = sqlite3.connect(sqlite_path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS moderation_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def get(self, key: str) -> Optional[Dict]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    MODERATION_CACHE_HITS.inc()
+                    return value
+                del self._entries[key]
+                self.expirations += 1
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, expires_at FROM moderation_cache WHERE key = ? AND expires_at > ?", (key, now)
+                ).fetchone()
+                if row is not None:
+                    value = json.loads(row[0])
+                    self._store(key, value, row[1])
+                    self.hits += 1
+                    MODERATION_CACHE_HITS.inc()
+                    self.disk_hits += 1
+                    return value
+            self.misses += 1
+            MODERATION_CACHE_MISSES.inc()
+            return None
+
+    def set(self, key: str, value: Dict):
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._store(key, value, expires_at)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO moderation_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), expires_at)
+                )
+                self._writes_since_purge += 1
+                if self._writes_since_purge >= 1000:
+                    self._writes_since_purge = 0
+                    self._db.execute("DELETE FROM moderation_cache WHERE expires_at <= ?", (time.time(),))
+
+    def _store(self, key: str, value: Dict, expires_at: float):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+            MODERATION_CACHE_EVICTIONS.inc()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "persistent": self._db is not None,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+        }
@@ -0,0 +1,279 @@
+import itertools
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    """Orthonormal DCT-II basis, so that M @ X @ M.T is the 2-D DCT of X"""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2 / n)
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+
+_DCT_32 = _dct_matrix(32)
+
+
+def _bits_to_int(bits: np.ndarray) -> int:
+    return int(np.packbits(bits.ravel()).view(">u8")[0])
+
+
+def phash(image: Image.Image) -> int:
+    """64-bit DCT perceptual hash: the 8x8 lowest frequencies of a 32x32 thumbnail, thresholded at their median"""
+    gray = np.asarray(image.convert("L").resize((32, 32), Image.Resampling.LANCZOS), dtype=np.float64)
+    low = (_DCT_32 @ gray @ _DCT_32.T)[:8, :8].ravel()
+    # The DC term only reflects overall brightness, so it is left out of the median
+    return _bits_to_int(low > np.median(low[1:]))
+
+
+def dhash(image: Image.Image) -> int:
+    """64-bit difference hash: whether each pixel of a 9x8 thumbnail is brighter than its left neighbour"""
+    gray = np.asarray(image.convert("L").resize((9, 8), Image.Resampling.LANCZOS), dtype=np.int16)
+    return _bits_to_int(gray[:, 1:] > gray[:, :-1])
+
+
+def image_hashes(image: Image.Image) -> Tuple[int, int]:
+    return phash(image), dhash(image)
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def _to_signed(value: int) -> int:
+    # SQLite integers are signed 64-bit
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _to_unsigned(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+
+class HammingIndex:
+    """
+    Multi-index hashing over 64-bit hashes.
+
+    Each hash is split into `chunks` substrings with one exact-match table per substring.
+    Two hashes within distance r must agree to within r // chunks bits on at least one
+    substring (pigeonhole), so a query only probes the buckets within that small radius
+    of each substring and verifies the few candidates it finds, instead of scanning
+    every stored hash.
+    """
+
+    def __init__(self, chunks: int = 4, bits: int = 64):
+        self.chunks = chunks
+        self.chunk_bits = bits // chunks
+        self._chunk_mask = (1 << self.chunk_bits) - 1
+        self._tables: List[Dict[int, List[int]]] = [{} for _ in range(chunks)]
+        self._hashes: Dict[int, int] = {}
+        self._flip_masks: Dict[int, List[int]] = {}
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def _substrings(self, value: int) -> List[int]:
+        return [(value >> (i * self.chunk_bits)) & self._chunk_mask for i in range(self.chunks)]
+
+    def _masks(self, radius: int) -> List[int]:
+        """Every chunk-sized mask with at most `radius` bits set"""
+        if radius not in self._flip_masks:
+            masks = []
+            for r in range(radius + 1):
+                for positions in itertools.combinations(range(self.chunk_bits), r):
+                    masks.append(sum(1 << p for p in positions))
+            self._flip_masks[radius] = masks
+        return self._flip_masks[radius]
+
+    def add(self, key: int, value: int):
+        self._hashes[key] = value
+        for table, substring in zip(self._tables, self._substrings(value)):
+            table.setdefault(substring, []).append(key)
+
+    def search(self, value: int, max_distance: int) -> List[Tuple[int, int]]:
+        """Returns (key, distance) for every stored hash within max_distance, closest first"""
+        masks = self._masks(max_distance // self.chunks)
+        candidates = set()
+        for table, substring in zip(self._tables, self._substrings(value)):
+            for mask in masks:
+                bucket = table.get(substring ^ mask)
+                if bucket:
+                    candidates.update(bucket)
+        matches = []
+        for key in candidates:
+            distance = hamming(self._hashes[key], value)
+            if distance <= max_distance:
+                matches.append((key, distance))
+        return sorted(matches, key=lambda match: (match[1], match[0]))
+
+
+@dataclass
+class DuplicateMatch:
+    image_id: int
+    distance: int
+    first_seen_at: str
+
+    def to_dict(self) -> Dict:
+        return {"image_id": self.image_id, "distance": self.distance, "first_seen_at": self.first_seen_at}
+
+
+class DuplicateImageIndex:
+    """
+    Perceptual hashes of every moderated image, used to catch reposts across users.
+
+    Candidates are found on the pHash via multi-index hashing and confirmed with the
+    dHash, which cuts false positives from images that only share a coarse layout.
+    Entries are persisted to SQLite and other workers' inserts are picked up on the
+    next query, so all workers on a host share one index.
+    """
+
+    def __init__(self, sqlite_path: Optional[str] = None, max_distance: int = 6, max_dhash_distance: int = 10):
+        self.max_distance = max_distance
+        self.max_dhash_distance = max_dhash_distance
+        self._index = HammingIndex()
+        self._entries: Dict[int, Tuple[int, str, float]] = {}
+        self._lock = threading.Lock()
+        self._next_id = 1
+        self._last_synced_id = 0
+        self.queries = 0
+        self.matches = 0
+        self.query_seconds = 0.0
+        self._db = None
+        if sqlite_path:
+            directory = os.path.dirname(sqlite_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(sqlite_path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS image_hashes ("
+                "id INTEGER PRIMARY KEY, phash INTEGER NOT NULL, dhash INTEGER NOT NULL, "
+                "user_id TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._sync()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remember(self, image_id: int, phash_value: int, dhash_value: int, user_id: str, created_at: float):
+        self._index.add(image_id, phash_value)
+        self._entries[image_id] = (dhash_value, user_id, created_at)
+        self._next_id = max(self._next_id, image_id + 1)
+
+    def _sync(self):
+        """Loads rows written since the last sync (at startup, everything; later, other workers' inserts)"""
+        if self._db is None:
+            return
+        rows = self._db.execute(
+            "SELECT id, phash, dhash, user_id, created_at FROM image_hashes WHERE id > ? ORDER BY id",
+            (self._last_synced_id,)
+        ).fetchall()
+        for image_id, phash_value, dhash_value, user_id, created_at in rows:
+            if image_id not in self._entries:
+                self._remember(image_id, _to_unsigned(phash_value), _to_unsigned(dhash_value), user_id, created_at)
+            self._last_synced_id = image_id
+
+    def find(self, phash_value: int, dhash_value: int, user_id: str) -> Optional[DuplicateMatch]:
+        """The closest stored image from a different user that matches on both hashes, if any"""
+        started = time.perf_counter()
+        with self._lock:
+            self._sync()
+            match = self._search(phash_value, dhash_value, user_id)
+            self._count_query(match, started)
+        return match
+
+    def add(self, phash_value: int, dhash_value: int, user_id: str) -> int:
+        """Stores an image's hashes unless the same user already has an identical one; returns its id"""
+        with self._lock:
+            return self._add(phash_value, dhash_value, user_id)
+
+    def find_or_add(self, phash_value: int, dhash_value: int, user_id: str) -> Optional[DuplicateMatch]:
+        """
+        find(), and add() when nothing matches, as one step. Both run under the index lock and,
+        when persistent, one SQLite write transaction, so two workers indexing the same image
+        for different users cannot both miss it.
+        """
+        started = time.perf_counter()
+        with self._lock:
+            if self._db is None:
+                match = self._search(phash_value, dhash_value, user_id)
+                if match is None:
+                    self._add(phash_value, dhash_value, user_id)
+            else:
+                self._db.execute("BEGIN IMMEDIATE")
+                try:
+                    # Inside the transaction, so rows other processes committed first are seen
+                    self._sync()
+                    match = self._search(phash_value, dhash_value, user_id)
+                    inserted = None
+                    if match is None and self._existing(phash_value, dhash_value, user_id) is None:
+                        inserted = self._insert(phash_value, dhash_value, user_id)
+                    self._db.execute("COMMIT")
+                except Exception:
+                    self._db.execute("ROLLBACK")
+                    raise
+                if inserted is not None:
+                    self._remember(inserted[0], phash_value, dhash_value, user_id, inserted[1])
+            self._count_query(match, started)
+        return match
+
+    def _search(self, phash_value: int, dhash_value: int, user_id: str) -> Optional[DuplicateMatch]:
+        for image_id, distance in self._index.search(phash_value, self.max_distance):
+            other_dhash, other_user_id, created_at = self._entries[image_id]
+            if other_user_id == user_id or hamming(other_dhash, dhash_value) > self.max_dhash_distance:
+                continue
+            first_seen_at = datetime.fromtimestamp(created_at, tz=timezone.utc).isoformat()
+            return DuplicateMatch(image_id=image_id, distance=distance, first_seen_at=first_seen_at)
+        return None
+
+    def _existing(self, phash_value: int, dhash_value: int, user_id: str) -> Optional[int]:
+        """Id of an identical image the same user already has, if any"""
+        for image_id, _ in self._index.search(phash_value, 0):
+            other_dhash, other_user_id, _ = self._entries[image_id]
+            if other_user_id == user_id and other_dhash == dhash_value:
+                return image_id
+        return None
+
+    def _insert(self, phash_value: int, dhash_value: int, user_id: str) -> Tuple[int, float]:
+        """Writes a new row (when persistent) and returns its (id, created_at); the caller remembers it"""
+        created_at = time.time()
+        if self._db is None:
+            return self._next_id, created_at
+        cursor = self._db.execute(
+            "INSERT INTO image_hashes (phash, dhash, user_id, created_at) VALUES (?, ?, ?, ?)",
+            (_to_signed(phash_value), _to_signed(dhash_value), user_id, created_at)
+        )
+        return cursor.lastrowid, created_at
+
+    def _add(self, phash_value: int, dhash_value: int, user_id: str) -> int:
+        image_id = self._existing(phash_value, dhash_value, user_id)
+        if image_id is not None:
+            return image_id
+        image_id, created_at = self._insert(phash_value, dhash_value, user_id)
+        self._remember(image_id, phash_value, dhash_value, user_id, created_at)
+        return image_id
+
+    def _count_query(self, match: Optional[DuplicateMatch], started: float):
+        self.queries += 1
+        self.matches += int(match is not None)
+        self.query_seconds += time.perf_counter() - started
+
+    def stats(self) -> Dict:
+        return {
+            "entries": len(self._entries),
+            "persistent": self._db is not None,
+            "max_distance": self.max_distance,
+            "max_dhash_distance": self.max_dhash_distance,
+            "queries": self.queries,
+            "matches": self.matches,
+            "avg_query_ms": round(self.query_seconds * 1000 / self.queries, 4) if self.queries else None,
+        }
@@ -0,0 +1,165 @@
+import asyncio
+import functools
+import logging
+import random
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple, Type
+
+from app.core.metrics import MODERATION_MODEL_CALLS_IN_FLIGHT, MODERATION_MODEL_CALLS_QUEUED
+
+logger = logging.getLogger(__name__)
+
+
+@functools.lru_cache(maxsize=None)
+def _transient_error_types() -> Tuple[Type[BaseException], ...]:
+    """
+    Errors worth retrying: network failures plus Gemini's rate-limit/unavailable responses.
+    Resolved on the first retry decision, so importing this module does not pull in grpc.
+    """
+    errors = [ConnectionError, TimeoutError]
+    try:
+        from google.api_core import exceptions as google_exceptions
+        errors += [
+            google_exceptions.TooManyRequests, google_exceptions.ResourceExhausted,
+            google_exceptions.ServiceUnavailable, google_exceptions.InternalServerError,
+            google_exceptions.DeadlineExceeded,
+        ]
+    except ImportError:
+        pass
+    return tuple(errors)
+
+
+class ModerationUnavailableError(Exception):
+    """The request was not admitted; the router maps status_code onto the HTTP response"""
+    status_code = 503
+
+
+class ModerationOverloadedError(ModerationUnavailableError):
+    """The admission queue is full"""
+    status_code = 429
+
+
+class ModerationQueueTimeoutError(ModerationUnavailableError):
+    """The request waited in the admission queue past its deadline"""
+    status_code = 503
+
+
+class ModerationTimeoutError(TimeoutError):
+    """A model call did not finish within its per-attempt timeout"""
+
+
+class ModerationExecutor:
+    """
+    Runs blocking model calls on a dedicated thread pool with bounded concurrency.
+
+    At most `max_in_flight` calls run at once and at most `max_queue` more wait for a
+    slot; anything beyond that is rejected immediately instead of piling up. Each
+    attempt has its own timeout, the whole call (queueing included) has a deadline,
+    and transient failures are retried with exponential backoff and full jitter.
+    A timed-out attempt is abandoned, not killed, so callers should also pass the
+    timeout to the client library so the worker thread is released.
+    """
+
+    def __init__(self, max_in_flight: int = 8, max_queue: int = 64, timeout_seconds: float = 30.0,
+                 deadline_seconds: float = 60.0, max_retries: int = 2, backoff_base_seconds: float = 0.5,
+                 backoff_max_seconds: float = 8.0):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.timeout_seconds = timeout_seconds
+        self.deadline_seconds = deadline_seconds
+        self.max_retries = max_retries
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self._pool = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="moderation")
+        # Created on first use so it binds to the serving event loop, not the import-time one
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.queued = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.queue_timeouts = 0
+        self.timeouts = 0
+        self.retries = 0
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        """Calls fn(*args, **kwargs) on the pool, subject to admission, deadline and retry policy"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.deadline_seconds
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        if not self._semaphore.locked():
+            # A free slot is taken synchronously, before any other request can run
+            await self._semaphore.acquire()
+        else:
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                raise ModerationOverloadedError(
+                    f"Moderation queue is full ({self.max_queue} waiting, {self.in_flight} in flight)")
+            self.queued += 1
+            MODERATION_MODEL_CALLS_QUEUED.inc()
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=self.deadline_seconds)
+            except asyncio.TimeoutError:
+                self.queue_timeouts += 1
+                raise ModerationQueueTimeoutError("Timed out waiting for a free moderation slot")
+            finally:
+                self.queued -= 1
+                MODERATION_MODEL_CALLS_QUEUED.dec()
+        self.in_flight += 1
+        MODERATION_MODEL_CALLS_IN_FLIGHT.inc()
+        try:
+            result = await self._call_with_retries(loop, deadline, functools.partial(fn, *args, **kwargs))
+            self.completed += 1
+            return result
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            MODERATION_MODEL_CALLS_IN_FLIGHT.dec()
+            self._semaphore.release()
+
+    async def _call_with_retries(self, loop: asyncio.AbstractEventLoop, deadline: float, call: Callable):
+        attempt = 0
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise ModerationTimeoutError(f"Moderation deadline of {self.deadline_seconds}s exceeded")
+            timeout = min(self.timeout_seconds, remaining)
+            try:
+                return await asyncio.wait_for(loop.run_in_executor(self._pool, call), timeout=timeout)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                error: Exception = ModerationTimeoutError(f"Model call timed out after {timeout:.1f}s")
+            except Exception as e:
+                if not isinstance(e, _transient_error_types()):
+                    raise
+                error = e
+            if attempt >= self.max_retries:
+                raise error
+            # Full jitter: sleep a random fraction of the exponential backoff cap
+            delay = random.uniform(0, min(self.backoff_max_seconds, self.backoff_base_seconds * 2 ** attempt))
+            if loop.time() + delay >= deadline:
+                raise error
+            attempt += 1
+            self.retries += 1
+            logger.warning(f"Transient moderation error ({error!r}); retry {attempt}/{self.max_retries} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+    def stats(self) -> Dict:
+        return {
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "queue_timeouts": self.queue_timeouts,
+            "timeouts": self.timeouts,
+            "retries": self.retries,
+        }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)
@@ -0,0 +1,97 @@
+import random
+import re
+import threading
+import time
+from typing import Optional
+
+# Rough token accounting for cost estimates: Gemini counts about 4 characters of text per
+# token and a fixed 258 tokens per image
+CHARS_PER_TOKEN = 4
+TOKENS_PER_IMAGE = 258
+
+_BATCH_ITEM = re.compile(r"^ITEM (\d+) DETAILS:", re.MULTILINE)
+
+
+class FakeUsage:
+    def __init__(self, prompt_token_count: int, candidates_token_count: int):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+        self.total_token_count = prompt_token_count + candidates_token_count
+
+
+class FakeResponse:
+    def __init__(self, text: str, usage_metadata: Optional[FakeUsage] = None):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+
+class FakeGenerativeModel:
+    """
+    Local stand-in for genai.GenerativeModel used for development, load tests and benchmarks.
+    Simulates model latency, transient failures and hangs without any network access.
+    Enable it for the whole service with MODERATION_FAKE_MODEL=1.
+
+    Multi-listing prompts (see ModerationService._create_batch_contents) get one
+    "ITEM <n>: ..." line per listing, unless the response is made malformed on purpose.
+    Each image adds `latency_per_image_seconds`, and token usage is reported the way the
+    Gemini client does, so batched and single calls can be compared for speed and cost.
+    """
+
+    def __init__(self, latency_seconds: float = 0.5, jitter_seconds: float = 0.0, failure_rate: float = 0.0,
+                 hang_rate: float = 0.0, hang_seconds: float = 60.0, response_text: str = "APPROVED",
+                 seed: Optional[int] = None, latency_per_image_seconds: float = 0.0, malformed_rate: float = 0.0):
+        self.latency_seconds = latency_seconds
+        self.jitter_seconds = jitter_seconds
+        self.failure_rate = failure_rate
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.response_text = response_text
+        self.latency_per_image_seconds = latency_per_image_seconds
+        self.malformed_rate = malformed_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.max_concurrent = 0
+        self._concurrent = 0
+        self.prompt_tokens = 0
+        self.response_tokens = 0
+
+    def generate_content(self, contents, request_options: Optional[dict] = None, **kwargs) -> FakeResponse:
+        parts = contents if isinstance(contents, list) else [contents]
+        text = "".join(part for part in parts if isinstance(part, str))
+        images = sum(1 for part in parts if not isinstance(part, str))
+        with self._lock:
+            self.calls += 1
+            self._concurrent += 1
+            self.max_concurrent = max(self.max_concurrent, self._concurrent)
+            roll = self._random.random()
+            malformed = self.malformed_rate > 0 and self._random.random() < self.malformed_rate
+            latency = (self.latency_seconds + self._random.uniform(0, self.jitter_seconds)
+                       + images * self.latency_per_image_seconds)
+        try:
+            timeout = (request_options or {}).get("timeout")
+            if roll < self.hang_rate:
+                # Like the real client, give up once the request timeout passes
+                time.sleep(min(self.hang_seconds, timeout) if timeout else self.hang_seconds)
+                raise TimeoutError("Simulated model hang")
+            time.sleep(latency)
+            if roll < self.hang_rate + self.failure_rate:
+                raise ConnectionError("Simulated transient model failure (503)")
+            response_text = self._answer(text, malformed)
+            usage = FakeUsage(len(text) // CHARS_PER_TOKEN + images * TOKENS_PER_IMAGE,
+                              max(len(response_text) // CHARS_PER_TOKEN, 1))
+            with self._lock:
+                self.prompt_tokens += usage.prompt_token_count
+                self.response_tokens += usage.candidates_token_count
+            return FakeResponse(response_text, usage)
+        finally:
+            with self._lock:
+                self._concurrent -= 1
+
+    def _answer(self, prompt: str, malformed: bool) -> str:
+        items = _BATCH_ITEM.findall(prompt)
+        if not items:
+            return self.response_text
+        if malformed:
+            return f"All {len(items)} listings look fine to me."
+        return "\n".join(f"ITEM {index}: {self.response_text}" for index in items)
@@ -0,0 +1,393 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import asdict
+from typing import Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: no flock, so every process drains (fine for the single-process dev server)
+    fcntl = None
+
+from .executor import ModerationUnavailableError
+from .service import ItemListing, ModerationDecision, ModerationResult, ModerationService
+
+logger = logging.getLogger(__name__)
+
+JOB_STATUSES = ("queued", "running", "done")
+
+
+class ModerationJobStore:
+    """
+    Persistent moderation queue: one SQLite row per job plus the image as a file.
+
+    Jobs are claimed inside an IMMEDIATE transaction, so several workers (and several
+    server processes on one host) can drain the same store without running a job twice.
+    A job whose worker died is put back in the queue once its lease expires, or straight
+    away when the owning process on this host no longer exists.
+    """
+
+    def __init__(self, root_dir: str, lease_seconds: float = 300.0, retention_seconds: float = 7 * 86400):
+        self.root_dir = root_dir
+        self.image_dir = os.path.join(root_dir, "images")
+        self.lease_seconds = lease_seconds
+        self.retention_seconds = retention_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        os.makedirs(self.image_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(root_dir, "jobs.sqlite3"), check_same_thread=False,
+                                   isolation_level=None, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS moderation_jobs ("
+            "id TEXT PRIMARY KEY, status TEXT NOT NULL, listing TEXT NOT NULL, image_path TEXT, "
+            "result TEXT, attempts INTEGER NOT NULL DEFAULT 0, owner TEXT, "
+            "created_at REAL NOT NULL, started_at REAL, finished_at REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS moderation_jobs_queue ON moderation_jobs (status, created_at)")
+
+    def submit(self, item: ItemListing, image_data: Optional[bytes]) -> str:
+        """Writes the image to disk and queues the listing; returns the job id"""
+        job_id = uuid.uuid4().hex
+        image_path = None
+        if image_data:
+            image_path = os.path.join(self.image_dir, f"{job_id}.img")
+            with open(image_path + ".tmp", "wb") as file:
+                file.write(image_data)
+            os.replace(image_path + ".tmp", image_path)
+        listing = {k: v for k, v in asdict(item).items() if k != "image_data"}
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO moderation_jobs (id, status, listing, image_path, created_at) VALUES (?, 'queued', ?, ?, ?)",
+                (job_id, json.dumps(listing), image_path, time.time())
+            )
+        return job_id
+
+    def claim(self) -> Optional[Dict]:
+        """Marks the oldest queued job as running and returns it with its listing, or None"""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT id, listing, image_path, attempts FROM moderation_jobs "
+                    "WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+                ).fetchone()
+                if row is not None:
+                    self._db.execute(
+                        "UPDATE moderation_jobs SET status = 'running', owner = ?, started_at = ?, "
+                        "attempts = attempts + 1 WHERE id = ?", (self.owner, time.time(), row[0])
+                    )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        job_id, listing, image_path, attempts = row
+        return {"job_id": job_id, "listing": json.loads(listing), "image_path": image_path, "attempts": attempts + 1}
+
+    def complete(self, job_id: str, result: Dict):
+        with self._lock:
+            row = self._db.execute("SELECT image_path FROM moderation_jobs WHERE id = ?", (job_id,)).fetchone()
+            self._db.execute(
+                "UPDATE moderation_jobs SET status = 'done', result = ?, image_path = NULL, finished_at = ? WHERE id = ?",
+                (json.dumps(result), time.time(), job_id)
+            )
+        # The image is only needed until the job has a result
+        if row is not None and row[0]:
+            self._remove_file(row[0])
+
+    def requeue(self, job_id: str):
+        with self._lock:
+            self._db.execute("UPDATE moderation_jobs SET status = 'queued', owner = NULL WHERE id = ?", (job_id,))
+
+    def requeue_orphans(self) -> int:
+        """Puts back running jobs whose lease expired or whose owning process on this host is gone"""
+        now = time.time()
+        host = socket.gethostname()
+        with self._lock:
+            rows = self._db.execute("SELECT id, owner, started_at FROM moderation_jobs WHERE status = 'running'").fetchall()
+            orphaned = []
+            for job_id, owner, started_at in rows:
+                owner_host, _, owner_pid = (owner or "").rpartition(":")
+                if started_at is None or started_at < now - self.lease_seconds:
+                    orphaned.append(job_id)
+                elif owner_host == host and owner != self.owner and not _process_alive(owner_pid):
+                    orphaned.append(job_id)
+            for job_id in orphaned:
+                self._db.execute(
+                    "UPDATE moderation_jobs SET status = 'queued', owner = NULL WHERE id = ? AND status = 'running'",
+                    (job_id,)
+                )
+        if orphaned:
+            logger.warning(f"Re-queued {len(orphaned)} moderation job(s) left running by a stopped worker")
+        return len(orphaned)
+
+    def purge(self) -> int:
+        """Deletes finished jobs older than the retention period"""
+        with self._lock:
+            cursor = self._db.execute(
+                "DELETE FROM moderation_jobs WHERE status = 'done' AND finished_at < ?",
+                (time.time() - self.retention_seconds,)
+            )
+        return cursor.rowcount
+
+    def get_many(self, job_ids: List[str]) -> Dict[str, Dict]:
+        """Job status (and result once done) for each id that exists"""
+        jobs = {}
+        # Chunked to stay under SQLite's bound-parameter limit
+        for start in range(0, len(job_ids), 500):
+            chunk = job_ids[start:start + 500]
+            with self._lock:
+                rows = self._db.execute(
+                    "SELECT id, status, result, attempts, created_at, started_at, finished_at FROM moderation_jobs "
+                    f"WHERE id IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+            for job_id, status, result, attempts, created_at, started_at, finished_at in rows:
+                jobs[job_id] = {
+                    "job_id": job_id,
+                    "status": status,
+                    "attempts": attempts,
+                    "created_at": created_at,
+                    "started_at": started_at,
+                    "finished_at": finished_at,
+                    "result": json.loads(result) if result else None,
+                }
+        return jobs
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        return self.get_many([job_id]).get(job_id)
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) FROM moderation_jobs GROUP BY status").fetchall()
+        return {**{status: 0 for status in JOB_STATUSES}, **dict(rows)}
+
+    @staticmethod
+    def _remove_file(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _process_alive(pid: str) -> bool:
+    try:
+        os.kill(int(pid), 0)
+    except (ValueError, ProcessLookupError):
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class RateLimiter:
+    """Spaces out acquisitions to at most `rate_per_second` on one event loop"""
+
+    def __init__(self, rate_per_second: float):
+        self.interval = 1.0 / rate_per_second if rate_per_second > 0 else 0.0
+        self._next = 0.0
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        wait = self._next - now
+        self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class DrainLock:
+    """
+    Non-blocking exclusive file lock that elects the one process per host that drains the
+    queue. The OS releases it when the holder exits, so another process can take over.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def try_acquire(self) -> bool:
+        if self._file is not None or fcntl is None:
+            return True
+        file = open(self.path, "a")
+        try:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            file.close()
+            return False
+        self._file = file
+        return True
+
+    def release(self):
+        if self._file is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+
+class ModerationJobWorker:
+    """
+    Background workers that drain a ModerationJobStore through the regular moderation service.
+
+    `concurrency` jobs run at once and new jobs start at no more than `rate_per_second`,
+    so a burst of submissions turns into a steady stream of model calls. Jobs that end in
+    a technical error, are refused by the executor or crash the worker are retried up to
+    `max_attempts`, then completed with the FLAGGED technical-error result.
+
+    With a `lock`, only the process holding it drains the queue, so the rate and concurrency
+    apply per host rather than per server process; the others keep trying to take the lock
+    over every `poll_seconds`, in case the holder exits.
+    """
+
+    def __init__(self, store: ModerationJobStore, service: ModerationService, concurrency: int = 4,
+                 rate_per_second: float = 5.0, max_attempts: int = 3, poll_seconds: float = 1.0,
+                 lock: Optional[DrainLock] = None):
+        self.store = store
+        self.lock = lock
+        self.service = service
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.poll_seconds = poll_seconds
+        self._limiter = RateLimiter(rate_per_second)
+        self.rate_per_second = rate_per_second
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self.processed = 0
+        self.retried = 0
+        self.active = 0
+        self.draining = False
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        if self.lock is None or self.lock.try_acquire():
+            self._start_draining()
+        else:
+            logger.info("Another process is draining the moderation job queue; standing by")
+            self._tasks = [asyncio.create_task(self._elect(), name="moderation-job-election")]
+
+    def _start_draining(self):
+        self.draining = True
+        self.store.requeue_orphans()
+        self.store.purge()
+        self._tasks += [asyncio.create_task(self._run(), name=f"moderation-job-worker-{i}") for i in range(self.concurrency)]
+        self._tasks.append(asyncio.create_task(self._maintain(), name="moderation-job-maintenance"))
+        logger.info(f"Started {self.concurrency} moderation job workers at up to {self.rate_per_second}/s")
+
+    async def _elect(self):
+        while not await asyncio.to_thread(self.lock.try_acquire):
+            await asyncio.sleep(self.poll_seconds)
+        self._start_draining()
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.draining = False
+        if self.lock is not None:
+            self.lock.release()
+
+    def notify(self):
+        """Wakes idle workers after a submission instead of waiting for the next poll"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            job = await asyncio.to_thread(self.store.claim)
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._limiter.acquire()
+            self.active += 1
+            try:
+                await self._process(job)
+            except Exception as e:
+                # A job must never take its worker down with it
+                logger.error(f"Moderation job {job['job_id']} crashed: {e}")
+                try:
+                    if job["attempts"] >= self.max_attempts:
+                        await asyncio.to_thread(self.store.complete, job["job_id"], job_result(_technical_error(e)))
+                    else:
+                        await asyncio.to_thread(self.store.requeue, job["job_id"])
+                except Exception as store_error:
+                    # Left running; requeue_orphans puts it back once the lease expires
+                    logger.error(f"Could not update moderation job {job['job_id']}: {store_error}")
+                await asyncio.sleep(self.poll_seconds)
+            finally:
+                self.active -= 1
+
+    async def _process(self, job: Dict):
+        image_data = None
+        if job["image_path"]:
+            image_data = await asyncio.to_thread(_read_file, job["image_path"])
+        item = ItemListing(**job["listing"], image_data=image_data)
+        try:
+            result = await self.service.moderate_item(item)
+        except ModerationUnavailableError as e:
+            if job["attempts"] >= self.max_attempts:
+                result = _technical_error(e)
+            else:
+                await self._retry(job)
+                await asyncio.sleep(self.poll_seconds)
+                return
+        if _is_technical_error(result) and job["attempts"] < self.max_attempts:
+            await self._retry(job)
+            return
+        await asyncio.to_thread(self.store.complete, job["job_id"], job_result(result))
+        self.processed += 1
+
+    async def _retry(self, job: Dict):
+        self.retried += 1
+        logger.warning(f"Retrying moderation job {job['job_id']} (attempt {job['attempts']}/{self.max_attempts})")
+        await asyncio.to_thread(self.store.requeue, job["job_id"])
+
+    async def _maintain(self):
+        while True:
+            await asyncio.sleep(max(self.store.lease_seconds / 4, 5))
+            await asyncio.to_thread(self.store.requeue_orphans)
+            await asyncio.to_thread(self.store.purge)
+
+    def stats(self) -> Dict:
+        return {
+            "workers": self.concurrency,
+            "rate_per_second": self.rate_per_second,
+            "draining": self.draining,
+            "active": self.active,
+            "processed": self.processed,
+            "retried": self.retried,
+            "jobs": self.store.counts(),
+        }
+
+
+def _is_technical_error(result: ModerationResult) -> bool:
+    """Model-call failures (worth retrying), as opposed to decisions such as an unreadable image"""
+    return result.raw_response is None and (result.reason or "").startswith("Technical error during moderation")
+
+
+def _technical_error(error: Exception) -> ModerationResult:
+    """The result the synchronous endpoint returns when moderation fails"""
+    return ModerationResult(decision=ModerationDecision.FLAGGED,
+                            reason=f"Technical error during moderation: {error}", confidence_score=1.0)
+
+
+def job_result(result: ModerationResult) -> Dict:
+    return {**asdict(result), "decision": result.decision.value}
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as file:
+        return file.read()
@@ -0,0 +1,145 @@
+import asyncio
+import functools
+import io
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+from fastapi import UploadFile
+from PIL import Image
+
+from .duplicates import image_hashes
+from .prescreen import image_stats
+
+
+class ImageRejectedError(ValueError):
+    """The upload was refused before moderation; the router maps status_code onto the response"""
+    status_code = 400
+
+
+class UploadTooLargeError(ImageRejectedError):
+    status_code = 413
+
+
+class ImageTooLargeError(ImageRejectedError):
+    status_code = 413
+
+
+@dataclass
+class PreprocessedImage:
+    image: Image.Image
+    original_size: Tuple[int, int]
+    # Brightness and sharpness measurements used by the pre-screen rules
+    stats: Dict[str, float] = field(default_factory=dict)
+    # (pHash, dHash) used by the near-duplicate index
+    hashes: Optional[Tuple[int, int]] = None
+    # Milliseconds spent in each step, in the order they ran
+    timings: Dict[str, float] = field(default_factory=dict)
+
+
+async def read_upload_limited(upload: UploadFile, max_bytes: int, chunk_size: int = 1 << 20) -> bytes:
+    """Reads an upload chunk by chunk and stops as soon as it exceeds max_bytes"""
+    chunks = []
+    total = 0
+    while True:
+        chunk = await upload.read(chunk_size)
+        if not chunk:
+            break
+        total += len(chunk)
+        if total > max_bytes:
+            raise UploadTooLargeError(f"Image exceeds the {max_bytes // (1024 * 1024)} MB upload limit")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def preprocess_image(data: bytes, max_side: int = 1024, max_pixels: int = 40_000_000) -> PreprocessedImage:
+    """
+    Decodes and downsizes an image to fit within max_side x max_side, doing as little work as possible:
+    the pixel limit is checked from the header alone, JPEGs are downscaled during decode (draft mode),
+    and large images are box-reduced by an integer factor before the final LANCZOS resample.
+    Runs in a worker pool, never on the event loop.
+    """
+    timings = {}
+    started = time.perf_counter()
+
+    def lap(step: str):
+        nonlocal started
+        now = time.perf_counter()
+        timings[step] = round((now - started) * 1000, 3)
+        started = now
+
+    image = Image.open(io.BytesIO(data))
+    original_size = image.size
+    if original_size[0] * original_size[1] > max_pixels:
+        raise ImageTooLargeError(f"Image is {original_size[0]}x{original_size[1]}; the limit is {max_pixels} pixels")
+    lap("open_ms")
+
+    if image.format == "JPEG":
+        # Lets libjpeg decode at 1/2, 1/4 or 1/8 scale while staying at least max_side on each axis
+        image.draft("RGB", (max_side, max_side))
+    image.load()
+    lap("decode_ms")
+
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+        lap("convert_ms")
+
+    # Cheap integer box reduction down to no less than 2x the target, then a high-quality final resample
+    factor = max(image.size) // (2 * max_side)
+    if factor > 1:
+        image = image.reduce(factor)
+        lap("reduce_ms")
+
+    image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS, reducing_gap=None)
+    lap("resize_ms")
+
+    stats = image_stats(image)
+    hashes = image_hashes(image)
+    lap("stats_ms")
+    return PreprocessedImage(image=image, original_size=original_size, stats=stats, hashes=hashes, timings=timings)
+
+
+def preprocess_to_jpeg(data: bytes, max_side: int = 1024, max_pixels: int = 40_000_000,
+                       quality: int = 90) -> Tuple[bytes, Tuple[int, int]]:
+    """
+    Downsizes like preprocess_image and re-encodes the result, for storing queued uploads compactly.
+    Returns the JPEG and the original (width, height), which the pre-screen rules need.
+    """
+    prepared = preprocess_image(data, max_side, max_pixels)
+    buffer = io.BytesIO()
+    prepared.image.save(buffer, "JPEG", quality=quality)
+    return buffer.getvalue(), prepared.original_size
+
+
+class ImagePreprocessor:
+    """Runs preprocess_image on a thread or process pool so large uploads never block the event loop"""
+
+    def __init__(self, max_side: int = 1024, max_pixels: int = 40_000_000, pool: str = "thread",
+                 workers: Optional[int] = None):
+        self.max_side = max_side
+        self.max_pixels = max_pixels
+        workers = workers or os.cpu_count() or 1
+        if pool == "process":
+            self._pool: Executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="image-preprocess")
+
+    async def run(self, data: bytes) -> PreprocessedImage:
+        loop = asyncio.get_running_loop()
+        submitted = time.perf_counter()
+        result = await loop.run_in_executor(
+            self._pool, functools.partial(preprocess_image, data, self.max_side, self.max_pixels)
+        )
+        result.timings["image_total_ms"] = round((time.perf_counter() - submitted) * 1000, 3)
+        return result
+
+    async def run_to_jpeg(self, data: bytes) -> Tuple[bytes, Tuple[int, int]]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._pool, functools.partial(preprocess_to_jpeg, data, self.max_side, self.max_pixels)
+        )
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)
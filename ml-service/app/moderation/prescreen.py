@@ -0,0 +1,160 @@
+import re
+import threading
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+
+def image_stats(image: Image.Image) -> Dict[str, float]:
+    """
+    Cheap quality measurements on the (already downsized) image: brightness, clipped
+    shadows/highlights and the variance of the Laplacian, a standard sharpness measure.
+    Runs in the preprocessing pool alongside decode and resize.
+    """
+    gray = np.asarray(image.convert("L"), dtype=np.float32)
+    if gray.shape[0] < 3 or gray.shape[1] < 3:
+        laplacian_variance = 0.0
+    else:
+        laplacian = (gray[1:-1, :-2] + gray[1:-1, 2:] + gray[:-2, 1:-1] + gray[2:, 1:-1]) - 4 * gray[1:-1, 1:-1]
+        laplacian_variance = float(laplacian.var())
+    return {
+        "brightness_mean": float(gray.mean()),
+        "dark_fraction": float((gray <= 10).mean()),
+        "bright_fraction": float((gray >= 245).mean()),
+        "laplacian_variance": laplacian_variance,
+    }
+
+
+@dataclass
+class PrescreenThresholds:
+    min_side: int = 200
+    min_laplacian_variance: float = 25.0
+    max_dark_fraction: float = 0.85
+    max_bright_fraction: float = 0.85
+    min_brightness: float = 25.0
+    max_brightness: float = 240.0
+    min_title_chars: int = 3
+    max_caps_ratio: float = 0.7
+    max_repeated_chars: int = 6
+    max_word_share: float = 0.5
+
+
+_LINK_OR_CONTACT = re.compile(
+    r"(https?://|www\.|\b[\w.+-]+@[\w-]+\.[\w.]+\b|(?<!\d)(?:\+\d{1,3}[\s-]?)?\d{5}[\s-]?\d{5}(?!\d)|\bwhats\s?app\b|\btelegram\b)",
+    re.IGNORECASE
+)
+_WORD = re.compile(r"\w+")
+
+
+class Prescreener:
+    """
+    Rule-based checks that flag obviously unusable listings before the model is called.
+
+    Text rules run on the listing fields, image rules on the stats computed during
+    preprocessing. The first rule that fires decides the reason; every rule keeps a hit
+    counter so thresholds can be tuned against real traffic. Rules named in `disabled`
+    are skipped.
+    """
+
+    def __init__(self, thresholds: Optional[PrescreenThresholds] = None, disabled: Iterable[str] = ()):
+        self.thresholds = thresholds or PrescreenThresholds()
+        self.disabled = set(disabled)
+        self.text_rules: List[Tuple[str, Callable]] = [
+            ("empty_title", self._empty_title),
+            ("links_or_contact_details", self._links_or_contact_details),
+            ("repeated_characters", self._repeated_characters),
+            ("shouting", self._shouting),
+            ("repeated_words", self._repeated_words),
+        ]
+        self.image_rules: List[Tuple[str, Callable]] = [
+            ("low_resolution", self._low_resolution),
+            ("too_dark", self._too_dark),
+            ("overexposed", self._overexposed),
+            ("blurry", self._blurry),
+        ]
+        self._repeated_char_pattern = re.compile(r"(\S)\1{%d,}" % (self.thresholds.max_repeated_chars - 1))
+        self._lock = threading.Lock()
+        self.checked = 0
+        self.flagged = 0
+        self.hits = {name: 0 for name, _ in self.text_rules + self.image_rules}
+
+    def check_text(self, title: str, fields: Iterable[Optional[str]]) -> Optional[Tuple[str, str]]:
+        """Returns (rule, reason) for the first text rule that fires, or None"""
+        text = " ".join(value for value in [title, *fields] if value)
+        return self._run(self.text_rules, title or "", text)
+
+    def check_image(self, original_size: Tuple[int, int], stats: Dict[str, float]) -> Optional[Tuple[str, str]]:
+        """Returns (rule, reason) for the first image rule that fires, or None"""
+        return self._run(self.image_rules, original_size, stats)
+
+    def record_checked(self, flagged: bool):
+        with self._lock:
+            self.checked += 1
+            self.flagged += int(flagged)
+
+    def _run(self, rules: List[Tuple[str, Callable]], *args) -> Optional[Tuple[str, str]]:
+        for name, rule in rules:
+            if name in self.disabled:
+                continue
+            reason = rule(*args)
+            if reason:
+                with self._lock:
+                    self.hits[name] += 1
+                return name, reason
+        return None
+
+    # --- Text rules ---
+    def _empty_title(self, title: str, text: str) -> Optional[str]:
+        if sum(ch.isalnum() for ch in title) < self.thresholds.min_title_chars:
+            return "Title is empty or too short to describe the item"
+
+    def _links_or_contact_details(self, title: str, text: str) -> Optional[str]:
+        if _LINK_OR_CONTACT.search(text):
+            return "Spam detected: listing contains links or contact details"
+
+    def _repeated_characters(self, title: str, text: str) -> Optional[str]:
+        if self._repeated_char_pattern.search(text):
+            return "Spam detected: excessive repeated characters"
+
+    def _shouting(self, title: str, text: str) -> Optional[str]:
+        letters = [ch for ch in text if ch.isalpha()]
+        if len(letters) >= 12 and sum(ch.isupper() for ch in letters) / len(letters) > self.thresholds.max_caps_ratio:
+            return "Spam detected: listing text is mostly capital letters"
+
+    def _repeated_words(self, title: str, text: str) -> Optional[str]:
+        words = [word.casefold() for word in _WORD.findall(text)]
+        if len(words) >= 6:
+            counts: Dict[str, int] = {}
+            for word in words:
+                counts[word] = counts.get(word, 0) + 1
+            if max(counts.values()) / len(words) > self.thresholds.max_word_share:
+                return "Spam detected: the same word is repeated throughout the listing"
+
+    # --- Image rules ---
+    def _low_resolution(self, original_size: Tuple[int, int], stats: Dict[str, float]) -> Optional[str]:
+        if min(original_size) < self.thresholds.min_side:
+            return f"Image resolution is too low ({original_size[0]}x{original_size[1]})"
+
+    def _too_dark(self, original_size: Tuple[int, int], stats: Dict[str, float]) -> Optional[str]:
+        if stats["brightness_mean"] < self.thresholds.min_brightness or stats["dark_fraction"] > self.thresholds.max_dark_fraction:
+            return "Image is too dark to show the item"
+
+    def _overexposed(self, original_size: Tuple[int, int], stats: Dict[str, float]) -> Optional[str]:
+        if stats["brightness_mean"] > self.thresholds.max_brightness or stats["bright_fraction"] > self.thresholds.max_bright_fraction:
+            return "Image is overexposed (blown-out highlights)"
+
+    def _blurry(self, original_size: Tuple[int, int], stats: Dict[str, float]) -> Optional[str]:
+        if stats["laplacian_variance"] < self.thresholds.min_laplacian_variance:
+            return "Image is blurry or unclear"
+
+    def stats(self) -> Dict:
+        return {
+            "checked": self.checked,
+            "flagged": self.flagged,
+            "flag_ratio": round(self.flagged / self.checked, 4) if self.checked else None,
+            "disabled": sorted(self.disabled),
+            "thresholds": asdict(self.thresholds),
+            "hits": dict(self.hits),
+        }
@@ -1,5 +1,21 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form
+import asyncio
+import os
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from pydantic import BaseModel, Field
+from app.core.config import (
+    MODERATION_MAX_UPLOAD_BYTES, MODERATION_JOBS_ENABLED, MODERATION_JOBS_DIR, MODERATION_JOB_WORKERS,
+    MODERATION_JOB_RATE_PER_SECOND, MODERATION_JOB_MAX_ATTEMPTS, MODERATION_JOB_LEASE_SECONDS,
+    MODERATION_JOB_RETENTION_SECONDS
+)
+from app.core.metrics import MODERATION_STAGE_SECONDS
 from .service import ModerationService, ItemListing
+from .executor import ModerationUnavailableError
+from .jobs import DrainLock, ModerationJobStore, ModerationJobWorker
+from .preprocess import ImageRejectedError, read_upload_limited
 
 # Create the router instance
 router = APIRouter(
@@ -7,12 +23,39 @@ router = APIRouter(
     tags=["Content Moderation"]
 )
 
-# Initialize the service that will do the work
-moderation_service = ModerationService()
+# The service and the job queue open SQLite files and thread pools, so they are created on
+# first use in the process that serves requests, never at import (which may happen in a
+# pre-forking master; see gunicorn.conf.py). Job workers are started with the app (see main.py).
+moderation_service: Optional[ModerationService] = None
+job_store: Optional[ModerationJobStore] = None
+job_worker: Optional[ModerationJobWorker] = None
+_init_lock = threading.Lock()
 
-# Define the API endpoint
-@router.post("/moderate-item/")
-async def moderate_item_endpoint(
+def get_moderation_service() -> ModerationService:
+    """Initializes the service that will do the work on first call"""
+    global moderation_service
+    if moderation_service is None:
+        with _init_lock:
+            if moderation_service is None:
+                moderation_service = ModerationService()
+    return moderation_service
+
+def get_job_store() -> Optional[ModerationJobStore]:
+    """Persistent job queue for the submit/poll API, or None when jobs are disabled"""
+    global job_store
+    if job_store is None and MODERATION_JOBS_ENABLED:
+        with _init_lock:
+            if job_store is None:
+                job_store = ModerationJobStore(
+                    MODERATION_JOBS_DIR, lease_seconds=MODERATION_JOB_LEASE_SECONDS,
+                    retention_seconds=MODERATION_JOB_RETENTION_SECONDS
+                )
+    return job_store
+
+class JobIds(BaseModel):
+    job_ids: List[str] = Field(..., max_length=1000)
+
+async def read_listing(
     user_id: str = Form(...),
     title: str = Form(...),
     type: str = Form(...),
@@ -23,18 +66,20 @@ async def moderate_item_endpoint(
     tags: str = Form(None),
     description: str = Form(None),
     image: UploadFile = File(...)
-):
-    """
-    Main endpoint for submitting items for moderation.
-    This handles the web request and calls the service to perform the logic.
-    """
-    
+) -> Tuple[ItemListing, float]:
+    """Validates the listing form and reads the upload; returns the listing and the upload read time in ms"""
     # Validate image
     if not image.content_type.startswith('image/'):
         raise HTTPException(status_code=400, detail="File must be an image")
     
-    # Read image data from the upload
-    image_data = await image.read()
+    # Read image data from the upload, refusing anything over the size limit without buffering all of it
+    started = time.perf_counter()
+    try:
+        image_data = await read_upload_limited(image, MODERATION_MAX_UPLOAD_BYTES)
+    except ImageRejectedError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    upload_read_seconds = time.perf_counter() - started
+    MODERATION_STAGE_SECONDS.labels(stage="upload_read").observe(upload_read_seconds)
     
     # Create the item listing object to pass to the service
     item = ItemListing(
@@ -50,9 +95,25 @@ async def moderate_item_endpoint(
         image_data=image_data,
         image_filename=image.filename
     )
+    return item, round(upload_read_seconds * 1000, 3)
+
+# Define the API endpoint
+@router.post("/moderate-item/")
+async def moderate_item_endpoint(listing: Tuple[ItemListing, float] = Depends(read_listing),
+                                 service: ModerationService = Depends(get_moderation_service)):
+    """
+    Main endpoint for submitting items for moderation.
+    This handles the web request and calls the service to perform the logic.
+    """
+    item, upload_read_ms = listing
     
     # Call the service to get the moderation result
-    result = await moderation_service.moderate_item(item)
+    try:
+        result = await service.moderate_item(item)
+    except ModerationUnavailableError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers={"Retry-After": "5"})
+    except ImageRejectedError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     
     # Format and return the final JSON response
     return {
@@ -60,6 +121,10 @@ async def moderate_item_endpoint(
         "reason": result.reason,
         "confidence_score": result.confidence_score,
         "raw_response": result.raw_response,
+        "cached": result.cached,
+        "prescreen_rule": result.prescreen_rule,
+        "duplicate_of": result.duplicate_of,
+        "timings_ms": {"upload_read_ms": upload_read_ms, **(result.timings or {})},
         "item_details": {
             "user_id": item.user_id,
             "title": item.title,
@@ -71,4 +136,103 @@ async def moderate_item_endpoint(
             "tags": item.tags,
             "description": item.description
         }
-    }
\ No newline at end of file
+    }
+
+def _require_jobs() -> ModerationJobStore:
+    store = get_job_store()
+    if store is None:
+        raise HTTPException(status_code=404, detail="Moderation jobs are disabled (MODERATION_JOBS_ENABLED)")
+    return store
+
+@router.post("/jobs/", status_code=202)
+async def submit_moderation_job(listing: Tuple[ItemListing, float] = Depends(read_listing),
+                                service: ModerationService = Depends(get_moderation_service)):
+    """
+    Queues a listing for moderation and returns a job id straight away.
+    The image is downsized and stored on disk (with its original size, for the pre-screen);
+    poll GET /moderation/jobs/{job_id} for the result.
+    """
+    store = _require_jobs()
+    item, _ = listing
+    try:
+        image_data, item.image_size = await service.preprocessor.run_to_jpeg(item.image_data)
+    except ImageRejectedError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except Exception:
+        # Unreadable images are queued as uploaded; the worker flags them like the synchronous endpoint does
+        image_data = item.image_data
+    item.image_data = None
+    job_id = await asyncio.to_thread(store.submit, item, image_data)
+    if job_worker is not None:
+        job_worker.notify()
+    return {"job_id": job_id, "status": "queued", "status_url": f"{router.prefix}/jobs/{job_id}"}
+
+@router.get("/jobs/stats")
+def moderation_job_stats():
+    """Queue depth by status and background worker counters."""
+    store = _require_jobs()
+    if job_worker is None:
+        return {"workers": 0, "jobs": store.counts()}
+    return job_worker.stats()
+
+@router.post("/jobs/bulk")
+def get_moderation_jobs(request: JobIds):
+    """Status and results for many jobs at once; unknown ids are listed under "missing"."""
+    jobs = _require_jobs().get_many(request.job_ids)
+    return {"jobs": [jobs[job_id] for job_id in request.job_ids if job_id in jobs],
+            "missing": [job_id for job_id in request.job_ids if job_id not in jobs]}
+
+@router.get("/jobs/{job_id}")
+def get_moderation_job(job_id: str):
+    """Status of one job, with its moderation result once it is done."""
+    job = _require_jobs().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown moderation job '{job_id}'")
+    return job
+
+def start_background_tasks():
+    """Starts the moderation job workers on the running event loop"""
+    global job_worker
+    store = get_job_store()
+    if store is not None and job_worker is None:
+        job_worker = ModerationJobWorker(
+            store, get_moderation_service(), concurrency=MODERATION_JOB_WORKERS,
+            rate_per_second=MODERATION_JOB_RATE_PER_SECOND, max_attempts=MODERATION_JOB_MAX_ATTEMPTS,
+            lock=DrainLock(os.path.join(store.root_dir, "drain.lock"))
+        )
+        job_worker.start()
+
+async def stop_background_tasks():
+    global job_worker
+    if job_worker is not None:
+        await job_worker.stop()
+        job_worker = None
+
+@router.get("/cache/stats")
+def moderation_cache_stats(service: ModerationService = Depends(get_moderation_service)):
+    """Hit, miss and eviction counters for the moderation result cache."""
+    return service.cache.stats()
+
+@router.get("/prescreen/stats")
+def moderation_prescreen_stats(service: ModerationService = Depends(get_moderation_service)):
+    """How often each local pre-screen rule flagged a listing, plus the active thresholds."""
+    if service.prescreener is None:
+        return {"enabled": False}
+    return {"enabled": True, **service.prescreener.stats()}
+
+@router.get("/duplicates/stats")
+def moderation_duplicate_stats(service: ModerationService = Depends(get_moderation_service)):
+    """Size and query counters for the near-duplicate image index."""
+    if service.duplicate_index is None:
+        return {"enabled": False}
+    return {"enabled": True, **service.duplicate_index.stats()}
+
+@router.get("/executor/stats")
+def moderation_executor_stats(service: ModerationService = Depends(get_moderation_service)):
+    """Concurrency, queueing, timeout and retry counters for model calls."""
+    return service.executor.stats()
+
+@router.get("/batching/stats")
+def moderation_batching_stats(service: ModerationService = Depends(get_moderation_service)):
+    """Batch sizes, flush reasons and individual fallbacks of micro-batched model calls."""
+    return service.batching_stats()
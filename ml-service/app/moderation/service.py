@@ -1,22 +1,56 @@
 import os
 import asyncio
-from typing import Optional
+import hashlib
+import json
+import re
+import time
+from typing import Any, Dict, List, Optional, Tuple
 from enum import Enum
-from dataclasses import dataclass
-from PIL import Image
-import io
+from dataclasses import dataclass, asdict
 import logging
-import google.generativeai as genai
 
-from app.core.config import GEMINI_API_KEY
+from app.core.config import (
+    GEMINI_API_KEY, MODERATION_CACHE_MAX_ENTRIES, MODERATION_CACHE_TTL_SECONDS, MODERATION_CACHE_SQLITE_PATH,
+    MODERATION_MAX_IN_FLIGHT, MODERATION_MAX_QUEUE, MODERATION_CALL_TIMEOUT_SECONDS, MODERATION_DEADLINE_SECONDS,
+    MODERATION_MAX_RETRIES, MODERATION_BACKOFF_BASE_SECONDS, MODERATION_BACKOFF_MAX_SECONDS,
+    MODERATION_FAKE_MODEL, MODERATION_FAKE_LATENCY_SECONDS, MODERATION_FAKE_FAILURE_RATE,
+    MODERATION_MAX_IMAGE_PIXELS, MODERATION_IMAGE_MAX_SIDE, MODERATION_IMAGE_POOL, MODERATION_IMAGE_WORKERS,
+    MODERATION_PRESCREEN_ENABLED, MODERATION_PRESCREEN_DISABLED_RULES, MODERATION_PRESCREEN_MIN_SIDE,
+    MODERATION_PRESCREEN_MIN_LAPLACIAN_VARIANCE, MODERATION_PRESCREEN_MIN_BRIGHTNESS, MODERATION_PRESCREEN_MAX_BRIGHTNESS,
+    MODERATION_PRESCREEN_MAX_DARK_FRACTION, MODERATION_PRESCREEN_MAX_BRIGHT_FRACTION, MODERATION_PRESCREEN_MIN_TITLE_CHARS,
+    MODERATION_PRESCREEN_MAX_CAPS_RATIO, MODERATION_PRESCREEN_MAX_REPEATED_CHARS, MODERATION_PRESCREEN_MAX_WORD_SHARE,
+    MODERATION_DUPLICATE_INDEX_ENABLED, MODERATION_DUPLICATE_SQLITE_PATH,
+    MODERATION_DUPLICATE_MAX_DISTANCE, MODERATION_DUPLICATE_MAX_DHASH_DISTANCE,
+    MODERATION_BATCH_MAX_ITEMS, MODERATION_BATCH_WINDOW_SECONDS
+)
+from app.core.metrics import (
+    MODERATION_BATCH_FALLBACKS, MODERATION_DECISIONS, MODERATION_MODEL_TOKENS, MODERATION_STAGE_SECONDS,
+    observe_stage_timings
+)
+from .batching import MicroBatcher
+from .cache import ModerationCache
+from .duplicates import DuplicateImageIndex
+from .executor import ModerationExecutor, ModerationUnavailableError
+from .fake import FakeGenerativeModel
+from .preprocess import ImagePreprocessor, ImageRejectedError
+from .prescreen import Prescreener, PrescreenThresholds
 
 # --- Basic Setup ---
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Configure and initialize the Gemini model using the key from config
-genai.configure(api_key=GEMINI_API_KEY)
-model = genai.GenerativeModel('gemini-1.5-flash') # Using a more recent model name
+def create_generative_model():
+    """
+    Configures and initializes the Gemini model using the key from config.
+    google.generativeai is imported here rather than at module level: it is slow to import
+    and pulls in gRPC, which should not be initialized before a pre-forking server forks.
+    """
+    if MODERATION_FAKE_MODEL:
+        logger.warning("MODERATION_FAKE_MODEL is set: moderation uses a local fake model, not Gemini")
+        return FakeGenerativeModel(latency_seconds=MODERATION_FAKE_LATENCY_SECONDS, failure_rate=MODERATION_FAKE_FAILURE_RATE)
+    import google.generativeai as genai
+    genai.configure(api_key=GEMINI_API_KEY)
+    return genai.GenerativeModel('gemini-1.5-flash') # Using a more recent model name
 
 # --- Data Models ---
 class ItemCondition(str, Enum):
@@ -53,6 +87,8 @@ class ItemListing:
     description: Optional[str] = None
     image_data: Optional[bytes] = None
     image_filename: Optional[str] = None
+    # (width, height) of the upload when image_data was already downsized, as for queued jobs
+    image_size: Optional[Tuple[int, int]] = None
 
 @dataclass
 class ModerationResult:
@@ -60,19 +96,17 @@ class ModerationResult:
     reason: Optional[str] = None
     confidence_score: Optional[float] = None
     raw_response: Optional[str] = None
+    cached: bool = False
+    # Set when a local pre-screen rule flagged the listing without calling the model
+    prescreen_rule: Optional[str] = None
+    # The earlier image from another user that this one duplicates, if any
+    duplicate_of: Optional[Dict] = None
+    # Milliseconds per processing stage for this request (not cached)
+    timings: Optional[Dict[str, float]] = None
 
 
-# --- The Service Class ---
-# This class contains all the "thinking" logic.
-class ModerationService:
-    """Service class for handling moderation logic"""
-    
-    def __init__(self):
-        self.model = model
-    
-    def _create_moderation_prompt(self, item: ItemListing) -> str:
-        """Create a comprehensive moderation prompt for Gemini"""
-        prompt = f"""
+# Prompt sections shared by the single-listing and the batched prompt
+PROMPT_INSTRUCTIONS = """
 SYSTEM INSTRUCTION: 
 You are a quality control assistant for a sustainable fashion swapping platform. Your job is to review item listings and decide if they are appropriate for approval. 
 
@@ -82,72 +116,369 @@ EVALUATION CRITERIA:
 3. ACCURACY: Does the description match what's shown in the image?
 4. CONDITION CONSISTENCY: Does the stated condition match the visual appearance?
 5. COMPLETENESS: Is the listing informative and helpful for potential swappers?
+"""
 
-ITEM DETAILS:
-- Title: {item.title}
+PROMPT_FLAG_REASONS = """COMMON FLAG REASONS:
+- Image is blurry, dark, or unclear
+- Image shows inappropriate content
+- Title/description doesn't match the image
+- Condition rating seems inaccurate based on visible wear
+- Spam or abusive language detected
+- Image shows damaged items not disclosed in condition
+- Multiple unrelated items in single listing
+- Image appears to be stock photo or not actual item
+"""
+
+# One answer line of a batched response, e.g. "ITEM 3: FLAGGED: blurry image" or "**Item 3** - APPROVED"
+_BATCH_ANSWER = re.compile(r"^[\s*#>-]*ITEM\s*(\d+)\s*\**\s*[:.)\-]\s*\**\s*(.+?)\s*$", re.IGNORECASE)
+
+
+# --- The Service Class ---
+# This class contains all the "thinking" logic.
+class ModerationService:
+    """Service class for handling moderation logic"""
+    
+    def __init__(self, cache: Optional[ModerationCache] = None, executor: Optional[ModerationExecutor] = None,
+                 preprocessor: Optional[ImagePreprocessor] = None, prescreener: Optional[Prescreener] = None,
+                 duplicate_index: Optional[DuplicateImageIndex] = None, generative_model=None,
+                 batch_max_items: Optional[int] = None, batch_window_seconds: Optional[float] = None):
+        self.model = generative_model if generative_model is not None else create_generative_model()
+        self.executor = executor if executor is not None else ModerationExecutor(
+            max_in_flight=MODERATION_MAX_IN_FLIGHT,
+            max_queue=MODERATION_MAX_QUEUE,
+            timeout_seconds=MODERATION_CALL_TIMEOUT_SECONDS,
+            deadline_seconds=MODERATION_DEADLINE_SECONDS,
+            max_retries=MODERATION_MAX_RETRIES,
+            backoff_base_seconds=MODERATION_BACKOFF_BASE_SECONDS,
+            backoff_max_seconds=MODERATION_BACKOFF_MAX_SECONDS
+        )
+        self.preprocessor = preprocessor if preprocessor is not None else ImagePreprocessor(
+            max_side=MODERATION_IMAGE_MAX_SIDE,
+            max_pixels=MODERATION_MAX_IMAGE_PIXELS,
+            pool=MODERATION_IMAGE_POOL,
+            workers=MODERATION_IMAGE_WORKERS
+        )
+        if prescreener is not None:
+            self.prescreener = prescreener
+        elif MODERATION_PRESCREEN_ENABLED:
+            self.prescreener = Prescreener(
+                PrescreenThresholds(
+                    min_side=MODERATION_PRESCREEN_MIN_SIDE,
+                    min_laplacian_variance=MODERATION_PRESCREEN_MIN_LAPLACIAN_VARIANCE,
+                    max_dark_fraction=MODERATION_PRESCREEN_MAX_DARK_FRACTION,
+                    max_bright_fraction=MODERATION_PRESCREEN_MAX_BRIGHT_FRACTION,
+                    min_brightness=MODERATION_PRESCREEN_MIN_BRIGHTNESS,
+                    max_brightness=MODERATION_PRESCREEN_MAX_BRIGHTNESS,
+                    min_title_chars=MODERATION_PRESCREEN_MIN_TITLE_CHARS,
+                    max_caps_ratio=MODERATION_PRESCREEN_MAX_CAPS_RATIO,
+                    max_repeated_chars=MODERATION_PRESCREEN_MAX_REPEATED_CHARS,
+                    max_word_share=MODERATION_PRESCREEN_MAX_WORD_SHARE
+                ),
+                disabled=MODERATION_PRESCREEN_DISABLED_RULES
+            )
+        else:
+            self.prescreener = None
+        if duplicate_index is not None:
+            self.duplicate_index = duplicate_index
+        elif MODERATION_DUPLICATE_INDEX_ENABLED:
+            self.duplicate_index = DuplicateImageIndex(
+                sqlite_path=MODERATION_DUPLICATE_SQLITE_PATH or None,
+                max_distance=MODERATION_DUPLICATE_MAX_DISTANCE,
+                max_dhash_distance=MODERATION_DUPLICATE_MAX_DHASH_DISTANCE
+            )
+        else:
+            self.duplicate_index = None
+        self.cache = cache if cache is not None else ModerationCache(
+            max_entries=MODERATION_CACHE_MAX_ENTRIES,
+            ttl_seconds=MODERATION_CACHE_TTL_SECONDS,
+            sqlite_path=MODERATION_CACHE_SQLITE_PATH
+        )
+        batch_max_items = MODERATION_BATCH_MAX_ITEMS if batch_max_items is None else batch_max_items
+        # Model calls go through the batcher only when more than one listing may share a call
+        self.batcher = MicroBatcher(
+            self._call_model_batch, max_items=batch_max_items,
+            window_seconds=MODERATION_BATCH_WINDOW_SECONDS if batch_window_seconds is None else batch_window_seconds,
+            max_concurrent=self.executor.max_in_flight
+        ) if batch_max_items > 1 else None
+        self.batch_fallbacks = {"unparsed": 0, "missing": 0}
+
+    @staticmethod
+    def _cache_key(item: ItemListing) -> str:
+        """Content hash of the normalized listing fields plus the raw image bytes"""
+        def normalize(value: Optional[str]) -> str:
+            return " ".join(str(value).split()).casefold() if value is not None else ""
+        fields = [item.title, item.type, item.size, item.condition, item.material, item.brand, item.tags, item.description]
+        digest = hashlib.sha256(json.dumps([normalize(v) for v in fields]).encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(item.image_data or b"")
+        return digest.hexdigest()
+    
+    @staticmethod
+    def _item_details(item: ItemListing) -> str:
+        return f"""- Title: {item.title}
 - Type: {item.type}
 - Size: {item.size}
 - Condition: {item.condition}
 - Material: {item.material or 'Not specified'}
 - Brand: {item.brand or 'Not specified'}
 - Tags: {item.tags or 'None'}
-- Description: {item.description or 'No description provided'}
+- Description: {item.description or 'No description provided'}"""
+
+    def _create_moderation_prompt(self, item: ItemListing) -> str:
+        """Create a comprehensive moderation prompt for Gemini"""
+        prompt = f"""{PROMPT_INSTRUCTIONS}
+ITEM DETAILS:
+{self._item_details(item)}
 
 RESPONSE FORMAT:
 Please respond with EXACTLY one of the following:
 - "APPROVED" (if the listing meets all quality standards)
 - "FLAGGED: [specific reason]" (if there are issues)
 
-COMMON FLAG REASONS:
-- Image is blurry, dark, or unclear
-- Image shows inappropriate content
-- Title/description doesn't match the image
-- Condition rating seems inaccurate based on visible wear
-- Spam or abusive language detected
-- Image shows damaged items not disclosed in condition
-- Multiple unrelated items in single listing
-- Image appears to be stock photo or not actual item
-
+{PROMPT_FLAG_REASONS}
 Please analyze the attached image along with the provided details and make your decision.
 """
         return prompt
-    
+
+    def _create_batch_contents(self, requests: List[Tuple[ItemListing, Optional[Any]]]) -> List:
+        """
+        One prompt for several listings: the instructions once, then each listing's details
+        followed by its own image, then a response format asking for one line per listing.
+        """
+        count = len(requests)
+        contents: List = [f"""{PROMPT_INSTRUCTIONS}
+You are reviewing {count} separate listings, numbered ITEM 1 to ITEM {count}. Each listing's details
+are followed by its own image. Judge every listing on its own details and image only.
+"""]
+        for index, (item, image_part) in enumerate(requests, start=1):
+            image_note = "(image attached below)" if image_part is not None else "(no image provided)"
+            contents.append(f"""
+ITEM {index} DETAILS:
+{self._item_details(item)}
+ITEM {index} IMAGE {image_note}
+""")
+            if image_part is not None:
+                contents.append(image_part)
+        contents.append(f"""
+RESPONSE FORMAT:
+Respond with EXACTLY {count} lines, one per listing in order, and nothing else:
+ITEM 1: APPROVED
+ITEM 2: FLAGGED: [specific reason]
+Each line starts with "ITEM <number>: " followed by "APPROVED" or "FLAGGED: [specific reason]".
+
+{PROMPT_FLAG_REASONS}""")
+        return contents
+
     async def moderate_item(self, item: ItemListing) -> ModerationResult:
         """Moderate an item listing using Gemini API"""
+        result = await self._moderate(item)
+        MODERATION_DECISIONS.labels(decision=result.decision.value, source=self._decision_source(result)).inc()
+        observe_stage_timings(MODERATION_STAGE_SECONDS, result.timings)
+        return result
+
+    @staticmethod
+    def _decision_source(result: ModerationResult) -> str:
+        if result.cached:
+            return "cache"
+        if result.prescreen_rule:
+            return "prescreen"
+        if result.duplicate_of:
+            return "duplicate"
+        return "model" if result.raw_response is not None else "error"
+
+    async def _moderate(self, item: ItemListing) -> ModerationResult:
+        timings = {}
         try:
-            prompt = self._create_moderation_prompt(item)
+            cache_key = self._cache_key(item)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                # A cached verdict was for whoever submitted the image first, so reposts are still checked
+                hashes = cached.get("image_hashes")
+                duplicate = self._check_duplicate(hashes, item.user_id, timings) if hashes else None
+                if duplicate is not None:
+                    return duplicate
+                fields = {k: v for k, v in cached.items() if k != "image_hashes"}
+                return ModerationResult(**{**fields, "decision": ModerationDecision(fields["decision"]),
+                                           "cached": True, "timings": timings})
+
+            # Text rules run before the image is even decoded
+            flagged = self._prescreen_text(item)
+            if flagged is not None:
+                return self._prescreen_result(flagged, timings)
+
             image_part = None
+            hashes = None
             if item.image_data:
                 try:
-                    pil_image = Image.open(io.BytesIO(item.image_data))
-                    if pil_image.mode != 'RGB':
-                        pil_image = pil_image.convert('RGB')
-                    max_size = (1024, 1024)
-                    pil_image.thumbnail(max_size, Image.Resampling.LANCZOS)
-                    image_part = pil_image
+                    prepared = await self.preprocessor.run(item.image_data)
+                except ImageRejectedError:
+                    raise
                 except Exception as e:
                     logger.error(f"Error processing image: {e}")
-                    return ModerationResult(decision=ModerationDecision.FLAGGED, reason="Invalid or corrupted image file", confidence_score=1.0)
-            
-            if image_part:
-                response = await asyncio.to_thread(self.model.generate_content, [prompt, image_part])
-            else:
-                response = await asyncio.to_thread(self.model.generate_content, prompt)
-            
-            response_text = response.text.strip()
-            logger.info(f"Gemini response: {response_text}")
-            
-            if response_text.startswith("APPROVED"):
-                return ModerationResult(decision=ModerationDecision.APPROVED, confidence_score=0.9, raw_response=response_text)
-            elif response_text.startswith("FLAGGED:"):
-                reason = response_text.replace("FLAGGED:", "").strip()
-                return ModerationResult(decision=ModerationDecision.FLAGGED, reason=reason, confidence_score=0.9, raw_response=response_text)
+                    return ModerationResult(decision=ModerationDecision.FLAGGED, reason="Invalid or corrupted image file", confidence_score=1.0, timings=timings)
+                image_part = prepared.image
+                timings.update(prepared.timings)
+                if self.prescreener is not None:
+                    original_size = tuple(item.image_size) if item.image_size else prepared.original_size
+                    flagged = self.prescreener.check_image(original_size, prepared.stats)
+                    if flagged is not None:
+                        return self._prescreen_result(flagged, timings)
+                hashes = prepared.hashes
+                duplicate = self._check_duplicate(hashes, item.user_id, timings)
+                if duplicate is not None:
+                    return duplicate
+            if self.prescreener is not None:
+                self.prescreener.record_checked(flagged=False)
+
+            if self.batcher is not None:
+                result = await self.batcher.submit((item, image_part, time.perf_counter()))
             else:
-                response_lower = response_text.lower()
-                if "approved" in response_lower and "flagged" not in response_lower:
-                    return ModerationResult(decision=ModerationDecision.APPROVED, confidence_score=0.7, raw_response=response_text)
-                else:
-                    return ModerationResult(decision=ModerationDecision.FLAGGED, reason="Unclear response from moderation system", confidence_score=0.5, raw_response=response_text)
+                result = await self._call_model(item, image_part)
+            timings.update(result.timings)
+
+            # Only clear model decisions are cached: errors return before this point, and an
+            # unclear answer should get a fresh model call when the listing is resubmitted
+            if result.confidence_score >= 0.7:
+                self.cache.set(cache_key, {**asdict(result), "decision": result.decision.value, "cached": False,
+                                           "timings": None, "image_hashes": list(hashes) if hashes else None})
+            result.timings = timings
+            return result
+        except (ModerationUnavailableError, ImageRejectedError):
+            # Admission failures and oversized images surface as HTTP errors rather than a FLAGGED decision
+            raise
         except Exception as e:
             logger.error(f"Error in moderation: {e}")
-            return ModerationResult(decision=ModerationDecision.FLAGGED, reason=f"Technical error during moderation: {str(e)}", confidence_score=1.0)
\ No newline at end of file
+            return ModerationResult(decision=ModerationDecision.FLAGGED, reason=f"Technical error during moderation: {str(e)}", confidence_score=1.0, timings=timings)
+
+    def _prescreen_text(self, item: ItemListing):
+        if self.prescreener is None:
+            return None
+        return self.prescreener.check_text(item.title, [item.description, item.tags, item.brand, item.material])
+
+    def _prescreen_result(self, flagged, timings: Dict[str, float]) -> ModerationResult:
+        rule, reason = flagged
+        self.prescreener.record_checked(flagged=True)
+        logger.info(f"Pre-screen rule '{rule}' flagged the listing: {reason}")
+        return ModerationResult(decision=ModerationDecision.FLAGGED, reason=reason, confidence_score=0.95,
+                                prescreen_rule=rule, timings=timings)
+
+    def _check_duplicate(self, hashes, user_id: str, timings: Dict[str, float]) -> Optional[ModerationResult]:
+        """Flags images another user already submitted; otherwise adds this one to the index"""
+        if self.duplicate_index is None:
+            return None
+        started = time.perf_counter()
+        phash_value, dhash_value = hashes
+        match = self.duplicate_index.find_or_add(phash_value, dhash_value, user_id)
+        timings["duplicate_check_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        if match is None:
+            return None
+        logger.info(f"Image duplicates indexed image {match.image_id} (distance {match.distance})")
+        return ModerationResult(decision=ModerationDecision.FLAGGED,
+                                reason="Image appears to be reused from another user's listing",
+                                confidence_score=0.95, duplicate_of=match.to_dict(), timings=timings)
+
+    async def _call_model(self, item: ItemListing, image_part) -> ModerationResult:
+        """One model call for one listing; the result carries model_call_ms and parse_ms timings"""
+        prompt = self._create_moderation_prompt(item)
+        contents = [prompt, image_part] if image_part else prompt
+        started = time.perf_counter()
+        # The client-side timeout frees the worker thread if the executor gives up on the call
+        response = await self.executor.run(
+            self.model.generate_content, contents,
+            request_options={"timeout": self.executor.timeout_seconds}
+        )
+        model_call_ms = round((time.perf_counter() - started) * 1000, 3)
+        self._record_usage(response)
+
+        started = time.perf_counter()
+        response_text = response.text.strip()
+        logger.info(f"Gemini response: {response_text}")
+        result = self._parse_response(response_text)
+        result.timings = {"model_call_ms": model_call_ms, "parse_ms": round((time.perf_counter() - started) * 1000, 3)}
+        return result
+
+    async def _call_model_batch(self, requests: List[Tuple[ItemListing, Any, float]]) -> List:
+        """
+        MicroBatcher handler: one model call for all the listings in `requests`, answered per
+        listing. Listings whose answer is missing or ambiguous, or all of them when the answer
+        cannot be parsed at all, are re-sent individually.
+        """
+        flushed_at = time.perf_counter()
+        waits = [round((flushed_at - submitted_at) * 1000, 3) for _, _, submitted_at in requests]
+        if len(requests) == 1:
+            # Nothing arrived within the window: a batch of one would only cost a longer prompt
+            item, image_part, _ = requests[0]
+            results: List = [await self._call_model(item, image_part)]
+        else:
+            contents = self._create_batch_contents([(item, image_part) for item, image_part, _ in requests])
+            started = time.perf_counter()
+            response = await self.executor.run(
+                self.model.generate_content, contents,
+                request_options={"timeout": self.executor.timeout_seconds}
+            )
+            model_call_ms = round((time.perf_counter() - started) * 1000, 3)
+            self._record_usage(response)
+
+            started = time.perf_counter()
+            response_text = response.text.strip()
+            logger.info(f"Gemini batch response for {len(requests)} listings: {response_text}")
+            results = self._parse_batch_response(response_text, len(requests))
+            parse_ms = round((time.perf_counter() - started) * 1000, 3)
+            for result in results:
+                if result is not None:
+                    result.timings = {"model_call_ms": model_call_ms, "parse_ms": parse_ms}
+
+            retry = [index for index, result in enumerate(results) if result is None]
+            if retry:
+                reason = "unparsed" if len(retry) == len(requests) else "missing"
+                self.batch_fallbacks[reason] += len(retry)
+                MODERATION_BATCH_FALLBACKS.labels(reason=reason).inc(len(retry))
+                logger.warning(f"Batch answer unusable for {len(retry)} of {len(requests)} listings; "
+                               "moderating them individually")
+                retried = await asyncio.gather(*(self._call_model(*requests[index][:2]) for index in retry),
+                                               return_exceptions=True)
+                for index, result in zip(retry, retried):
+                    results[index] = result
+        for result, wait_ms in zip(results, waits):
+            if isinstance(result, ModerationResult):
+                result.timings = {"batch_wait_ms": wait_ms, **result.timings}
+        return results
+
+    def _parse_batch_response(self, response_text: str, count: int) -> List[Optional[ModerationResult]]:
+        """Per-listing results from a batched answer; None where a listing has no single clear answer line"""
+        answers: Dict[int, Optional[str]] = {}
+        for line in response_text.splitlines():
+            match = _BATCH_ANSWER.match(line)
+            if match is None or not 1 <= int(match.group(1)) <= count:
+                continue
+            index = int(match.group(1))
+            # Two answers for the same listing cannot both be trusted
+            answers[index] = None if index in answers else match.group(2).strip("* ")
+        return [self._parse_response(answers[index]) if answers.get(index) else None for index in range(1, count + 1)]
+
+    @staticmethod
+    def _record_usage(response):
+        usage = getattr(response, "usage_metadata", None)
+        if usage is None:
+            return
+        MODERATION_MODEL_TOKENS.labels(kind="prompt").inc(getattr(usage, "prompt_token_count", 0) or 0)
+        MODERATION_MODEL_TOKENS.labels(kind="response").inc(getattr(usage, "candidates_token_count", 0) or 0)
+
+    def batching_stats(self) -> Dict:
+        if self.batcher is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.batcher.stats(), "fallback_items": dict(self.batch_fallbacks)}
+
+    def _parse_response(self, response_text: str) -> ModerationResult:
+        """Turns the model's free-text answer into a ModerationResult"""
+        if response_text.startswith("APPROVED"):
+            return ModerationResult(decision=ModerationDecision.APPROVED, confidence_score=0.9, raw_response=response_text)
+        elif response_text.startswith("FLAGGED:"):
+            reason = response_text.replace("FLAGGED:", "").strip()
+            return ModerationResult(decision=ModerationDecision.FLAGGED, reason=reason, confidence_score=0.9, raw_response=response_text)
+        else:
+            response_lower = response_text.lower()
+            if "approved" in response_lower and "flagged" not in response_lower:
+                return ModerationResult(decision=ModerationDecision.APPROVED, confidence_score=0.7, raw_response=response_text)
+            else:
+                return ModerationResult(decision=ModerationDecision.FLAGGED, reason="Unclear response from moderation system", confidence_score=0.5, raw_response=response_text)
\ No newline at end of file
@@ -0,0 +1,127 @@
+# ml-service/benchmarks/batching.py
+"""
+Throughput, latency and model cost per listing with and without moderation micro-batching.
+
+Listings arrive at a steady rate (an open workload, like peak listing hours) and go through
+ModerationService.moderate_item with the local fake model, once per batch size:
+
+    python -m benchmarks.batching --batch-sizes 1,4,8,16 --rate 40 --listings 400
+    python -m benchmarks.batching --malformed-rate 0.2    # batch answers the service cannot parse
+
+Batch size 1 is the unbatched service. Token counts use the fake model's approximation of
+Gemini's accounting (4 characters per text token, 258 tokens per image), and the cost
+columns apply --input-price/--output-price to them.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from typing import Dict, List
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from benchmarks.load import make_listing_images
+from benchmarks.report import add_output_arguments, build_report, finish, summarize
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baselines', 'batching.json')
+
+
+async def measure(images: List[bytes], batch_size: int, args) -> Dict:
+    from app.moderation.cache import ModerationCache
+    from app.moderation.executor import ModerationExecutor
+    from app.moderation.fake import FakeGenerativeModel
+    from app.moderation.service import ItemListing, ModerationService
+
+    model = FakeGenerativeModel(latency_seconds=args.model_latency, latency_per_image_seconds=args.latency_per_image,
+                                malformed_rate=args.malformed_rate, seed=args.seed)
+    service = ModerationService(
+        generative_model=model, cache=ModerationCache(), batch_max_items=batch_size,
+        batch_window_seconds=args.window,
+        executor=ModerationExecutor(max_in_flight=args.max_in_flight, max_queue=args.listings)
+    )
+    latencies, errors = [], 0
+
+    async def moderate(index: int):
+        nonlocal errors
+        item = ItemListing(user_id=f"bench-user-{index}", title=f"Cotton shirt {index}", type="Shirt", size="M",
+                           condition="Like New", description="Gently used, no stains or tears", image_data=images[index])
+        started = time.perf_counter()
+        try:
+            result = await service.moderate_item(item)
+            if result.raw_response is None:
+                errors += 1
+        except Exception:
+            errors += 1
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    tasks = []
+    for index in range(args.listings):
+        tasks.append(asyncio.create_task(moderate(index)))
+        await asyncio.sleep(1 / args.rate)
+    await asyncio.gather(*tasks)
+    wall_seconds = time.perf_counter() - started
+
+    result = summarize(latencies, wall_seconds=wall_seconds, errors=errors)
+    per_item = 1 / args.listings
+    result.update({
+        'batch_size': batch_size,
+        'model_calls': model.calls,
+        'calls_per_item': round(model.calls * per_item, 3),
+        'prompt_tokens_per_item': round(model.prompt_tokens * per_item, 1),
+        'response_tokens_per_item': round(model.response_tokens * per_item, 1),
+        'cost_per_1k_items_usd': round((model.prompt_tokens * args.input_price + model.response_tokens * args.output_price)
+                                       * per_item * 1000 / 1e6, 5),
+        'batching': service.batching_stats(),
+    })
+    service.executor.shutdown()
+    return result
+
+
+async def main(args) -> Dict[str, Dict]:
+    images = make_listing_images(args.listings, size=(640, 480), seed=args.seed)
+    results = {}
+    for batch_size in [int(size) for size in args.batch_sizes.split(",") if size.strip()]:
+        print(f"--- batch size {batch_size}: {args.listings} listings at {args.rate}/s ---")
+        results[f'moderate_batch_{batch_size}'] = await measure(images, batch_size, args)
+    return results
+
+
+def print_costs(results: Dict[str, Dict]):
+    header = (f"{'benchmark':<34}{'calls/item':>11}{'prompt tok':>12}{'resp tok':>10}{'$/1k items':>12}"
+              f"{'mean batch':>12}{'fallbacks':>11}")
+    print(header)
+    print("-" * len(header))
+    for name, r in results.items():
+        batching = r['batching']
+        fallbacks = sum(batching.get('fallback_items', {}).values())
+        print(f"{name:<34}{r['calls_per_item']:>11.3f}{r['prompt_tokens_per_item']:>12.1f}"
+              f"{r['response_tokens_per_item']:>10.1f}{r['cost_per_1k_items_usd']:>12.5f}"
+              f"{(batching.get('mean_batch_size') or 1):>12.2f}{fallbacks:>11}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare moderation throughput and cost with and without micro-batching.")
+    parser.add_argument('--batch-sizes', default="1,4,8,16", help="Comma-separated MODERATION_BATCH_MAX_ITEMS values; 1 is unbatched.")
+    parser.add_argument('--window', type=float, default=0.05, help="Batch window in seconds.")
+    parser.add_argument('--listings', type=int, default=400)
+    parser.add_argument('--rate', type=float, default=40, help="Listings arriving per second.")
+    parser.add_argument('--max-in-flight', type=int, default=8, help="Concurrent model calls allowed (the executor limit).")
+    parser.add_argument('--model-latency', type=float, default=0.5, help="Fake model latency per call in seconds.")
+    parser.add_argument('--latency-per-image', type=float, default=0.02, help="Extra fake model latency per image in seconds.")
+    parser.add_argument('--malformed-rate', type=float, default=0.0, help="Fraction of batch answers the service cannot parse.")
+    parser.add_argument('--input-price', type=float, default=0.075, help="USD per million prompt tokens.")
+    parser.add_argument('--output-price', type=float, default=0.30, help="USD per million response tokens.")
+    parser.add_argument('--seed', type=int, default=0)
+    add_output_arguments(parser, DEFAULT_BASELINE)
+    args = parser.parse_args()
+
+    # No on-disk state: the duplicate index would flag nothing here but adds SQLite writes
+    os.environ["MODERATION_DUPLICATE_INDEX_ENABLED"] = "false"
+    config = {k: getattr(args, k) for k in ('batch_sizes', 'window', 'listings', 'rate', 'max_in_flight', 'model_latency',
+                                            'latency_per_image', 'malformed_rate', 'input_price', 'output_price', 'seed')}
+    report = build_report('batching', config, asyncio.run(main(args)))
+    print()
+    print_costs(report['results'])
+    sys.exit(finish(report, args.output, None if args.no_baseline else args.baseline, args.save_baseline, args.tolerance))
@@ -0,0 +1,170 @@
+# ml-service/benchmarks/load.py
+"""
+End-to-end load generator for /estimator/estimate/ and /moderation/moderate-item/.
+
+By default it drives the FastAPI app in-process (no server needed) with the Gemini client
+replaced by the local fake model, so results depend only on this code and this machine:
+
+    python -m benchmarks.load --model-latency 0.2 --concurrency 16
+    python -m benchmarks.load --url http://localhost:8000   # a running server (start it with MODERATION_FAKE_MODEL=1)
+
+The estimator endpoint needs a trained artifact; see scripts/train_estimator.py and --artifact-dir.
+"""
+import argparse
+import asyncio
+import io
+import os
+import random
+import sys
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Optional
+
+import httpx
+import numpy as np
+from PIL import Image, ImageDraw
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from benchmarks.report import add_output_arguments, build_report, finish, summarize
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baselines', 'load.json')
+
+ESTIMATOR_ITEMS = [
+    {'item_type': 'T-shirt', 'material': 'Cotton', 'brand': 'H&M', 'condition': 'Used'},
+    {'item_type': 'Jeans', 'material': 'Denim', 'brand': 'Levi', 'condition': 'Fairly New'},
+    {'item_type': 'Saree', 'material': 'Silk', 'brand': 'Fabindia', 'condition': 'Excellent'},
+    {'item_type': 'Hoodie', 'material': 'Polyester', 'brand': 'Nike', 'condition': 'Visible Wear'},
+    {'item_type': 'Kurta_Kurti', 'material': 'Khadi', 'brand': 'Fabindia', 'condition': 'brand_new'},
+    # Unknown values take the model path instead of the lookup table
+    {'item_type': 'Shirt', 'material': 'Cotton', 'brand': 'Biba', 'condition': 'Good'},
+]
+
+
+def make_listing_images(count: int, size=(1024, 768), seed: int = 0) -> List[bytes]:
+    """Sharp, well-exposed synthetic photos that pass the pre-screen and differ from each other"""
+    rng = np.random.default_rng(seed)
+    images = []
+    for _ in range(count):
+        image = Image.new("RGB", size, tuple(int(v) for v in rng.integers(80, 180, 3)))
+        draw = ImageDraw.Draw(image)
+        for _ in range(60):
+            x, y = int(rng.integers(0, size[0])), int(rng.integers(0, size[1]))
+            w, h = int(rng.integers(20, 200)), int(rng.integers(20, 200))
+            draw.rectangle([x, y, x + w, y + h], fill=tuple(int(v) for v in rng.integers(0, 255, 3)))
+        buffer = io.BytesIO()
+        image.save(buffer, "JPEG", quality=88)
+        images.append(buffer.getvalue())
+    return images
+
+
+async def drive(name: str, send: Callable, total: int, concurrency: int) -> Dict:
+    """Runs `total` requests through `concurrency` workers and summarizes latency and throughput"""
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    errors = 0
+    next_index = 0
+
+    async def worker():
+        nonlocal next_index, errors
+        while next_index < total:
+            index = next_index
+            next_index += 1
+            started = time.perf_counter()
+            try:
+                ok, status = await send(index)
+            except httpx.HTTPError as e:
+                ok, status = False, type(e).__name__
+            latencies.append((time.perf_counter() - started) * 1000)
+            statuses[str(status)] += 1
+            errors += 0 if ok else 1
+
+    print(f"--- {name}: {total} requests, concurrency {concurrency} ---")
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    summary = summarize(latencies, wall_seconds=time.perf_counter() - started, errors=errors)
+    summary['concurrency'] = concurrency
+    summary['status_codes'] = dict(statuses)
+    return summary
+
+
+async def run(client: httpx.AsyncClient, estimator_requests: int, moderation_requests: int, concurrency: int,
+              images: int, cache_hit_ratio: float, seed: int) -> Dict[str, Dict]:
+    results = {}
+    rng = random.Random(seed)
+
+    async def estimate(index: int):
+        response = await client.post("/estimator/estimate/", json=ESTIMATOR_ITEMS[index % len(ESTIMATOR_ITEMS)])
+        return response.status_code == 200 and "co2_saved_kg" in response.json(), response.status_code
+
+    probe_ok, probe_status = await estimate(0)
+    if not probe_ok:
+        print(f"Estimator endpoint is not serving estimates (status {probe_status}); is a trained artifact loaded?")
+    if estimator_requests and probe_ok:
+        results['estimator_estimate'] = await drive("/estimator/estimate/", estimate, estimator_requests, concurrency)
+
+    pool = make_listing_images(images, seed=seed)
+    # Each image belongs to one user, so repeats are not flagged as cross-user duplicates
+    repeats = [index >= images and rng.random() < cache_hit_ratio for index in range(moderation_requests)]
+
+    async def moderate(index: int):
+        listing = index % images if repeats[index] else index
+        form = {
+            "user_id": f"bench-user-{index % images}",
+            "title": f"Cotton shirt {listing}",
+            "type": "Shirt",
+            "size": "M",
+            "condition": "Like New",
+            "description": "Gently used, no stains or tears",
+        }
+        files = {"image": (f"listing-{listing}.jpg", pool[index % images], "image/jpeg")}
+        response = await client.post("/moderation/moderate-item/", data=form, files=files)
+        return response.status_code == 200 and "decision" in response.json(), response.status_code
+
+    if moderation_requests:
+        results['moderation_moderate_item'] = await drive("/moderation/moderate-item/", moderate, moderation_requests, concurrency)
+    return results
+
+
+def in_process_client(model_latency: float, artifact_dir: Optional[str]) -> httpx.AsyncClient:
+    """The FastAPI app itself, with the fake model and no on-disk moderation state"""
+    os.environ["MODERATION_FAKE_MODEL"] = "1"
+    os.environ["MODERATION_FAKE_LATENCY_SECONDS"] = str(model_latency)
+    os.environ.setdefault("MODERATION_DUPLICATE_SQLITE_PATH", "")
+    os.environ.setdefault("MODERATION_JOBS_ENABLED", "false")
+    if artifact_dir:
+        os.environ["ESTIMATOR_ARTIFACT_DIR"] = artifact_dir
+    from main import app
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://load-test", timeout=120)
+
+
+async def main(args) -> Dict[str, Dict]:
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=120,
+                                   limits=httpx.Limits(max_connections=args.concurrency))
+    else:
+        client = in_process_client(args.model_latency, args.artifact_dir)
+    async with client:
+        return await run(client, args.estimator_requests, args.moderation_requests, args.concurrency,
+                         args.images, args.cache_hit_ratio, args.seed)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Load-test the estimator and moderation endpoints.")
+    parser.add_argument('--url', default=None, help="Base URL of a running server (default: drive the app in-process).")
+    parser.add_argument('--artifact-dir', default=None, help="Estimator artifact directory for in-process runs.")
+    parser.add_argument('--model-latency', type=float, default=0.2, help="Fake model latency in seconds (in-process only).")
+    parser.add_argument('--estimator-requests', type=int, default=2000)
+    parser.add_argument('--moderation-requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--images', type=int, default=16, help="Distinct synthetic listing photos to cycle through.")
+    parser.add_argument('--cache-hit-ratio', type=float, default=0.0,
+                        help="Fraction of moderation requests that resubmit an earlier identical listing.")
+    parser.add_argument('--seed', type=int, default=0)
+    add_output_arguments(parser, DEFAULT_BASELINE)
+    args = parser.parse_args()
+
+    config = {k: getattr(args, k) for k in ('url', 'model_latency', 'estimator_requests', 'moderation_requests',
+                                            'concurrency', 'images', 'cache_hit_ratio', 'seed')}
+    report = build_report('load', config, asyncio.run(main(args)))
+    sys.exit(finish(report, args.output, None if args.no_baseline else args.baseline, args.save_baseline, args.tolerance))
@@ -0,0 +1,106 @@
+# ml-service/benchmarks/micro.py
+"""
+Microbenchmarks for the sustainability estimator: LCA database construction, training,
+and get_ml_estimate on both the lookup-table and the model path.
+
+    python -m benchmarks.micro                   # compare against benchmarks/baselines/micro.json
+    python -m benchmarks.micro --save-baseline   # record a new baseline on this machine
+"""
+import argparse
+import itertools
+import os
+import random
+import sys
+import time
+from typing import Callable, Dict, List
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.estimator.service import ResearchBasedSustainabilityEstimator, CATEGORICAL_FEATURES
+from benchmarks.report import add_output_arguments, build_report, finish, summarize
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baselines', 'micro.json')
+
+# Each row has a value that matches no category (Biba, Puma, Hemp), so it goes through the forests
+UNKNOWN_ITEMS = [
+    {'item_type': 'Kurta', 'material': 'Khadi', 'brand': 'Biba', 'condition': 'New'},
+    {'item_type': 'Shirt', 'material': 'Cotton', 'brand': 'Puma', 'condition': 'Good'},
+    {'item_type': 'Jeans', 'material': 'Hemp', 'brand': 'Levi', 'condition': 'Like New'},
+]
+
+
+def _time_calls(fn: Callable, calls: List, warmup: int = 5) -> List[float]:
+    """Per-call latency in milliseconds for fn(**kwargs) over every entry of `calls`"""
+    for kwargs in calls[:warmup]:
+        fn(**kwargs)
+    samples = []
+    for kwargs in calls:
+        started = time.perf_counter()
+        fn(**kwargs)
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def _time_repeated(fn: Callable, repeat: int) -> List[float]:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def run(n_estimators: int = 100, calls: int = 2000, batch_size: int = 1000, batches: int = 20, db_repeat: int = 5,
+        train_repeat: int = 1, seed: int = 0) -> Dict[str, Dict]:
+    results = {}
+
+    print(f"--- LCA database construction ({db_repeat}x) ---")
+    results['database_construction'] = summarize(
+        _time_repeated(lambda: ResearchBasedSustainabilityEstimator()._initialize_research_based_database(), db_repeat))
+
+    print(f"--- Training with {n_estimators} trees per forest ({train_repeat}x) ---")
+    estimator = None
+
+    def train():
+        nonlocal estimator
+        estimator = ResearchBasedSustainabilityEstimator()
+        estimator.train_ml_models(n_estimators=n_estimators, random_state=seed)
+    results['train_ml_models'] = summarize(_time_repeated(train, train_repeat))
+    results['precompute_lookup_table'] = summarize(_time_repeated(estimator.precompute_lookup_table, 1))
+
+    rng = random.Random(seed)
+    classes = [list(estimator.encoders[feature].classes_) for feature in CATEGORICAL_FEATURES]
+    combinations = list(itertools.product(*classes))
+    known = [dict(zip(CATEGORICAL_FEATURES, rng.choice(combinations))) for _ in range(calls)]
+    unknown = [UNKNOWN_ITEMS[i % len(UNKNOWN_ITEMS)] for i in range(calls)]
+
+    print(f"--- get_ml_estimate ({calls} calls per path) ---")
+    results['get_ml_estimate_lookup'] = summarize(_time_calls(estimator.get_ml_estimate, known))
+    results['get_ml_estimate_unknown_values'] = summarize(_time_calls(estimator.get_ml_estimate, unknown))
+    lookup_table, estimator.lookup_table = estimator.lookup_table, None
+    results['get_ml_estimate_model'] = summarize(_time_calls(estimator.get_ml_estimate, known))
+    estimator.lookup_table = lookup_table
+
+    print(f"--- get_ml_estimates_batch ({batches} calls of {batch_size} items) ---")
+    batch_calls = [{'items': [dict(zip(CATEGORICAL_FEATURES, rng.choice(combinations))) for _ in range(batch_size)]}
+                   for _ in range(batches)]
+    results[f'get_ml_estimates_batch_{batch_size}'] = summarize(
+        _time_calls(estimator.get_ml_estimates_batch, batch_calls, warmup=1))
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Estimator microbenchmarks with baseline comparison.")
+    parser.add_argument('--n-estimators', type=int, default=100, help="Trees per forest for the training benchmark.")
+    parser.add_argument('--calls', type=int, default=2000, help="Timed get_ml_estimate calls per path.")
+    parser.add_argument('--batch-size', type=int, default=1000, help="Items per get_ml_estimates_batch call.")
+    parser.add_argument('--batches', type=int, default=20, help="Timed get_ml_estimates_batch calls.")
+    parser.add_argument('--db-repeat', type=int, default=5, help="Database constructions to time.")
+    parser.add_argument('--train-repeat', type=int, default=1, help="Training runs to time.")
+    parser.add_argument('--seed', type=int, default=0)
+    add_output_arguments(parser, DEFAULT_BASELINE)
+    args = parser.parse_args()
+
+    config = {k: getattr(args, k) for k in ('n_estimators', 'calls', 'batch_size', 'batches', 'db_repeat', 'train_repeat', 'seed')}
+    report = build_report('micro', config, run(**config))
+    sys.exit(finish(report, args.output, None if args.no_baseline else args.baseline, args.save_baseline, args.tolerance))
@@ -0,0 +1,123 @@
+# ml-service/benchmarks/report.py
+import json
+import os
+import platform
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Metrics where a larger value is a regression; every other compared metric regresses when it shrinks
+LOWER_IS_BETTER = ('p50_ms', 'p95_ms', 'p99_ms')
+HIGHER_IS_BETTER = ('throughput_rps',)
+
+
+def summarize(latencies_ms: List[float], wall_seconds: Optional[float] = None, errors: int = 0) -> Dict:
+    """Percentiles and throughput for one benchmark; throughput uses wall time when given"""
+    samples = np.asarray(latencies_ms, dtype=np.float64)
+    if samples.size == 0:
+        return {'requests': 0, 'errors': errors}
+    if wall_seconds is None:
+        wall_seconds = samples.sum() / 1000
+    return {
+        'requests': int(samples.size),
+        'errors': errors,
+        'throughput_rps': round(samples.size / wall_seconds, 2) if wall_seconds > 0 else None,
+        'mean_ms': round(float(samples.mean()), 4),
+        'p50_ms': round(float(np.percentile(samples, 50)), 4),
+        'p95_ms': round(float(np.percentile(samples, 95)), 4),
+        'p99_ms': round(float(np.percentile(samples, 99)), 4),
+        'max_ms': round(float(samples.max()), 4),
+    }
+
+
+def build_report(kind: str, config: Dict, results: Dict[str, Dict]) -> Dict:
+    return {
+        'kind': kind,
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'config': config,
+        'results': results,
+    }
+
+
+def save_report(report: Dict, path: str):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f"Results written to '{path}'")
+
+
+def compare_to_baseline(report: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Returns one message per metric that is more than `tolerance` (a fraction) worse than the baseline"""
+    regressions = []
+    for name, base in baseline['results'].items():
+        current = report['results'].get(name)
+        if current is None:
+            continue
+        if current.get('errors', 0) > base.get('errors', 0):
+            regressions.append(f"{name}: {current['errors']} errors (baseline {base.get('errors', 0)})")
+        for metric in LOWER_IS_BETTER + HIGHER_IS_BETTER:
+            if base.get(metric) is None or current.get(metric) is None:
+                continue
+            if metric in LOWER_IS_BETTER:
+                worse = current[metric] > base[metric] * (1 + tolerance)
+            else:
+                worse = current[metric] < base[metric] * (1 - tolerance)
+            if worse:
+                change = (current[metric] - base[metric]) / base[metric] * 100 if base[metric] else float('inf')
+                regressions.append(f"{name}.{metric}: {current[metric]} vs baseline {base[metric]} ({change:+.1f}%)")
+    return regressions
+
+
+def print_results(results: Dict[str, Dict]):
+    header = f"{'benchmark':<34}{'n':>7}{'err':>5}{'rps':>11}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    print(header)
+    print("-" * len(header))
+    for name, r in results.items():
+        rps = r.get('throughput_rps')
+        print(f"{name:<34}{r['requests']:>7}{r['errors']:>5}{(f'{rps:.1f}' if rps else '-'):>11}"
+              f"{r.get('p50_ms', 0):>10.3f}{r.get('p95_ms', 0):>10.3f}{r.get('p99_ms', 0):>10.3f}")
+
+
+def finish(report: Dict, output: Optional[str], baseline_path: Optional[str], save_baseline: bool, tolerance: float) -> int:
+    """Prints, saves and checks a report; returns the process exit code (1 on regression)"""
+    print()
+    print_results(report['results'])
+    if output:
+        save_report(report, output)
+    if baseline_path and save_baseline:
+        save_report(report, baseline_path)
+        return 0
+    if baseline_path:
+        if not os.path.exists(baseline_path):
+            print(f"No baseline at '{baseline_path}'; run again with --save-baseline to create it")
+            return 0
+        with open(baseline_path) as file:
+            baseline = json.load(file)
+        if baseline.get('environment') != report['environment'] or baseline.get('config') != report['config']:
+            print(f"Note: '{baseline_path}' was recorded with a different environment or configuration; "
+                  "re-record it with --save-baseline on the deploy machine for meaningful comparisons")
+        regressions = compare_to_baseline(report, baseline, tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) beyond {tolerance:.0%} of '{baseline_path}':")
+            for message in regressions:
+                print(f"  - {message}")
+            return 1
+        print(f"\n✅ No regressions beyond {tolerance:.0%} of '{baseline_path}'")
+    return 0
+
+
+def add_output_arguments(parser, default_baseline: str):
+    parser.add_argument('--output', default=None, help="Write the results JSON to this file.")
+    parser.add_argument('--baseline', default=default_baseline, help="Baseline JSON to compare against.")
+    parser.add_argument('--no-baseline', action='store_true', help="Skip the baseline comparison.")
+    parser.add_argument('--save-baseline', action='store_true', help="Store these results as the new baseline.")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="Allowed slowdown before a metric counts as a regression (0.25 = 25%%).")
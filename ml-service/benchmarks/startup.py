@@ -0,0 +1,205 @@
+# ml-service/benchmarks/startup.py
+"""
+Cold start and per-process memory of the API server, single-process and pre-forking.
+
+Each mode starts a real server, times how long it takes to answer /health/live and
+/health/ready (for every worker), times the first estimate, sends some traffic, and then
+reads RSS, PSS and USS for the master and each worker from /proc (Linux only):
+
+    python -m benchmarks.startup --artifact-dir artifacts/estimator --workers 4
+    python -m benchmarks.startup --modes gunicorn-preload --workers 8 --output startup.json
+
+RSS counts shared pages in full for every process. PSS divides them between the processes
+sharing them, so the PSS total is the memory the whole server really uses; USS is what
+each worker holds privately. Preloading should show up as a lower USS per worker.
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.core.lifecycle import process_memory
+from benchmarks.load import ESTIMATOR_ITEMS, make_listing_images
+from benchmarks.report import build_report, save_report
+
+SERVICE_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+MODES = ("uvicorn", "gunicorn-preload", "gunicorn-no-preload")
+
+
+def server_command(mode: str, port: int) -> List[str]:
+    if mode == "uvicorn":
+        return [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port)]
+    return [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "main:app"]
+
+
+def child_pids(pid: int) -> List[int]:
+    children = []
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat") as file:
+                parent = int(file.read().rpartition(")")[2].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        if parent == pid:
+            children.append(int(name))
+    return sorted(children)
+
+
+def wait_for(client: httpx.Client, path: str, deadline: float) -> Optional[Dict]:
+    """Polls `path` until it answers 200 and returns the body"""
+    while time.monotonic() < deadline:
+        try:
+            response = client.get(path)
+            if response.status_code == 200:
+                return response.json()
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    return None
+
+
+def wait_for_all_ready(client: httpx.Client, deadline: float, expected: int) -> bool:
+    """
+    Polls /metrics until `expected` processes report process_ready 1. Probing /health/ready
+    cannot show this: the same idle worker tends to accept every new connection.
+    """
+    while time.monotonic() < deadline:
+        try:
+            lines = client.get("/metrics").text.splitlines()
+            ready = sum(1 for line in lines if line.startswith("process_ready") and line.endswith(" 1.0"))
+            if ready >= expected:
+                return True
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    return False
+
+
+def memory_summary(pids: List[int]) -> Dict:
+    samples = [m for m in (process_memory(pid) for pid in pids) if m is not None]
+    if not samples:
+        return {}
+    return {
+        "processes": len(samples),
+        **{f"mean_{key}": round(sum(s[key] for s in samples) / len(samples), 1) for key in samples[0]},
+        "total_pss_mb": round(sum(s["pss_mb"] for s in samples), 1),
+    }
+
+
+def measure(mode: str, workers: int, port: int, env: Dict[str, str], estimate_requests: int,
+            moderation_requests: int, timeout: float) -> Dict:
+    expected = 1 if mode == "uvicorn" else workers
+    # uvicorn reads WEB_CONCURRENCY too, so it is set to the number of processes expected
+    env = {**env, "PORT": str(port), "WEB_CONCURRENCY": str(expected),
+           "GUNICORN_PRELOAD": "false" if mode == "gunicorn-no-preload" else "true"}
+    print(f"--- {mode}: {expected} worker(s) ---")
+    log = tempfile.TemporaryFile()
+    started = time.monotonic()
+    server = subprocess.Popen(server_command(mode, port), cwd=SERVICE_ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    result: Dict = {"mode": mode, "workers": expected}
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=10) as client:
+            deadline = started + timeout
+            if wait_for(client, "/health/live", deadline) is None:
+                raise RuntimeError("server never answered /health/live")
+            result["live_seconds"] = round(time.monotonic() - started, 3)
+            if wait_for(client, "/health/ready", deadline) is None:
+                raise RuntimeError("server never became ready")
+            result["first_ready_seconds"] = round(time.monotonic() - started, 3)
+            if not wait_for_all_ready(client, deadline, expected):
+                raise RuntimeError(f"fewer than {expected} workers became ready")
+            result["all_ready_seconds"] = round(time.monotonic() - started, 3)
+            # Step durations as seen by one worker; steps the master ran before forking are marked inherited
+            result["startup_steps"] = client.get("/health/startup").json()["steps"]
+
+            request_started = time.perf_counter()
+            client.post("/estimator/estimate/", json=ESTIMATOR_ITEMS[-1]).raise_for_status()
+            result["first_estimate_ms"] = round((time.perf_counter() - request_started) * 1000, 2)
+            for index in range(estimate_requests):
+                client.post("/estimator/estimate/", json=ESTIMATOR_ITEMS[index % len(ESTIMATOR_ITEMS)])
+            for index, image in enumerate(make_listing_images(moderation_requests, size=(640, 480))):
+                client.post("/moderation/moderate-item/", files={"image": (f"{index}.jpg", image, "image/jpeg")}, data={
+                    "user_id": f"startup-{index}", "title": f"Cotton shirt {index}", "type": "Shirt",
+                    "size": "M", "condition": "Like New",
+                })
+
+        worker_pids = child_pids(server.pid) if mode != "uvicorn" else [server.pid]
+        result["worker_memory"] = memory_summary(worker_pids)
+        if mode != "uvicorn":
+            result["master_memory"] = process_memory(server.pid)
+        result["total_pss_mb"] = round(result["worker_memory"].get("total_pss_mb", 0)
+                                       + (result.get("master_memory") or {}).get("pss_mb", 0), 1)
+    except Exception as e:
+        log.seek(0)
+        print(log.read().decode(errors="replace")[-3000:])
+        result["error"] = str(e)
+    finally:
+        server.send_signal(signal.SIGTERM)
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        log.close()
+    return result
+
+
+def print_results(results: List[Dict]):
+    header = (f"{'mode':<22}{'workers':>8}{'live s':>8}{'ready s':>9}{'all s':>8}{'1st ms':>9}"
+              f"{'RSS/w':>8}{'PSS/w':>8}{'USS/w':>8}{'PSS tot':>9}")
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        if "error" in r:
+            print(f"{r['mode']:<22}{r['workers']:>8}  failed: {r['error']}")
+            continue
+        memory = r["worker_memory"]
+        print(f"{r['mode']:<22}{r['workers']:>8}{r['live_seconds']:>8.2f}{r['first_ready_seconds']:>9.2f}"
+              f"{r['all_ready_seconds']:>8.2f}{r['first_estimate_ms']:>9.1f}{memory.get('mean_rss_mb', 0):>8.1f}"
+              f"{memory.get('mean_pss_mb', 0):>8.1f}{memory.get('mean_uss_mb', 0):>8.1f}{r['total_pss_mb']:>9.1f}")
+    print("Memory in MiB; RSS/PSS/USS are per worker means, PSS tot includes the master.")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measure server cold start and per-worker memory.")
+    parser.add_argument('--modes', default=",".join(MODES), help=f"Comma-separated subset of {', '.join(MODES)}.")
+    parser.add_argument('--workers', type=int, default=4, help="Workers for the gunicorn modes.")
+    parser.add_argument('--artifact-dir', default=None, help="Estimator artifact directory the server loads.")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--estimate-requests', type=int, default=200, help="Estimates sent before memory is read.")
+    parser.add_argument('--moderation-requests', type=int, default=8, help="Moderations (fake model) sent before memory is read.")
+    parser.add_argument('--timeout', type=float, default=120, help="Seconds to wait for the server to become ready.")
+    parser.add_argument('--output', default=None, help="Write the results JSON to this file.")
+    args = parser.parse_args()
+
+    if not os.path.isdir("/proc"):
+        sys.exit("benchmarks.startup reads process memory from /proc and only runs on Linux")
+    with tempfile.TemporaryDirectory() as state_dir:
+        server_env = {k: v for k, v in os.environ.items() if k != "PROMETHEUS_MULTIPROC_DIR"}
+        server_env.update({
+            "MODERATION_FAKE_MODEL": "1",
+            "MODERATION_FAKE_LATENCY_SECONDS": "0.05",
+            "MODERATION_DUPLICATE_SQLITE_PATH": "",
+            "MODERATION_JOBS_DIR": os.path.join(state_dir, "jobs"),
+        })
+        if args.artifact_dir:
+            server_env["ESTIMATOR_ARTIFACT_DIR"] = os.path.abspath(args.artifact_dir)
+        results = [measure(mode.strip(), args.workers, args.port, server_env, args.estimate_requests,
+                           args.moderation_requests, args.timeout)
+                   for mode in args.modes.split(",") if mode.strip()]
+
+    print()
+    print_results(results)
+    if args.output:
+        config = {k: getattr(args, k) for k in ('modes', 'workers', 'estimate_requests', 'moderation_requests')}
+        save_report(build_report('startup', config, {r['mode']: r for r in results}), args.output)
+    sys.exit(1 if any("error" in r for r in results) else 0)
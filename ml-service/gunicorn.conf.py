@@ -0,0 +1,44 @@
+# ml-service/gunicorn.conf.py
+"""
+Multi-worker serving:  gunicorn -c gunicorn.conf.py main:app
+
+With preloading (the default) the master imports the app and runs main.preload() before
+forking, so the estimator is loaded and warmed up once and the workers share its pages
+copy-on-write, along with the imported libraries. Anything that must not cross a fork
+(SQLite connections, thread pools, the Gemini gRPC client, the job workers) is created
+by each worker's own startup hook (see main.py).
+
+Environment: WEB_CONCURRENCY (workers, default 2), PORT (8000), GUNICORN_PRELOAD (true),
+GUNICORN_TIMEOUT (60 seconds).
+"""
+import gc
+import os
+import tempfile
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "uvicorn_worker.UvicornWorker"
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() in ("1", "true", "yes")
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+
+# Workers write their metrics to files in this directory and /metrics aggregates them
+# (see app/core/metrics.py). It has to be set before the app is imported.
+if not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="rewear-metrics-")
+
+
+def when_ready(server):
+    """Runs in the master once the app is imported and before the first worker is forked"""
+    if not preload_app:
+        return
+    import main
+    main.preload()
+    # Everything allocated so far is moved out of the collector's reach, so garbage
+    # collections in the workers do not write to (and un-share) those pages
+    gc.collect()
+    gc.freeze()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
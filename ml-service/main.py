@@ -1,16 +1,53 @@
 # ml-service/main.py
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
+from app.core.config import ESTIMATOR_WARM_UP
+from app.core.lifecycle import lifecycle
+from app.core.metrics import PrometheusMiddleware, render_metrics
 
 from app.estimator.router import router as estimator_router
+from app.estimator.router import registry as estimator_registry
 from app.moderation.router import router as moderation_router
+from app.moderation.router import get_moderation_service, start_background_tasks, stop_background_tasks
+
+
+def preload():
+    """
+    Loads and warms up what worker processes can share. A pre-forking server calls this in
+    the master before forking (see gunicorn.conf.py), so the workers map those pages
+    copy-on-write instead of each loading a private copy.
+    """
+    lifecycle.run_step("estimator_load", estimator_registry.ensure_loaded)
+    if ESTIMATOR_WARM_UP:
+        lifecycle.run_step("estimator_warm_up", estimator_registry.warm_up)
+
+async def startup():
+    """Per-process startup steps; runs in the background so liveness probes answer straight away"""
+    await asyncio.to_thread(preload)
+    estimator_registry.publish_metrics()
+    if await asyncio.to_thread(lifecycle.run_step, "moderation_init", get_moderation_service):
+        start_background_tasks()
+    lifecycle.mark_ready()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    startup_task = asyncio.create_task(startup())
+    yield
+    lifecycle.mark_stopping()
+    startup_task.cancel()
+    await stop_background_tasks()
 
 # Create the main FastAPI application instance
 app = FastAPI(
     title="ReWear API",
     version="1.0.0",
-    description="Backend services for the ReWear fashion swapping platform."
+    description="Backend services for the ReWear fashion swapping platform.",
+    lifespan=lifespan
 )
 
 # Add global middleware
@@ -28,6 +65,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(PrometheusMiddleware)
 
 
 app.include_router(estimator_router)
@@ -36,4 +74,27 @@ app.include_router(moderation_router)
 @app.get("/", tags=["Health Check"])
 def read_root():
     """A simple health check endpoint."""
-    return {"status": "ok", "message": "Welcome to the ReWear API"}
\ No newline at end of file
+    return {"status": "ok", "message": "Welcome to the ReWear API"}
+
+@app.get("/health/live", tags=["Health Check"])
+def liveness():
+    """The process is up and serving HTTP, whether or not startup has finished."""
+    return {"status": "ok"}
+
+@app.get("/health/ready", tags=["Health Check"])
+def readiness():
+    """200 once this process has loaded and warmed up its models, 503 before that and while shutting down."""
+    status = lifecycle.status()
+    status["estimator_version"] = estimator_registry.version
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+@app.get("/health/startup", tags=["Health Check"])
+def startup_report():
+    """Startup step durations and the memory (RSS, PSS, USS) of the process that answers."""
+    return lifecycle.status(include_memory=True)
+
+@app.get("/metrics", tags=["Health Check"], include_in_schema=False)
+def metrics():
+    """Prometheus scrape target."""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
@@ -0,0 +1,102 @@
+# ml-service/scripts/compare_estimate_latency.py
+import argparse
+import itertools
+import random
+import sys
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.estimator.service import ResearchBasedSustainabilityEstimator
+
+
+def legacy_get_ml_estimate(estimator: ResearchBasedSustainabilityEstimator, item_type: str, material: str, brand: str, condition: str):
+    """
+    The previous request path, kept verbatim for comparison: four boolean-mask scans of
+    the full LCA DataFrame, one LabelEncoder.transform per feature and a one-row DataFrame.
+    """
+    lca_database = estimator.lca_database
+    weight_kg = lca_database[lca_database['item_type'] == item_type]['weight_kg'].median()
+    encoded_features = {}
+    for feature, value in zip(['item_type', 'material', 'brand', 'condition'], [item_type, material, brand, condition]):
+        le = estimator.encoders[feature]
+        value_to_encode = value
+        if value_to_encode not in le.classes_:
+            value_to_encode = 'Unknown' if 'Unknown' in le.classes_ else le.classes_[0]
+        encoded_features[f'{feature}_encoded'] = le.transform([value_to_encode])[0]
+    brand_mult = lca_database[lca_database['brand'] == brand]['brand_multiplier'].mean()
+    condition_mult = lca_database[lca_database['condition'] == condition]['condition_multiplier'].mean()
+    manufacturing_mult = lca_database[lca_database['item_type'] == item_type]['manufacturing_multiplier'].mean()
+    features_dict = {
+        **encoded_features, 'weight_kg': weight_kg,
+        'manufacturing_multiplier': manufacturing_mult, 'brand_multiplier': brand_mult,
+        'condition_multiplier': condition_mult,
+        'weight_material_interaction': weight_kg * encoded_features['material_encoded'],
+        'brand_condition_interaction': encoded_features['brand_encoded'] * encoded_features['condition_encoded']
+    }
+    features_df = pd.DataFrame([features_dict])[estimator.feature_cols]
+    scaled_features = estimator.scaler.transform(features_df)
+    return estimator._format_predictions([model.predict(scaled_features)[0] for model in estimator.ml_models.values()])
+
+
+def _time_per_call(fn, inputs, repeat: int) -> float:
+    """Median per-call latency in milliseconds over `repeat` passes of `inputs`"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for args in inputs:
+            fn(*args)
+        samples.append((time.perf_counter() - start) / len(inputs) * 1000)
+    return float(np.median(samples))
+
+
+def compare(n_inputs: int = 50, repeat: int = 3, seed: int = 0):
+    print("--- 1. Training the estimator ---")
+    estimator = ResearchBasedSustainabilityEstimator()
+    estimator.train_ml_models()
+    estimator.precompute_lookup_table()
+    lookup_table = estimator.lookup_table
+    inference_engines = estimator.inference_engines
+
+    classes = [list(estimator.encoders[f].classes_) for f in ['item_type', 'material', 'brand', 'condition']]
+    rng = random.Random(seed)
+    inputs = rng.sample(list(itertools.product(*classes)), n_inputs)
+    # A few inputs that match no category exercise the fallback path (aliases such as
+    # 'Shirt' now resolve to a category, so they would legitimately differ from the legacy path)
+    inputs[:3] = [('Lehenga', 'Cotton', 'H&M', 'Used'), ('Jeans', 'Hemp', 'Levi', 'Used'), ('Saree', 'Khadi', 'Biba', 'Used')]
+
+    print("\n--- 2. Checking the new path returns identical results ---")
+    estimator.lookup_table = None
+    mismatches = sum(
+        legacy_get_ml_estimate(estimator, *args) != {k: v for k, v in estimator.get_ml_estimate(*args).items() if k != 'canonical'}
+        for args in inputs
+    )
+    print(f"Mismatched results: {mismatches} / {len(inputs)}")
+
+    print(f"\n--- 3. Timing {len(inputs)} calls x {repeat} passes ---")
+    legacy_ms = _time_per_call(lambda *args: legacy_get_ml_estimate(estimator, *args), inputs, repeat)
+    flat_ms = _time_per_call(estimator.get_ml_estimate, inputs, repeat)
+    estimator.inference_engines = {}
+    forest_ms = _time_per_call(estimator.get_ml_estimate, inputs, repeat)
+    estimator.inference_engines = inference_engines
+    estimator.lookup_table = lookup_table
+    lookup_ms = _time_per_call(estimator.get_ml_estimate, inputs, repeat)
+
+    print(f"{'path':<36}{'ms/call':>10}{'speedup':>10}")
+    for name, ms in [("legacy (pandas masks + DataFrame)", legacy_ms),
+                     ("precomputed indexes + sklearn", forest_ms),
+                     ("precomputed indexes + flat forests", flat_ms),
+                     ("precomputed indexes + lookup table", lookup_ms)]:
+        print(f"{name:<36}{ms:>10.3f}{legacy_ms / ms:>9.1f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare per-call latency of the old and new get_ml_estimate paths.")
+    parser.add_argument('--inputs', type=int, default=50, help="Number of distinct inputs per pass.")
+    parser.add_argument('--repeat', type=int, default=3, help="Number of timed passes.")
+    args = parser.parse_args()
+    compare(n_inputs=args.inputs, repeat=args.repeat)
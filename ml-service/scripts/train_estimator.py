@@ -1,33 +1,203 @@
 # ml-service/scripts/train_estimator.py
+import argparse
+import itertools
+import json
 import pickle
 import sys
 import os
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
-from app.estimator.service import ResearchBasedSustainabilityEstimator
+from app.core.config import ESTIMATOR_ARTIFACT_DIR
+from app.estimator.artifact import save_artifact
+from app.estimator.service import ResearchBasedSustainabilityEstimator, CATEGORICAL_FEATURES
+
+
+class PeakRssSampler:
+    """Samples this process's resident set size in the background and keeps the peak (Linux only)"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.baseline_mb = self.peak_mb = self._rss_mb()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @staticmethod
+    def _rss_mb() -> Optional[float]:
+        try:
+            with open('/proc/self/statm') as file:
+                return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+        except (OSError, ValueError):
+            return None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            rss = self._rss_mb()
+            if rss is not None:
+                self.peak_mb = max(self.peak_mb, rss)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
 
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
 
-def train_and_save():
+    @property
+    def increase_mb(self) -> Optional[float]:
+        return None if self.baseline_mb is None else round(self.peak_mb - self.baseline_mb, 1)
+
+
+def _dir_size_mb(path: str) -> float:
+    return round(sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)) / 1024 ** 2, 2)
+
+
+def measure_inference_latency(estimator: ResearchBasedSustainabilityEstimator, n_single: int = 200,
+                              batch_size: int = 1000, seed: int = 0) -> Dict:
+    """Times the model path (what requests with unknown values pay) for single rows and one batch"""
+    rng = np.random.default_rng(seed)
+    codes = {feature: rng.integers(0, len(estimator.category_codes[feature]), batch_size) for feature in CATEGORICAL_FEATURES}
+    known = {feature: np.ones(batch_size, dtype=bool) for feature in CATEGORICAL_FEATURES}
+    X = estimator._scaled_features(codes, known)
+    estimator._predict_scaled(X[:1])
+    single_ms = []
+    for i in range(n_single):
+        started = time.perf_counter()
+        estimator._predict_scaled(X[i % batch_size:i % batch_size + 1])
+        single_ms.append((time.perf_counter() - started) * 1000)
+    started = time.perf_counter()
+    estimator._predict_scaled(X)
+    batch_ms = (time.perf_counter() - started) * 1000
+    return {
+        'single_row_p50_ms': round(float(np.percentile(single_ms, 50)), 3),
+        'single_row_p99_ms': round(float(np.percentile(single_ms, 99)), 3),
+        'batch_size': batch_size,
+        'batch_ms': round(batch_ms, 2),
+        'batch_per_row_us': round(batch_ms * 1000 / batch_size, 2),
+    }
+
+
+def train_configuration(config: Dict, precompute_lookup: bool = True):
+    """Trains one configuration and returns (estimator, report) with accuracy, size, memory and latency"""
+    estimator = ResearchBasedSustainabilityEstimator()
+    with PeakRssSampler() as rss:
+        report = estimator.train_ml_models(**config)
+    if precompute_lookup:
+        estimator.precompute_lookup_table()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        artifact_mb = _dir_size_mb(save_artifact(estimator, tmp_dir, version='probe', make_current=False))
+    report = {
+        **report,
+        'artifact_mb': artifact_mb,
+        'serving_model_mb': round(sum(e.nbytes for e in estimator.inference_engines.values()) / 1024 ** 2, 2),
+        'train_peak_rss_increase_mb': rss.increase_mb,
+        'latency': measure_inference_latency(estimator),
+    }
+    return estimator, report
+
+
+def print_reports(reports: List[Dict]):
+    header = f"{'mode':<13}{'trees':>6}{'depth':>6}{'leaf':>5}  {'MAE co2/water/waste':<26}{'R2 min':>7}" \
+             f"{'art MB':>8}{'serve MB':>9}{'train s':>8}{'1-row ms':>9}{'batch us/row':>13}"
+    print(header)
+    print("-" * len(header))
+    for report in reports:
+        config, metrics, latency = report['config'], report['metrics'], report['latency']
+        mae = "/".join(f"{metrics[t]['mae']:.3g}" for t in ['co2_kg', 'water_l', 'waste_kg'])
+        r2_min = min(m['r2'] for m in metrics.values())
+        print(f"{'multi-output' if config['multi_output'] else 'per-target':<13}{config['n_estimators']:>6}"
+              f"{str(config['max_depth'] or '-'):>6}{config['min_samples_leaf']:>5}  {mae:<26}{r2_min:>7.4f}"
+              f"{report['artifact_mb']:>8.1f}{report['serving_model_mb']:>9.1f}{report['train_seconds']:>8.1f}"
+              f"{latency['single_row_p50_ms']:>9.3f}{latency['batch_per_row_us']:>13.1f}")
+
+
+def train_and_save(config: Optional[Dict] = None, precompute_lookup: bool = True,
+                   artifact_dir: str = ESTIMATOR_ARTIFACT_DIR, version: str = None, make_current: bool = True,
+                   legacy_pickle: bool = False, keep_sklearn_models: bool = False):
     """
-    Initializes the estimator, trains the ML models, and saves the
-    entire trained estimator instance to a pickle file for deployment.
+    Initializes the estimator, trains the ML models, and saves the trained
+    estimator as a new versioned artifact for deployment.
     """
     print("--- 1. Initializing the Sustainability Estimator ---")
     estimator = ResearchBasedSustainabilityEstimator()
-    
+
     print("\n--- 2. Training the ML Models ---")
-    estimator.train_ml_models()
-    
-    filename = 'sustainability_estimator.pkl'
-    
-    print(f"\n--- 3. Saving the trained estimator to '{os.path.abspath(filename)}' ---")
-    
-    with open(filename, 'wb') as file:
-        pickle.dump(estimator, file)
-        
-    print("\n✅ New estimator file created successfully.")
+    report = estimator.train_ml_models(**(config or {}))
+    print(json.dumps(report['metrics'], indent=2))
+
+    if precompute_lookup:
+        print("\n--- 2b. Precomputing predictions for every known category combination ---")
+        estimator.precompute_lookup_table()
+
+    print(f"\n--- 3. Saving the trained estimator artifact under '{os.path.abspath(artifact_dir)}' ---")
+    version_dir = save_artifact(estimator, artifact_dir, version=version, make_current=make_current,
+                                include_sklearn_models=keep_sklearn_models)
+    print(f"Artifact written to '{version_dir}'" + (" and marked CURRENT" if make_current else ""))
+
+    if legacy_pickle:
+        filename = 'sustainability_estimator.pkl'
+        print(f"\n--- 3b. Saving the trained estimator to '{os.path.abspath(filename)}' ---")
+        with open(filename, 'wb') as file:
+            pickle.dump(estimator, file)
+
+    print("\n✅ New estimator artifact created successfully.")
     print("You can now run the FastAPI backend with: uvicorn main:app --reload")
+    print("or hot-swap it into a running service with: POST /estimator/admin/reload")
+
+
+def _depth(value: str) -> Optional[int]:
+    return None if value.lower() == 'none' else int(value)
+
 
 if __name__ == '__main__':
-    train_and_save()
\ No newline at end of file
+    parser = argparse.ArgumentParser(
+        description="Train and save the sustainability estimator. Passing several values for the model "
+                    "options (or --compare) trains every combination and prints a comparison instead of saving.")
+    parser.add_argument('--n-estimators', type=int, nargs='+', default=[100], help="Trees per forest.")
+    parser.add_argument('--max-depth', type=_depth, nargs='+', default=[None], help="Tree depth limit ('none' = unlimited).")
+    parser.add_argument('--min-samples-leaf', type=int, nargs='+', default=[1], help="Minimum samples per leaf.")
+    parser.add_argument('--mode', choices=['per-target', 'multi-output', 'both'], default='per-target',
+                        help="Three single-target forests, one multi-output forest, or compare both.")
+    parser.add_argument('--n-jobs', type=int, default=-1, help="Training parallelism.")
+    parser.add_argument('--compare', action='store_true', help="Report on the configurations without saving.")
+    parser.add_argument('--report-json', default=None, help="Write the comparison report to this file.")
+    parser.add_argument('--no-lookup-table', action='store_true',
+                        help="Skip precomputing the dense lookup table (every request then runs the forests).")
+    parser.add_argument('--artifact-dir', default=ESTIMATOR_ARTIFACT_DIR,
+                        help="Root directory for versioned artifacts.")
+    parser.add_argument('--version', default=None, help="Artifact version name (default: timestamp).")
+    parser.add_argument('--no-make-current', action='store_true',
+                        help="Write the artifact without pointing CURRENT at it.")
+    parser.add_argument('--keep-sklearn-models', action='store_true',
+                        help="Also store the sklearn forests in the artifact (serving only needs the flattened ones).")
+    parser.add_argument('--legacy-pickle', action='store_true',
+                        help="Also write the old single-file sustainability_estimator.pkl.")
+    args = parser.parse_args()
+
+    modes = {'per-target': [False], 'multi-output': [True], 'both': [False, True]}[args.mode]
+    configs = [
+        dict(n_estimators=n, max_depth=depth, min_samples_leaf=leaf, multi_output=multi, n_jobs=args.n_jobs)
+        for multi, n, depth, leaf in itertools.product(modes, args.n_estimators, args.max_depth, args.min_samples_leaf)
+    ]
+    if len(configs) == 1 and not args.compare:
+        train_and_save(config=configs[0], precompute_lookup=not args.no_lookup_table, artifact_dir=args.artifact_dir,
+                       version=args.version, make_current=not args.no_make_current,
+                       legacy_pickle=args.legacy_pickle, keep_sklearn_models=args.keep_sklearn_models)
+    else:
+        reports = []
+        for i, config in enumerate(configs, 1):
+            print(f"\n--- Configuration {i}/{len(configs)}: {config} ---")
+            reports.append(train_configuration(config, precompute_lookup=not args.no_lookup_table)[1])
+        print()
+        print_reports(reports)
+        if args.report_json:
+            with open(args.report_json, 'w') as file:
+                json.dump(reports, file, indent=2)
+            print(f"\nReport written to '{args.report_json}'")
@@ -0,0 +1,23 @@
+from prometheus_client import REGISTRY
+
+from app.moderation.cache import ModerationCache
+
+
+def sample(name: str) -> float:
+    return REGISTRY.get_sample_value(name) or 0.0
+
+
+def test_lookups_and_evictions_are_exported_as_metrics():
+    names = ("moderation_cache_hits_total", "moderation_cache_misses_total", "moderation_cache_evictions_total")
+    before = {name: sample(name) for name in names}
+    cache = ModerationCache(max_entries=1)
+
+    assert cache.get("a") is None
+    cache.set("a", {"decision": "APPROVED"})
+    assert cache.get("a") == {"decision": "APPROVED"}
+    cache.set("b", {"decision": "FLAGGED"})
+
+    assert {name: sample(name) - before[name] for name in names} == {
+        "moderation_cache_hits_total": 1, "moderation_cache_misses_total": 1, "moderation_cache_evictions_total": 1,
+    }
+    assert (cache.hits, cache.misses, cache.evictions) == (1, 1, 1)
@@ -0,0 +1,45 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app.moderation.duplicates import DuplicateImageIndex
+
+PHASH, DHASH = 0x8F3C_21A0_55E1_9D04, 0x1234_5678_9ABC_DEF0
+
+
+def submit_concurrently(indexes):
+    """Every index gets the same image from a different user at the same moment"""
+    barrier = threading.Barrier(len(indexes))
+
+    def submit(user: int):
+        barrier.wait()
+        return indexes[user].find_or_add(PHASH, DHASH, f"user-{user}")
+
+    with ThreadPoolExecutor(len(indexes)) as pool:
+        return list(pool.map(submit, range(len(indexes))))
+
+
+def test_concurrent_reposts_are_flagged_in_memory():
+    index = DuplicateImageIndex()
+    matches = submit_concurrently([index] * 8)
+
+    assert sum(match is None for match in matches) == 1
+    assert len(index) == 1
+
+
+def test_concurrent_reposts_are_flagged_across_processes(tmp_path):
+    # One index per server process, sharing the SQLite file
+    path = os.path.join(str(tmp_path), "hashes.sqlite3")
+    indexes = [DuplicateImageIndex(sqlite_path=path) for _ in range(8)]
+    matches = submit_concurrently(indexes)
+
+    assert sum(match is None for match in matches) == 1
+    assert len(DuplicateImageIndex(sqlite_path=path)) == 1
+
+
+def test_same_user_resubmission_is_not_a_repost():
+    index = DuplicateImageIndex()
+    assert index.find_or_add(PHASH, DHASH, "user-1") is None
+    assert index.find_or_add(PHASH, DHASH, "user-1") is None
+    assert len(index) == 1
+    assert index.find_or_add(PHASH, DHASH, "user-2") is not None
@@ -0,0 +1,28 @@
+import copy
+import pickle
+
+import pytest
+
+from app.estimator.service import ResearchBasedSustainabilityEstimator
+
+
+@pytest.fixture(scope="module")
+def estimator():
+    estimator = ResearchBasedSustainabilityEstimator()
+    estimator.train_ml_models(n_estimators=5, max_depth=8)
+    return estimator
+
+
+def test_pickle_after_estimate(estimator):
+    before = estimator.get_ml_estimate(item_type="Jeans", material="Denim", brand="Levis", condition="like new")
+    assert estimator._canonicalizer is not None
+
+    restored = pickle.loads(pickle.dumps(estimator))
+    assert restored._canonicalizer is None
+    assert restored.get_ml_estimate(item_type="Jeans", material="Denim", brand="Levis", condition="like new") == before
+
+
+def test_deepcopy_after_estimate(estimator):
+    estimator.get_ml_estimates_batch([{"item_type": "Shirt", "material": "Cotton", "brand": "Zara", "condition": "Good"}])
+    copied = copy.deepcopy(estimator)
+    assert copied.canonicalizer is not estimator.canonicalizer
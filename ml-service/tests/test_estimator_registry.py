@@ -0,0 +1,67 @@
+import os
+import time
+
+import pytest
+
+from app.estimator.artifact import get_current_version, save_artifact
+from app.estimator.registry import EstimatorRegistry
+from app.estimator.service import ResearchBasedSustainabilityEstimator
+
+
+@pytest.fixture(scope="module")
+def estimator():
+    estimator = ResearchBasedSustainabilityEstimator()
+    estimator.train_ml_models(n_estimators=5, max_depth=8)
+    return estimator
+
+
+@pytest.fixture
+def artifact_dir(estimator, tmp_path):
+    save_artifact(estimator, str(tmp_path), version="v1")
+    return str(tmp_path)
+
+
+def wait_for_reload(registry: EstimatorRegistry):
+    for _ in range(500):
+        if registry.status()["loading_version"] is None:
+            return
+        time.sleep(0.01)
+    raise AssertionError("reload did not finish")
+
+
+def test_active_loads_on_first_use(artifact_dir):
+    registry = EstimatorRegistry(artifact_dir)
+    assert registry.version is None
+
+    version, estimator = registry.active()
+    assert version == "v1"
+    assert estimator is not None
+    assert registry.get() is estimator
+
+
+def test_published_reload_moves_current_after_loading(estimator, artifact_dir):
+    save_artifact(estimator, artifact_dir, version="v2", make_current=False)
+    registry = EstimatorRegistry(artifact_dir)
+    registry.ensure_loaded()
+
+    registry.reload("v2", publish=True)
+    wait_for_reload(registry)
+    assert registry.version == "v2"
+    assert get_current_version(artifact_dir) == "v2"
+
+
+def test_corrupt_version_leaves_current_and_active_unchanged(estimator, artifact_dir):
+    version_dir = save_artifact(estimator, artifact_dir, version="v2", make_current=False)
+    largest = max((name for name in os.listdir(version_dir) if name.endswith(".npy")),
+                  key=lambda name: os.path.getsize(os.path.join(version_dir, name)))
+    path = os.path.join(version_dir, largest)
+    with open(path, "r+b") as file:
+        file.truncate(os.path.getsize(path) // 2)
+    registry = EstimatorRegistry(artifact_dir)
+    registry.ensure_loaded()
+
+    registry.reload("v2", publish=True)
+    wait_for_reload(registry)
+    assert registry.version == "v1"
+    assert get_current_version(artifact_dir) == "v1"
+    assert registry.status()["last_error"].startswith("v2:")
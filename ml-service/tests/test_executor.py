@@ -0,0 +1,103 @@
+import asyncio
+import os
+import subprocess
+import sys
+
+import pytest
+
+from app.moderation.executor import (ModerationExecutor, ModerationOverloadedError, ModerationQueueTimeoutError,
+                                     ModerationTimeoutError)
+from app.moderation.fake import FakeGenerativeModel
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_full_queue_is_rejected_with_429():
+    model = FakeGenerativeModel(latency_seconds=0.2)
+    executor = ModerationExecutor(max_in_flight=1, max_queue=0)
+
+    async def scenario():
+        first = asyncio.create_task(executor.run(model.generate_content, "listing"))
+        await asyncio.sleep(0)
+        with pytest.raises(ModerationOverloadedError) as excinfo:
+            await executor.run(model.generate_content, "listing")
+        assert excinfo.value.status_code == 429
+        return await first
+
+    assert run(scenario()).text == "APPROVED"
+    assert executor.rejected == 1
+    assert model.calls == 1
+    executor.shutdown()
+
+
+def test_queue_wait_past_deadline_is_503():
+    model = FakeGenerativeModel(latency_seconds=0.5)
+    executor = ModerationExecutor(max_in_flight=1, max_queue=1, deadline_seconds=2.0)
+
+    async def scenario():
+        first = asyncio.create_task(executor.run(model.generate_content, "listing"))
+        await asyncio.sleep(0)
+        # Only the queued call gets the short deadline; the first one keeps the slot for 0.5s
+        executor.deadline_seconds = 0.1
+        with pytest.raises(ModerationQueueTimeoutError) as excinfo:
+            await executor.run(model.generate_content, "listing")
+        assert excinfo.value.status_code == 503
+        return await first
+
+    assert run(scenario()).text == "APPROVED"
+    assert executor.queue_timeouts == 1
+    assert executor.queued == 0
+    executor.shutdown()
+
+
+def test_timed_out_attempt_is_retried():
+    model = FakeGenerativeModel(latency_seconds=0.01, hang_seconds=0.3)
+
+    def generate(contents):
+        # Only the first attempt hangs
+        model.hang_rate = 1.0 if model.calls == 0 else 0.0
+        return model.generate_content(contents)
+
+    executor = ModerationExecutor(max_in_flight=2, timeout_seconds=0.1, max_retries=2, backoff_base_seconds=0.01)
+    response = run(executor.run(generate, "listing"))
+
+    assert response.text == "APPROVED"
+    assert model.calls == 2
+    assert executor.timeouts == 1
+    assert executor.retries == 1
+    assert executor.completed == 1
+    executor.shutdown()
+
+
+def test_retries_stop_after_max_retries():
+    model = FakeGenerativeModel(latency_seconds=0.0, failure_rate=1.0)
+    executor = ModerationExecutor(max_retries=2, backoff_base_seconds=0.01)
+
+    with pytest.raises(ConnectionError):
+        run(executor.run(model.generate_content, "listing"))
+
+    assert model.calls == 3
+    assert executor.retries == 2
+    assert executor.failed == 1
+    executor.shutdown()
+
+
+def test_persistent_timeouts_raise_after_max_retries():
+    model = FakeGenerativeModel(hang_rate=1.0, hang_seconds=0.2)
+    executor = ModerationExecutor(max_in_flight=2, timeout_seconds=0.05, max_retries=1, backoff_base_seconds=0.01)
+
+    with pytest.raises(ModerationTimeoutError):
+        run(executor.run(model.generate_content, "listing"))
+
+    assert model.calls == 2
+    assert executor.timeouts == 2
+    executor.shutdown()
+
+
+def test_import_does_not_load_grpc():
+    code = "import sys, app.moderation.executor; print('grpc' in sys.modules)"
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                            cwd=os.path.join(os.path.dirname(__file__), ".."))
+    assert output.stdout.strip() == "False"
@@ -0,0 +1,31 @@
+from app.estimator import router
+from app.estimator.ledger import ImpactLedger
+
+
+class FixedEstimator:
+    """Stands in for a loaded estimator model; every item gets the same savings"""
+
+    def __init__(self, co2_saved_kg: float):
+        self.co2_saved_kg = co2_saved_kg
+
+    def get_ml_estimates_batch(self, items):
+        return [{"co2_saved_kg": self.co2_saved_kg, "water_saved_l": 100.0, "waste_saved_kg": 0.5} for _ in items]
+
+
+def test_replayed_swap_returns_the_recorded_values(monkeypatch):
+    ledger = ImpactLedger()
+    record = router.SwapRecord(swap_id="swap-1", user_id="user-1", item_type="Jeans", material="Denim",
+                               brand="Levi", condition="Used", completed_at="2026-10-01T12:00:00Z")
+
+    monkeypatch.setattr(router.registry, "active", lambda: ("v1", FixedEstimator(3.0)))
+    first = router.record_swap_impact(record, ledger)
+    assert first["recorded"] is True
+    assert first["estimate"]["co2_saved_kg"] == 3.0
+
+    # A newer model version would estimate the same swap differently
+    monkeypatch.setattr(router.registry, "active", lambda: ("v2", FixedEstimator(5.0)))
+    replay = router.record_swap_impact(record, ledger)
+    assert replay["recorded"] is False
+    assert replay["estimate"]["co2_saved_kg"] == 3.0
+    assert replay["estimate"]["estimator_version"] == "v1"
+    assert ledger.totals("user-1")["co2_saved_kg"] == 3.0
@@ -0,0 +1,117 @@
+import asyncio
+import io
+import os
+import random
+
+from PIL import Image, ImageDraw
+
+from app.moderation.cache import ModerationCache
+from app.moderation.duplicates import DuplicateImageIndex
+from app.moderation.fake import FakeGenerativeModel
+from app.moderation.jobs import DrainLock, ModerationJobStore, ModerationJobWorker
+from app.moderation.preprocess import preprocess_to_jpeg
+from app.moderation.prescreen import Prescreener
+from app.moderation.service import ItemListing, ModerationService
+
+
+class CrashingService:
+    """Stands in for ModerationService; every call fails with an unexpected error"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def moderate_item(self, item: ItemListing):
+        self.calls += 1
+        raise RuntimeError("boom")
+
+
+def listing() -> ItemListing:
+    return ItemListing(user_id="user-1", title="Cotton shirt", type="Shirt", size="M", condition="Like New")
+
+
+def wide_photo(size=(4000, 600)) -> bytes:
+    """A sharp, well-exposed image whose short side drops below min_side once downsized"""
+    rng = random.Random(0)
+    image = Image.new("RGB", size, (120, 130, 140))
+    draw = ImageDraw.Draw(image)
+    for _ in range(300):
+        x, y = rng.randrange(size[0]), rng.randrange(size[1])
+        draw.rectangle([x, y, x + rng.randrange(20, 200), y + rng.randrange(20, 200)],
+                       fill=tuple(rng.randrange(256) for _ in range(3)))
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=88)
+    return buffer.getvalue()
+
+
+def run_until_done(worker: ModerationJobWorker, job_id: str):
+    async def scenario():
+        worker.start()
+        try:
+            for _ in range(200):
+                if worker.store.get(job_id)["status"] == "done":
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            await worker.stop()
+
+    asyncio.run(scenario())
+    return worker.store.get(job_id)
+
+
+def test_crashing_job_is_flagged_after_max_attempts(tmp_path):
+    store = ModerationJobStore(str(tmp_path))
+    service = CrashingService()
+    worker = ModerationJobWorker(store, service, concurrency=1, rate_per_second=0, max_attempts=2, poll_seconds=0.01)
+    job_id = store.submit(listing(), None)
+
+    job = run_until_done(worker, job_id)
+    assert job["status"] == "done"
+    assert job["attempts"] == 2
+    assert service.calls == 2
+    assert job["result"]["decision"] == "FLAGGED"
+    assert job["result"]["reason"] == "Technical error during moderation: boom"
+
+
+def test_queued_image_is_prescreened_at_its_original_size(tmp_path):
+    jpeg, original_size = preprocess_to_jpeg(wide_photo())
+    assert original_size == (4000, 600)
+    service = ModerationService(generative_model=FakeGenerativeModel(latency_seconds=0.0), cache=ModerationCache(),
+                                prescreener=Prescreener(), duplicate_index=DuplicateImageIndex(), batch_max_items=1)
+
+    # Judged by its downsized size alone, the stored image looks too small
+    downsized = asyncio.run(service.moderate_item(ItemListing(**{**vars(listing()), "image_data": jpeg})))
+    assert downsized.prescreen_rule == "low_resolution"
+
+    store = ModerationJobStore(str(tmp_path))
+    item = listing()
+    item.image_size = original_size
+    job_id = store.submit(item, jpeg)
+    worker = ModerationJobWorker(store, service, concurrency=1, rate_per_second=0, poll_seconds=0.01)
+
+    job = run_until_done(worker, job_id)
+    assert job["result"]["prescreen_rule"] is None
+    assert job["result"]["decision"] == "APPROVED"
+
+
+def test_only_the_lock_holder_drains_the_queue(tmp_path):
+    store = ModerationJobStore(str(tmp_path))
+    lock_path = os.path.join(str(tmp_path), "drain.lock")
+    first, second = [ModerationJobWorker(store, CrashingService(), concurrency=1, poll_seconds=0.01,
+                                         lock=DrainLock(lock_path)) for _ in range(2)]
+
+    async def scenario():
+        first.start()
+        second.start()
+        await asyncio.sleep(0.05)
+        assert first.draining and not second.draining
+        # The standby takes over once the holder stops
+        await first.stop()
+        for _ in range(100):
+            if second.draining:
+                break
+            await asyncio.sleep(0.01)
+        took_over = second.draining
+        await second.stop()
+        return took_over
+
+    assert asyncio.run(scenario())